@@ -0,0 +1,33 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2020.04 #
+##########################################################################################################################
+# python exps/NAS-Bench-201/convert-columnar.py --api_path $TORCH_HOME/NAS-Bench-201-v1_1-096897.pth                    #
+#                                              --save_dir $TORCH_HOME/NAS-Bench-201-v1_1-096897-columnar             #
+##########################################################################################################################
+# This script converts the benchmark file into the memory-mapped columnar format once, which can then be loaded by
+# `NASBench201ColumnarAPI` (or passed as `--arch_nas_dataset` to the algorithms in exps/algos) in less than one second.
+import sys, time, argparse
+from pathlib import Path
+lib_dir = (Path(__file__).parent / '..' / '..' / 'lib').resolve()
+if str(lib_dir) not in sys.path: sys.path.insert(0, str(lib_dir))
+from log_utils    import time_string
+from nas_201_api  import NASBench201API as API, NASBench201ColumnarAPI as ColumnarAPI, convert_to_columnar
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser("Convert NAS-Bench-201 into the columnar format")
+  parser.add_argument('--api_path',  type=str, help='The path to the NAS-Bench-201 benchmark file.')
+  parser.add_argument('--save_dir',  type=str, help='The directory to save the columnar arrays.')
+  args = parser.parse_args()
+
+  meta_file = Path(args.api_path)
+  assert meta_file.exists(), 'invalid path for api : {:}'.format(meta_file)
+  print ('{:} start loading {:}'.format(time_string(), meta_file))
+  api = API(str(meta_file))
+  print ('{:} start converting {:} into {:}'.format(time_string(), api, args.save_dir))
+  convert_to_columnar(api, args.save_dir)
+
+  start_time = time.time()
+  columnar_api = ColumnarAPI(args.save_dir)
+  print ('{:} create {:} in {:.3f} s'.format(time_string(), columnar_api, time.time() - start_time))
+  for dataset, setname in (('cifar10-valid', 'x-valid'), ('cifar100', 'x-valid'), ('ImageNet16-120', 'x-valid')):
+    print ('find_best on {:14s} : {:} vs. {:}'.format(dataset, api.find_best(dataset, setname), columnar_api.find_best(dataset, setname)))
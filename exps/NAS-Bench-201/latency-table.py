@@ -0,0 +1,56 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2020.04 #
+##########################################################################################################################
+# python exps/NAS-Bench-201/latency-table.py --save_path $TORCH_HOME/NAS-Bench-201-latency-cpu-32x32.json --check 20 #
+##########################################################################################################################
+# This script times every NAS-Bench-201 primitive on CPU at the shapes used by TinyNetwork, saves them as a LatencyTable,
+# and compares the predicted latency (the sum of the table entries) with the timed latency of some random networks.
+import os, sys, random, argparse
+import numpy as np
+from pathlib import Path
+lib_dir = (Path(__file__).parent / '..' / '..' / 'lib').resolve()
+if str(lib_dir) not in sys.path: sys.path.insert(0, str(lib_dir))
+from log_utils    import time_string
+from models       import get_search_spaces, CellArchCodec
+from models.cell_infers  import TinyNetwork, set_infer_pruning
+from models.cell_latency import time_module, LatencyTable, TinyNetworkLatency
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser("Build the CPU latency lookup table of NAS-Bench-201")
+  parser.add_argument('--save_path',   type=str,             help='The path to save the latency table (json).')
+  parser.add_argument('--search_space',type=str, default='nas-bench-201', help='The search space name.')
+  parser.add_argument('--channel',     type=int, default=16, help='The number of channels.')
+  parser.add_argument('--num_cells',   type=int, default=5,  help='The number of cells in one stage.')
+  parser.add_argument('--max_nodes',   type=int, default=4,  help='The maximum number of nodes.')
+  parser.add_argument('--num_classes', type=int, default=10, help='The number of classes.')
+  parser.add_argument('--batch_size',  type=int, default=1,  help='The batch size.')
+  parser.add_argument('--xshape',      type=int, default=32, help='The spatial size of the input, 32 for CIFAR and 16 for ImageNet16-120.')
+  parser.add_argument('--threads',     type=int, default=1,  help='The number of CPU threads.')
+  parser.add_argument('--warmup',      type=int, default=10, help='The number of untimed runs.')
+  parser.add_argument('--repeats',     type=int, default=50, help='The number of timed runs.')
+  parser.add_argument('--calibrate',   type=int, default=5,  help='The number of random networks to calibrate the scale of the prediction.')
+  parser.add_argument('--check',       type=int, default=0,  help='The number of random networks to compare the prediction with.')
+  args = parser.parse_args()
+
+  op_names = get_search_spaces('cell', args.search_space)
+  shape    = (args.batch_size, 3, args.xshape, args.xshape)
+  if args.save_path is not None and os.path.isfile(args.save_path):
+    table = LatencyTable.load(args.save_path)
+    print ('{:} load {:} from {:}'.format(time_string(), table, args.save_path))
+  else:
+    table = LatencyTable.build(args.channel, args.num_cells, args.num_classes, op_names, args.max_nodes, shape, args.threads, args.warmup, args.repeats, True)
+    if args.calibrate > 0: print ('{:} calibrate the scale with {:} networks : {:.3f}'.format(time_string(), args.calibrate, table.calibrate(args.calibrate)))
+    if args.save_path is not None: table.save(args.save_path)
+    print ('{:} save {:} into {:}'.format(time_string(), table, args.save_path))
+  predictor = TinyNetworkLatency(table)
+  latencies = predictor.predict_all() # in the order of the code integer of CellArchCodec
+  print ('{:} the predicted latency of {:} architectures : min={:.1f}, mean={:.1f}, max={:.1f} us'.format(time_string(), len(latencies), latencies.min(), latencies.mean(), latencies.max()))
+
+  codec, errors = CellArchCodec(op_names, args.max_nodes), []
+  for code in random.sample(range(codec.num_archs), args.check):
+    network = set_infer_pruning(TinyNetwork(args.channel, args.num_cells, codec.decode(code), args.num_classes), False) # the same as LatencyTable.calibrate
+    timed   = time_module(network, table.meta['shape'], table.meta['warmup'], table.meta['repeats'], table.meta['num_threads'])['p50']
+    errors.append( abs(latencies[code] - timed) / timed )
+    print ('{:} code={:05d}/{:05d} : predicted={:.1f} us, timed={:.1f} us, arch={:}'.format(time_string(), code, codec.num_archs, latencies[code], timed, codec.tostr(code)))
+  if len(errors) > 0: print ('{:} the relative error of {:} networks : mean={:.3f}, max={:.3f}'.format(time_string(), len(errors), np.mean(errors), np.max(errors)))
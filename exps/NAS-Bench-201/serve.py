@@ -0,0 +1,27 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2020.04 #
+##########################################################################################################################
+# python exps/NAS-Bench-201/serve.py --api_path $TORCH_HOME/NAS-Bench-201-v1_1-096897-columnar --address /tmp/nas-bench-201.sock #
+##########################################################################################################################
+# This script holds one copy of the benchmark (a .pth file or a columnar directory) and serves the queries of many search
+# processes on the same host, which use `NASBench201Client` (or pass the socket as `--arch_nas_dataset` to exps/algos).
+import os, sys, argparse
+from pathlib import Path
+lib_dir = (Path(__file__).parent / '..' / '..' / 'lib').resolve()
+if str(lib_dir) not in sys.path: sys.path.insert(0, str(lib_dir))
+from log_utils    import time_string
+from nas_201_api  import NASBench201API as API, NASBench201ColumnarAPI as ColumnarAPI, NASBench201Server, load_authkey
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser("Serve the queries of NAS-Bench-201")
+  parser.add_argument('--api_path',  type=str, help='The path to the NAS-Bench-201 benchmark file or its columnar directory.')
+  parser.add_argument('--address',   type=str, default='/tmp/nas-bench-201.sock', help='The Unix domain socket path or host:port to listen on.')
+  parser.add_argument('--authkey',   type=str, help='The file of the authkey (default: the environment variable NAS_BENCH_201_AUTHKEY), which is required to listen on a non-loopback host.')
+  args = parser.parse_args()
+
+  assert Path(args.api_path).exists(), 'invalid path for api : {:}'.format(args.api_path)
+  print ('{:} start loading {:}'.format(time_string(), args.api_path))
+  if os.path.isdir(args.api_path): api = ColumnarAPI(args.api_path)
+  else                           : api = API(args.api_path)
+  server = NASBench201Server(api, args.address, load_authkey(args.authkey))
+  server.serve_forever()
@@ -1,7 +1,7 @@
 #####################################################
 # Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
 #####################################################
-import os, sys, time, argparse, collections
+import os, sys, time, argparse, collections, multiprocessing
 from copy import deepcopy
 import torch
 from pathlib import Path
@@ -13,7 +13,7 @@ from config_utils import load_config, dict2config
 from datasets     import get_datasets
 # NAS-Bench-201 related module or function
 from models       import CellStructure, get_cell_based_tiny_net
-from nas_201_api  import ArchResults, ResultsCount
+from nas_201_api  import ArchResults, ResultsCount, ResultsStore
 from procedures   import bench_pure_evaluate as pure_evaluate
 
 
@@ -69,7 +69,7 @@ def account_one_arch(arch_index, arch_str, checkpoints, datasets, dataloader_dic
 
 def GET_DataLoaders(workers):
 
-  torch.set_num_threads(workers)
+  torch.set_num_threads(max(workers, 1))
 
   root_dir  = (Path(__file__).parent / '..' / '..').resolve()
   torch_dir = Path(os.environ['TORCH_HOME'])
@@ -134,7 +134,34 @@ def GET_DataLoaders(workers):
   return loaders
 
 
-def simplify(save_dir, meta_file, basestr, target_dir):
+# (meta_archs, target_directory, target_less_dir, datasets, dataloader_dict, to_save_allarc) of `simplify`, which is inherited by the forked workers
+SIMPLIFY_CONTEXT = None
+
+
+def simplify_one_arch(arch_index):
+  # load and validate all checkpoints of one architecture, save its FULL and SIMPLE files, and return the SIMPLE state dicts
+  meta_archs, target_directory, target_less_dir, datasets, dataloader_dict, to_save_allarc = SIMPLIFY_CONTEXT
+  checkpoints = list(target_directory.glob('arch-{:}-seed-*.pth'.format(arch_index)))
+  ckps_less   = list(target_less_dir.glob('arch-{:}-seed-*.pth'.format(arch_index)))
+  # create the arch info for each architecture
+  try:
+    arch_info_full = account_one_arch(arch_index, meta_archs[int(arch_index)], checkpoints, datasets, dataloader_dict)
+    arch_info_less = account_one_arch(arch_index, meta_archs[int(arch_index)], ckps_less, ['cifar10-valid'], dataloader_dict)
+  except Exception as e:
+    return arch_index, checkpoints, None, e
+  torch.save({'full': arch_info_full.state_dict(),
+              'less': arch_info_less.state_dict()}, to_save_allarc / '{:}-FULL.pth'.format(arch_index))
+  arch_info_full.clear_params()
+  arch_info_less.clear_params()
+  simple_infos = {'full': arch_info_full.state_dict(),
+                  'less': arch_info_less.state_dict()}
+  torch.save(simple_infos, to_save_allarc / '{:}-SIMPLE.pth'.format(arch_index))
+  return arch_index, checkpoints, simple_infos, None
+
+
+def simplify(save_dir, meta_file, basestr, target_dir, num_procs=1, segment_size=100):
+  # the architectures are processed by `num_procs` forked processes (please do not use CUDA in this process before forking),
+  # and their results are appended into the ResultsStore of {save_dir}/simplifies/{basestr}-store every `segment_size` architectures.
   meta_infos     = torch.load(meta_file, map_location='cpu')
   meta_archs     = meta_infos['archs'] # a list of architecture strings
   meta_num_archs = meta_infos['total']
@@ -161,7 +188,8 @@ def simplify(save_dir, meta_file, basestr, target_dir):
   print('{:} There are {:5d} architectures that have been evaluated ({:} in total).'.format(time_string(), num_evaluated_arch, meta_num_archs))
   for key in sorted( list( num_seeds.keys() ) ): print ('{:} There are {:5d} architectures that are evaluated {:} times.'.format(time_string(), num_seeds[key], key))
 
-  dataloader_dict = GET_DataLoaders( 6 )
+  # the daemonic workers of a process pool can not create the workers of DataLoader, so the data is loaded in the main process
+  dataloader_dict = GET_DataLoaders( 6 if num_procs <= 1 else 0 )
 
   to_save_simply = save_dir / 'simplifies'
   to_save_allarc = save_dir / 'simplifies' / 'architectures'
@@ -169,7 +197,7 @@ def simplify(save_dir, meta_file, basestr, target_dir):
   if not to_save_allarc.exists(): to_save_allarc.mkdir(parents=True, exist_ok=True)
 
   assert (save_dir / target_dir) in subdir2archs, 'can not find {:}'.format(target_dir)
-  arch2infos, datasets = {}, ('cifar10-valid', 'cifar10', 'cifar100', 'ImageNet16-120')
+  datasets             = ('cifar10-valid', 'cifar10', 'cifar100', 'ImageNet16-120')
   evaluated_indexes    = set()
   target_directory     = save_dir / target_dir
   target_less_dir      = save_dir / '{:}-LESS'.format(target_dir)
@@ -177,47 +205,43 @@ def simplify(save_dir, meta_file, basestr, target_dir):
   num_seeds            = defaultdict(lambda: 0)
   end_time             = time.time()
   arch_time            = AverageMeter()
-  for idx, arch_index in enumerate(arch_indexes):
-    checkpoints = list(target_directory.glob('arch-{:}-seed-*.pth'.format(arch_index)))
-    ckps_less   = list(target_less_dir.glob('arch-{:}-seed-*.pth'.format(arch_index)))
-    # create the arch info for each architecture
-    try:
-      arch_info_full = account_one_arch(arch_index, meta_archs[int(arch_index)], checkpoints, datasets, dataloader_dict)
-      arch_info_less = account_one_arch(arch_index, meta_archs[int(arch_index)], ckps_less, ['cifar10-valid'], dataloader_dict)
-      num_seeds[ len(checkpoints) ] += 1
-    except:
-      print('Loading {:} failed, : {:}'.format(arch_index, checkpoints))
+  store, arch2infos    = ResultsStore(to_save_simply / '{:}-store'.format(basestr), meta_archs), dict()
+  global SIMPLIFY_CONTEXT
+  SIMPLIFY_CONTEXT     = (meta_archs, target_directory, target_less_dir, datasets, dataloader_dict, to_save_allarc)
+  if num_procs > 1:
+    pool    = multiprocessing.get_context('fork').Pool(num_procs)
+    results = pool.imap_unordered(simplify_one_arch, arch_indexes)
+  else:
+    pool, results = None, map(simplify_one_arch, arch_indexes)
+  for idx, (arch_index, checkpoints, simple_infos, error) in enumerate(results):
+    if simple_infos is None:
+      print('Loading {:} failed, : {:} : {:}'.format(arch_index, checkpoints, error))
       continue
     assert int(arch_index) not in evaluated_indexes, 'conflict arch-index : {:}'.format(arch_index)
     assert 0 <= int(arch_index) < len(meta_archs), 'invalid arch-index {:} (not found in meta_archs)'.format(arch_index)
-    arch_info = {'full': arch_info_full, 'less': arch_info_less}
+    num_seeds[ len(checkpoints) ] += 1
     evaluated_indexes.add( int(arch_index) )
-    arch2infos[int(arch_index)] = arch_info
-    torch.save({'full': arch_info_full.state_dict(),
-                'less': arch_info_less.state_dict()}, to_save_allarc / '{:}-FULL.pth'.format(arch_index))
-    arch_info['full'].clear_params()
-    arch_info['less'].clear_params()
-    torch.save({'full': arch_info_full.state_dict(),
-                'less': arch_info_less.state_dict()}, to_save_allarc / '{:}-SIMPLE.pth'.format(arch_index))
+    arch2infos[int(arch_index)] = simple_infos
+    if len(arch2infos) >= segment_size:
+      store.append(arch2infos, str(target_dir))
+      arch2infos = dict()
     # measure elapsed time
     arch_time.update(time.time() - end_time)
     end_time  = time.time()
     need_time = '{:}'.format( convert_secs2time(arch_time.avg * (len(arch_indexes)-idx-1), True) )
     print('{:} {:} [{:03d}/{:03d}] : {:} still need {:}'.format(time_string(), target_dir, idx, len(arch_indexes), arch_index, need_time))
+  if len(arch2infos) > 0: store.append(arch2infos, str(target_dir))
+  if pool is not None:
+    pool.close()
+    pool.join()
+  SIMPLIFY_CONTEXT = None
   # measure time
   xstrs = ['{:}:{:03d}'.format(key, num_seeds[key]) for key in sorted( list( num_seeds.keys() ) ) ]
   print('{:} {:} done : {:}'.format(time_string(), target_dir, xstrs))
-  final_infos = {'meta_archs' : meta_archs,
-                 'total_archs': meta_num_archs,
-                 'basestr'    : basestr,
-                 'arch2infos' : arch2infos,
-                 'evaluated_indexes': evaluated_indexes}
-  save_file_name = to_save_simply / '{:}.pth'.format(target_dir)
-  torch.save(final_infos, save_file_name)
-  print ('Save {:} / {:} architecture results into {:}.'.format(len(evaluated_indexes), meta_num_archs, save_file_name))
+  print ('Save {:} / {:} architecture results into {:}.'.format(len(evaluated_indexes), meta_num_archs, store))
 
 
-def merge_all(save_dir, meta_file, basestr):
+def merge_all(save_dir, meta_file, basestr, last_one_wins=False):
   meta_infos     = torch.load(meta_file, map_location='cpu')
   meta_archs     = meta_infos['archs']
   meta_num_archs = meta_infos['total']
@@ -226,38 +250,51 @@ def merge_all(save_dir, meta_file, basestr):
 
   sub_model_dirs = sorted(list(save_dir.glob('*-*-{:}'.format(basestr))))
   print ('{:} find {:} directories used to save checkpoints'.format(time_string(), len(sub_model_dirs)))
+  subdir2archs = collections.OrderedDict()
   for index, sub_dir in enumerate(sub_model_dirs):
     arch_info_files = sorted( list(sub_dir.glob('arch-*-seed-*.pth') ) )
+    subdir2archs[sub_dir] = set(int(x.name.split('-')[1]) for x in arch_info_files)
     print ('The {:02d}/{:02d}-th directory : {:} : {:} runs.'.format(index, len(sub_model_dirs), sub_dir, len(arch_info_files)))
-  
-  arch2infos, evaluated_indexes = dict(), set()
+
+  # each architecture should be trained in only one target directory, unless last_one_wins, where the results appended last are kept
+  index2dirs = defaultdict(list)
+  for sub_dir, arch_indexes in subdir2archs.items():
+    for arch_index in arch_indexes: index2dirs[arch_index].append( sub_dir.name )
+  duplicates = sorted([index for index, dirs in index2dirs.items() if len(dirs) > 1])
+  if len(duplicates) > 0:
+    for index in duplicates: print ('  the {:5d}-th architecture : {:}'.format(index, index2dirs[index]))
+    if not last_one_wins: raise ValueError('{:} architectures are found in more than one target directory (see above), please use --last_one_wins to keep the results appended last'.format(len(duplicates)))
+    print ('{:} WARNING : {:} architectures are found in more than one target directory, and the results appended last are kept.'.format(time_string(), len(duplicates)))
+
+  # all `simplify` runs append their results into the same store, and the directories simplified into simplifies/{target_dir}.pth by the earlier versions are imported
+  to_save_simply = save_dir / 'simplifies'
+  store = ResultsStore(to_save_simply / '{:}-store'.format(basestr), meta_archs)
+  stored_indexes = set(store.to_dict()['evaluated_indexes'])
   for IDX, sub_dir in enumerate(sub_model_dirs):
-    ckp_path = sub_dir.parent / 'simplifies' / '{:}.pth'.format(sub_dir.name)
-    if ckp_path.exists():
-      sub_ckps = torch.load(ckp_path, map_location='cpu')
-      assert sub_ckps['total_archs'] == meta_num_archs and sub_ckps['basestr'] == basestr
-      xarch2infos = sub_ckps['arch2infos']
-      xevalindexs = sub_ckps['evaluated_indexes']
-      for eval_index in xevalindexs:
-        assert eval_index not in evaluated_indexes and eval_index not in arch2infos
-        #arch2infos[eval_index] = xarch2infos[eval_index].state_dict()
-        arch2infos[eval_index] = {'full': xarch2infos[eval_index]['full'].state_dict(),
-                                  'less': xarch2infos[eval_index]['less'].state_dict()}
-        evaluated_indexes.add( eval_index )
-      print ('{:} [{:03d}/{:03d}] merge data from {:} with {:} models.'.format(time_string(), IDX, len(sub_model_dirs), ckp_path, len(xevalindexs)))
-    else:
-      raise ValueError('Can not find {:}'.format(ckp_path))
-      #print ('{:} [{:03d}/{:03d}] can not find {:}, skip.'.format(time_string(), IDX, len(subdir2archs), ckp_path))
+    ckp_path = to_save_simply / '{:}.pth'.format(sub_dir.name)
+    if not ckp_path.exists(): continue
+    sub_ckps = torch.load(ckp_path, map_location='cpu')
+    assert sub_ckps['total_archs'] == meta_num_archs and sub_ckps['basestr'] == basestr
+    xevalindexs = sub_ckps['evaluated_indexes']
+    if len(stored_indexes.intersection(xevalindexs)) > 0: continue # imported before (or re-simplified into the store)
+    store.append({index: {'full': sub_ckps['arch2infos'][index]['full'].state_dict(),
+                          'less': sub_ckps['arch2infos'][index]['less'].state_dict()} for index in xevalindexs}, sub_dir.name)
+    stored_indexes.update( xevalindexs )
+    print ('{:} [{:03d}/{:03d}] import data from {:} with {:} models into {:}.'.format(time_string(), IDX, len(sub_model_dirs), ckp_path, len(xevalindexs), store))
 
-  evaluated_indexes = sorted( list( evaluated_indexes ) )
+  segments = store.segments()
+  print ('{:} merge data from {:} with {:} segments and {:} architecture results.'.format(time_string(), store, len(segments), sum(len(x['indexes']) for x in segments)))
+  final_infos = store.to_dict()
+  final_infos['total_archs'] = meta_num_archs
+  evaluated_indexes = final_infos['evaluated_indexes']
+  for sub_dir, arch_indexes in subdir2archs.items():
+    missing = arch_indexes.difference(evaluated_indexes)
+    if len(missing) == len(arch_indexes) and len(missing) > 0:
+      raise ValueError('Can not find the results of {:} in {:}, please simplify it at first'.format(sub_dir, store))
+    elif len(missing) > 0: # the checkpoints that failed to load in simplify
+      print ('{:} WARNING : {:} of {:} architectures in {:} are not in {:} : {:}'.format(time_string(), len(missing), len(arch_indexes), sub_dir, store, sorted(missing)))
   print ('Finally, there are {:} architectures that have been trained and evaluated.'.format(len(evaluated_indexes)))
 
-  to_save_simply = save_dir / 'simplifies'
-  if not to_save_simply.exists(): to_save_simply.mkdir(parents=True, exist_ok=True)
-  final_infos = {'meta_archs' : meta_archs,
-                 'total_archs': meta_num_archs,
-                 'arch2infos' : arch2infos,
-                 'evaluated_indexes': evaluated_indexes}
   save_file_name = to_save_simply / '{:}-final-infos.pth'.format(basestr)
   torch.save(final_infos, save_file_name)
   print ('Save {:} / {:} architecture results into {:}.'.format(len(evaluated_indexes), meta_num_archs, save_file_name))
@@ -272,6 +309,8 @@ if __name__ == '__main__':
   parser.add_argument('--max_node'     ,  type=int, default=4,                           help='The maximum node in a cell.')
   parser.add_argument('--channel'      ,  type=int, default=16,                          help='The number of channels.')
   parser.add_argument('--num_cells'    ,  type=int, default=5,                           help='The number of cells in one stage.')
+  parser.add_argument('--procs'        ,  type=int, default=1,                           help='The number of processes to load and validate the checkpoints.')
+  parser.add_argument('--last_one_wins',  action='store_true',                           help='Merge an architecture trained in several target directories by keeping the results appended last.')
   args = parser.parse_args()
   
   save_dir  = Path(args.base_save_dir)
@@ -282,8 +321,8 @@ if __name__ == '__main__':
   basestr   = 'C{:}-N{:}'.format(args.channel, args.num_cells)
   
   if args.mode == 'cal':
-    simplify(save_dir, meta_path, basestr, args.target_dir)
+    simplify(save_dir, meta_path, basestr, args.target_dir, args.procs)
   elif args.mode == 'merge':
-    merge_all(save_dir, meta_path, basestr)
+    merge_all(save_dir, meta_path, basestr, args.last_one_wins)
   else:
     raise ValueError('invalid mode : {:}'.format(args.mode))
\ No newline at end of file
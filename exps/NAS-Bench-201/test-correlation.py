@@ -18,37 +18,11 @@ from nas_201_api  import NASBench201API as API
 
 def check_unique_arch(meta_file):
   api = API(str(meta_file))
-  arch_strs = deepcopy(api.meta_archs)
-  xarchs = [CellStructure.str2structure(x) for x in arch_strs]
-  def get_unique_matrix(archs, consider_zero):
-    UniquStrs = [arch.to_unique_str(consider_zero) for arch in archs]
-    print ('{:} create unique-string ({:}/{:}) done'.format(time_string(), len(set(UniquStrs)), len(UniquStrs)))
-    Unique2Index = dict()
-    for index, xstr in enumerate(UniquStrs):
-      if xstr not in Unique2Index: Unique2Index[xstr] = list()
-      Unique2Index[xstr].append( index )
-    sm_matrix = torch.eye(len(archs)).bool()
-    for _, xlist in Unique2Index.items():
-      for i in xlist:
-        for j in xlist:
-          sm_matrix[i,j] = True
-    unique_ids, unique_num = [-1 for _ in archs], 0
-    for i in range(len(unique_ids)):
-      if unique_ids[i] > -1: continue
-      neighbours = sm_matrix[i].nonzero().view(-1).tolist()
-      for nghb in neighbours:
-        assert unique_ids[nghb] == -1, 'impossible'
-        unique_ids[nghb] = unique_num
-      unique_num += 1
-    return sm_matrix, unique_ids, unique_num
-
+  xarchs = [CellStructure.str2structure(x) for x in api.meta_archs]
   print ('There are {:} valid-archs'.format( sum(arch.check_valid() for arch in xarchs) ))
-  sm_matrix, uniqueIDs, unique_num = get_unique_matrix(xarchs, None)
-  print ('{:} There are {:} unique architectures (considering nothing).'.format(time_string(), unique_num))
-  sm_matrix, uniqueIDs, unique_num = get_unique_matrix(xarchs, False)
-  print ('{:} There are {:} unique architectures (not considering zero).'.format(time_string(), unique_num))
-  sm_matrix, uniqueIDs, unique_num = get_unique_matrix(xarchs,  True)
-  print ('{:} There are {:} unique architectures (considering zero).'.format(time_string(), unique_num))
+  for consider_zero, xstr in ((None, 'considering nothing'), (False, 'not considering zero'), (True, 'considering zero')):
+    index = api.get_isomorphism_index(consider_zero)
+    print ('{:} There are {:} unique architectures ({:}).'.format(time_string(), index.num_classes, xstr))
 
 
 def check_cor_for_bandit(meta_file, test_epoch, use_less_or_not, is_rand=True, need_print=False):
@@ -56,27 +30,16 @@ def check_cor_for_bandit(meta_file, test_epoch, use_less_or_not, is_rand=True, n
     api = meta_file
   else:
     api = API(str(meta_file))
-  cifar10_currs     = []
-  cifar10_valid     = []
-  cifar10_test      = []
-  cifar100_valid    = []
-  cifar100_test     = []
-  imagenet_test     = []
-  imagenet_valid    = []
-  for idx, arch in enumerate(api):
-    results = api.get_more_info(idx, 'cifar10-valid' , test_epoch-1, use_less_or_not, is_rand)
-    cifar10_currs.append( results['valid-accuracy'] )
-    # --->>>>>
-    results = api.get_more_info(idx, 'cifar10-valid' , None, False, is_rand)
-    cifar10_valid.append( results['valid-accuracy'] )
-    results = api.get_more_info(idx, 'cifar10'       , None, False, is_rand)
-    cifar10_test.append( results['test-accuracy'] )
-    results = api.get_more_info(idx, 'cifar100'      , None, False, is_rand)
-    cifar100_test.append( results['test-accuracy'] )
-    cifar100_valid.append( results['valid-accuracy'] )
-    results = api.get_more_info(idx, 'ImageNet16-120', None, False, is_rand)
-    imagenet_test.append( results['test-accuracy'] )
-    imagenet_valid.append( results['valid-accuracy'] )
+  # one batched query per dataset for all architectures, see `get_learning_curves` for the whole curves
+  indexes = np.arange(len(api))
+  cifar10_currs  = api.get_more_info_batch(indexes, 'cifar10-valid' , test_epoch-1, use_less_or_not, is_rand)['valid-accuracy']
+  # --->>>>>
+  cifar10_valid  = api.get_more_info_batch(indexes, 'cifar10-valid' , None, False, is_rand)['valid-accuracy']
+  cifar10_test   = api.get_more_info_batch(indexes, 'cifar10'       , None, False, is_rand)['test-accuracy']
+  results        = api.get_more_info_batch(indexes, 'cifar100'      , None, False, is_rand)
+  cifar100_test, cifar100_valid = results['test-accuracy'], results['valid-accuracy']
+  results        = api.get_more_info_batch(indexes, 'ImageNet16-120', None, False, is_rand)
+  imagenet_test, imagenet_valid = results['test-accuracy'], results['valid-accuracy']
   def get_cor(A, B):
     return float(np.corrcoef(A, B)[0,1])
   cors = []
@@ -31,7 +31,7 @@ def tostr(accdict, norms):
   return ' '.join(xstr)
 
 
-def evaluate(api, weight_dir, data: str, use_12epochs_result: bool):
+def evaluate(api, data: str, use_12epochs_result: bool):
   print('\nEvaluate dataset={:}'.format(data))
   norms, process = [], psutil.Process(os.getpid())
   final_val_accs = OrderedDict({'cifar10': [], 'cifar100': [], 'ImageNet16-120': []})
@@ -50,7 +50,6 @@ def evaluate(api, weight_dir, data: str, use_12epochs_result: bool):
         final_val_accs[key].append(info['valid-accuracy'])
     config = api.get_net_config(idx, data)
     net = get_cell_based_tiny_net(config)
-    api.reload(weight_dir, idx)
     params = api.get_net_param(idx, data, None, use_12epochs_result=use_12epochs_result)
     cur_norms = []
     for seed, param in params.items():
@@ -63,7 +62,6 @@ def evaluate(api, weight_dir, data: str, use_12epochs_result: bool):
       print ('  IGNORE {:} due to nan.'.format(idx))
       continue
     norms.append(cur_norm)
-    api.clear_params(idx, None)
     if idx % 200 == 199 or idx + 1 == len(api):
       head = '{:05d}/{:05d}'.format(idx, len(api))
       stem_val = tostr(final_val_accs, norms)
@@ -74,8 +72,9 @@ def evaluate(api, weight_dir, data: str, use_12epochs_result: bool):
       gc.collect()
 
 
-def main(meta_file: str, weight_dir, save_dir, xdata, use_12epochs_result):
+def main(meta_file: str, weight_dir, save_dir, xdata, use_12epochs_result, cache_mb):
   api = API(meta_file)
+  cache = api.enable_lazy_weights(weight_dir, int(cache_mb * 1024 * 1024))
   datasets = ['cifar10-valid', 'cifar10', 'cifar100', 'ImageNet16-120']
   print(time_string() + ' ' + '='*50)
   for data in datasets:
@@ -90,7 +89,8 @@ def main(meta_file: str, weight_dir, save_dir, xdata, use_12epochs_result):
   print(time_string() + ' ' + '='*50)
 
   #evaluate(api, weight_dir, 'cifar10-valid', False, True)
-  evaluate(api, weight_dir, xdata, use_12epochs_result)
+  evaluate(api, xdata, use_12epochs_result)
+  print('{:} weights cache : {:}'.format(time_string(), cache))
   
   print('{:} finish this test.'.format(time_string()))
 
@@ -101,6 +101,7 @@ if __name__ == '__main__':
   parser.add_argument('--base_path',  type=str, default=None, help='The path to the NAS-Bench-201 benchmark file and weight dir.')
   parser.add_argument('--dataset'  ,  type=str, default=None, help='.')
   parser.add_argument('--use_12'   ,  type=int, default=None, help='.')
+  parser.add_argument('--cache_mb' ,  type=int, default=2048, help='The maximum size (MB) of the cached weights.')
   args = parser.parse_args()
 
   save_dir = Path(args.save_dir)
@@ -110,5 +111,5 @@ if __name__ == '__main__':
   assert meta_file.exists(), 'invalid path for api : {:}'.format(meta_file)
   assert weight_dir.exists() and weight_dir.is_dir(), 'invalid path for weight dir : {:}'.format(weight_dir)
 
-  main(str(meta_file), weight_dir, save_dir, args.dataset, bool(args.use_12))
+  main(str(meta_file), weight_dir, save_dir, args.dataset, bool(args.use_12), args.cache_mb)
 
@@ -134,7 +134,7 @@ def visualize_info(meta_file, dataset, vis_save_dir):
     nas_bench = API(str(meta_file))
     params, flops, train_accs, valid_accs, test_accs, otest_accs = [], [], [], [], [], []
     for index in range( len(nas_bench) ):
-      info = nas_bench.query_by_index(index, use_12epochs_result=False)
+      info = nas_bench.query_by_index(index, use_12epochs_result=False, clone=False)
       resx = info.get_comput_costs(dataset) ; flop, param = resx['flops'], resx['params']
       if dataset == 'cifar10':
         res = info.get_metrics('cifar10', 'train')         ; train_acc = res['accuracy']
@@ -287,7 +287,7 @@ def visualize_rank_over_time(meta_file, vis_save_dir):
     params, flops, train_accs, valid_accs, test_accs, otest_accs = [], [], defaultdict(list), defaultdict(list), defaultdict(list), defaultdict(list)
     #for iepoch in range(200): for index in range( len(nas_bench) ):
     for index in tqdm(range(len(nas_bench))):
-      info = nas_bench.query_by_index(index, use_12epochs_result=False)
+      info = nas_bench.query_by_index(index, use_12epochs_result=False, clone=False)
       for iepoch in range(200):
         res = info.get_metrics('cifar10'      , 'train'   , iepoch) ; train_acc = res['accuracy']
         res = info.get_metrics('cifar10-valid', 'x-valid' , iepoch) ; valid_acc = res['accuracy']
@@ -9,13 +9,14 @@ import os, sys, time, random, argparse
 from copy import deepcopy
 from pathlib import Path
 import torch
+import numpy as np
 lib_dir = (Path(__file__).parent / '..' / '..' / 'lib').resolve()
 if str(lib_dir) not in sys.path: sys.path.insert(0, str(lib_dir))
 from config_utils import load_config
 from datasets     import get_datasets, SearchDataset
-from procedures   import prepare_seed, prepare_logger
+from procedures   import prepare_seed, prepare_logger, run_trials
 from log_utils    import AverageMeter, time_string, convert_secs2time
-from nas_201_api  import NASBench201API as API
+from nas_201_api  import NASBench201API as API, NASBench201ColumnarAPI as ColumnarAPI, NASBench201Client as ClientAPI, is_server_address, load_authkey
 from models       import CellStructure, get_search_spaces
 # BOHB: Robust and Efficient Hyperparameter Optimization at Scale, ICML 2018
 import ConfigSpace
@@ -63,15 +64,8 @@ class MyWorker(Worker):
 
   def get_the_best(self):
     assert len(self.seen_archs) > 0
-    best_index, best_acc = -1, None
-    for arch_index in self.seen_archs:
-      info = self._nas_bench.get_more_info(arch_index, self._dataname, None, True, True)
-      vacc = info['valid-accuracy']
-      if best_acc is None or best_acc < vacc:
-        best_acc = vacc
-        best_index = arch_index
-    assert best_index != -1
-    return best_index
+    infos = self._nas_bench.get_more_info_batch(self.seen_archs, self._dataname, None, True, True)
+    return self.seen_archs[ int(np.argmax(infos['valid-accuracy'])) ]
 
   def compute(self, config, budget, **kwargs):
     start_time = time.time()
@@ -137,7 +131,7 @@ def main(xargs, nas_bench):
     extra_info = {'config': config, 'train_loader': None, 'valid_loader': None}
 
   # nas dataset load
-  assert xargs.arch_nas_dataset is not None and os.path.isfile(xargs.arch_nas_dataset)
+  assert nas_bench is not None, 'BOHB requires the benchmark API, but --arch_nas_dataset is {:}'.format(xargs.arch_nas_dataset)
   search_space = get_search_spaces('cell', xargs.search_space_name)
   cs = get_configuration_space(xargs.max_nodes, search_space)
 
@@ -210,23 +204,25 @@ if __name__ == '__main__':
   parser.add_argument('--workers',            type=int,   default=2,    help='number of data loading workers (default: 2)')
   parser.add_argument('--save_dir',           type=str,   help='Folder to save checkpoints and log.')
   parser.add_argument('--arch_nas_dataset',   type=str,   help='The path to load the architecture dataset (tiny-nas-benchmark).')
+  parser.add_argument('--authkey',            type=str,   help='The file of the authkey of the server in arch_nas_dataset (default: the environment variable NAS_BENCH_201_AUTHKEY).')
   parser.add_argument('--print_freq',         type=int,   help='print frequency (default: 200)')
   parser.add_argument('--rand_seed',          type=int,   help='manual seed')
+  parser.add_argument('--num_trials',         type=int,   default=500,  help='the number of trials with random seeds if rand_seed < 0')
+  parser.add_argument('--trial_workers',      type=int,   default=1,    help='the number of processes to run the trials if rand_seed < 0')
   args = parser.parse_args()
   #if args.rand_seed is None or args.rand_seed < 0: args.rand_seed = random.randint(1, 100000)
-  if args.arch_nas_dataset is None or not os.path.isfile(args.arch_nas_dataset):
+  if args.arch_nas_dataset is not None and is_server_address(args.arch_nas_dataset):
+    print ('{:} connect to the NAS-Benchmark-API server at {:}'.format(time_string(), args.arch_nas_dataset))
+    nas_bench = ClientAPI(args.arch_nas_dataset, load_authkey(args.authkey)) # see exps/NAS-Bench-201/serve.py
+  elif args.arch_nas_dataset is None or not os.path.exists(args.arch_nas_dataset):
     nas_bench = None
   else:
     print ('{:} build NAS-Benchmark-API from {:}'.format(time_string(), args.arch_nas_dataset))
-    nas_bench = API(args.arch_nas_dataset)
+    if os.path.isdir(args.arch_nas_dataset): nas_bench = ColumnarAPI(args.arch_nas_dataset) # see exps/NAS-Bench-201/convert-columnar.py
+    else                                   : nas_bench = API(args.arch_nas_dataset)
   if args.rand_seed < 0:
-    save_dir, all_indexes, num, all_times = None, [], 500, []
-    for i in range(num):
-      print ('{:} : {:03d}/{:03d}'.format(time_string(), i, num))
-      args.rand_seed = random.randint(1, 100000)
-      save_dir, index, ctime = main(args, nas_bench)
-      all_indexes.append( index ) 
-      all_times.append( ctime )
+    results = run_trials(main, args, nas_bench, args.num_trials, args.trial_workers)
+    save_dir, all_indexes, all_times = results[0][0], [x[1] for x in results], [x[2] for x in results]
     print ('\n average time : {:.3f} s'.format(sum(all_times)/len(all_times)))
     torch.save(all_indexes, save_dir / 'results.pth')
   else:
@@ -6,6 +6,7 @@
 import os, sys, time, glob, random, argparse
 import numpy as np
 from copy import deepcopy
+from contextlib import contextmanager
 import torch
 import torch.nn as nn
 from pathlib import Path
@@ -20,73 +21,91 @@ from models       import get_cell_based_tiny_net, get_search_spaces
 from nas_201_api  import NASBench201API as API
 
 
-def _concat(xs):
-  return torch.cat([x.view(-1) for x in xs])
+class VirtualWeights(object):
+  """The preallocated buffers of the second-order step, which replace the copy of the whole model in each architecture step.
+     `virtual` holds the virtual weights w' = w - LR * (momentum * v + dw + WD * w), or the perturbed weights w +- R * dw' of
+     the Hessian-vector product, and is swapped into the weights by their .data; `scratch` holds the momentum buffers or dw'.
+     The buffers of the network (the running statistics of BN) are restored after the forward with w', as the copied model did.
+  """
+  def __init__(self, network):
+    self.weights = list(network.module.get_weights())
+    self.sizes   = [p.numel() for p in self.weights]
+    self.virtual = torch.empty(sum(self.sizes), dtype=self.weights[0].dtype, device=self.weights[0].device)
+    self.scratch = torch.empty_like(self.virtual)
+    self.views   = [x.view_as(p) for x, p in zip(self.virtual.split(self.sizes), self.weights)]
+    self.buffers = list(network.buffers())
+    self.saved   = [torch.empty_like(x) for x in self.buffers]
 
+  def gather(self, tensors, out):
+    return torch.cat([x.reshape(-1) for x in tensors], out=out)
 
-def _hessian_vector_product(vector, network, criterion, base_inputs, base_targets, r=1e-2):
-  R = r / _concat(vector).norm()
-  for p, v in zip(network.module.get_weights(), vector):
-    p.data.add_(R, v)
-  _, logits = network(base_inputs)
-  loss = criterion(logits, base_targets)
-  grads_p = torch.autograd.grad(loss, network.module.get_alphas())
+  @contextmanager
+  def swapped(self, keep_buffers=False):
+    datas = [p.data for p in self.weights]
+    if keep_buffers:
+      for x, saved in zip(self.buffers, self.saved): saved.copy_(x)
+    for p, x in zip(self.weights, self.views): p.data = x
+    try:
+      yield
+    finally:
+      for p, x in zip(self.weights, datas): p.data = x
+      if keep_buffers:
+        for x, saved in zip(self.buffers, self.saved): x.copy_(saved)
 
-  for p, v in zip(network.module.get_weights(), vector):
-    p.data.sub_(2*R, v)
-  _, logits = network(base_inputs)
-  loss = criterion(logits, base_targets)
-  grads_n = torch.autograd.grad(loss, network.module.get_alphas())
 
-  for p, v in zip(network.module.get_weights(), vector):
-    p.data.add_(R, v)
+def _hessian_vector_product(vector, network, criterion, base_inputs, base_targets, virtual, r=1e-2):
+  # the weights are not changed, and the perturbed weights w + R * dw' and w - R * dw' are written into virtual.virtual in place
+  with torch.no_grad():
+    vector = virtual.gather(vector, virtual.scratch)
+    R = r / vector.norm()
+    virtual.gather(virtual.weights, virtual.virtual).addcmul_(vector, R)
+  with virtual.swapped():
+    _, logits = network(base_inputs)
+    loss = criterion(logits, base_targets)
+    grads_p = torch.autograd.grad(loss, network.module.get_alphas())
+
+  with torch.no_grad():
+    virtual.virtual.addcmul_(vector, R, value=-2)
+  with virtual.swapped():
+    _, logits = network(base_inputs)
+    loss = criterion(logits, base_targets)
+    grads_n = torch.autograd.grad(loss, network.module.get_alphas())
   return [(x-y).div_(2*R) for x, y in zip(grads_p, grads_n)]
 
 
-def backward_step_unrolled(network, criterion, base_inputs, base_targets, w_optimizer, arch_inputs, arch_targets):
+def backward_step_unrolled(network, criterion, base_inputs, base_targets, w_optimizer, arch_inputs, arch_targets, virtual):
   # _compute_unrolled_model
   _, logits = network(base_inputs)
   loss = criterion(logits, base_targets)
   LR, WD, momentum = w_optimizer.param_groups[0]['lr'], w_optimizer.param_groups[0]['weight_decay'], w_optimizer.param_groups[0]['momentum']
+  weights = virtual.weights
+  dtheta  = torch.autograd.grad(loss, weights)
   with torch.no_grad():
-    theta = _concat(network.module.get_weights())
-    try:
-      moment = _concat(w_optimizer.state[v]['momentum_buffer'] for v in network.module.get_weights())
-      moment = moment.mul_(momentum)
-    except:
-      moment = torch.zeros_like(theta)
-    dtheta = _concat(torch.autograd.grad(loss, network.module.get_weights())) + WD*theta
-    params = theta.sub(LR, moment+dtheta)
-  unrolled_model = deepcopy(network)
-  model_dict  = unrolled_model.state_dict()
-  new_params, offset = {}, 0
-  for k, v in network.named_parameters():
-    if 'arch_parameters' in k: continue
-    v_length = np.prod(v.size())
-    new_params[k] = params[offset: offset+v_length].view(v.size())
-    offset += v_length
-  model_dict.update(new_params)
-  unrolled_model.load_state_dict(model_dict)
+    # w' = (1 - LR * WD) * w - LR * (momentum * v + dw)
+    params  = virtual.gather(dtheta, virtual.virtual)
+    moments = [w_optimizer.state[v].get('momentum_buffer', None) for v in weights]
+    if momentum > 0 and all(x is not None for x in moments):
+      params.add_(virtual.gather(moments, virtual.scratch), alpha=momentum)
+    params.mul_(-LR).add_(virtual.gather(weights, virtual.scratch), alpha=1-LR*WD)
 
-  unrolled_model.zero_grad()
-  _, unrolled_logits = unrolled_model(arch_inputs)
-  unrolled_loss = criterion(unrolled_logits, arch_targets)
-  unrolled_loss.backward()
+  with virtual.swapped(keep_buffers=True):
+    _, unrolled_logits = network(arch_inputs)
+    unrolled_loss = criterion(unrolled_logits, arch_targets)
+    grads = torch.autograd.grad(unrolled_loss, [network.module.arch_parameters] + weights)
 
-  dalpha = unrolled_model.module.arch_parameters.grad
-  vector = [v.grad.data for v in unrolled_model.module.get_weights()]
-  [implicit_grads] = _hessian_vector_product(vector, network, criterion, base_inputs, base_targets)
+  dalpha, vector = grads[0], grads[1:]
+  [implicit_grads] = _hessian_vector_product(vector, network, criterion, base_inputs, base_targets, virtual)
   
-  dalpha.data.sub_(LR, implicit_grads.data)
+  dalpha.sub_(implicit_grads, alpha=LR)
 
   if network.module.arch_parameters.grad is None:
-    network.module.arch_parameters.grad = deepcopy( dalpha )
+    network.module.arch_parameters.grad = dalpha
   else:
     network.module.arch_parameters.grad.data.copy_( dalpha.data )
   return unrolled_loss.detach(), unrolled_logits.detach()
   
 
-def search_func(xloader, network, criterion, scheduler, w_optimizer, a_optimizer, epoch_str, print_freq, logger):
+def search_func(xloader, network, criterion, scheduler, w_optimizer, a_optimizer, virtual, epoch_str, print_freq, logger):
   data_time, batch_time = AverageMeter(), AverageMeter()
   base_losses, base_top1, base_top5 = AverageMeter(), AverageMeter(), AverageMeter()
   arch_losses, arch_top1, arch_top5 = AverageMeter(), AverageMeter(), AverageMeter()
@@ -101,7 +120,7 @@ def search_func(xloader, network, criterion, scheduler, w_optimizer, a_optimizer
 
     # update the architecture-weight
     a_optimizer.zero_grad()
-    arch_loss, arch_logits = backward_step_unrolled(network, criterion, base_inputs, base_targets, w_optimizer, arch_inputs, arch_targets)
+    arch_loss, arch_logits = backward_step_unrolled(network, criterion, base_inputs, base_targets, w_optimizer, arch_inputs, arch_targets, virtual)
     a_optimizer.step()
     # record
     arch_prec1, arch_prec5 = obtain_accuracy(arch_logits.data, arch_targets.data, topk=(1, 5))
@@ -199,6 +218,7 @@ def main(xargs):
 
   last_info, model_base_path, model_best_path = logger.path('info'), logger.path('model'), logger.path('best')
   network, criterion = torch.nn.DataParallel(search_model).cuda(), criterion.cuda()
+  virtual = VirtualWeights(network) # after .cuda(), to allocate the buffers on GPU
 
   if last_info.exists(): # automatically resume from previous checkpoint
     logger.log("=> loading checkpoint of the last-info '{:}' start".format(last_info))
@@ -225,7 +245,7 @@ def main(xargs):
     min_LR    = min(w_scheduler.get_lr())
     logger.log('\n[Search the {:}-th epoch] {:}, LR={:}'.format(epoch_str, need_time, min_LR))
 
-    search_w_loss, search_w_top1, search_w_top5 = search_func(search_loader, network, criterion, w_scheduler, w_optimizer, a_optimizer, epoch_str, xargs.print_freq, logger)
+    search_w_loss, search_w_top1, search_w_top5 = search_func(search_loader, network, criterion, w_scheduler, w_optimizer, a_optimizer, virtual, epoch_str, xargs.print_freq, logger)
     search_time.update(time.time() - start_time)
     logger.log('[{:}] searching : loss={:.2f}, accuracy@1={:.2f}%, accuracy@5={:.2f}%, time-cost={:.1f} s'.format(epoch_str, search_w_loss, search_w_top1, search_w_top5, search_time.sum))
     valid_a_loss , valid_a_top1 , valid_a_top5  = valid_func(valid_loader, network, criterion)
@@ -26,6 +26,10 @@ def train_shared_cnn(xloader, shared_cnn, controller, criterion, scheduler, opti
   
   shared_cnn.train()
   controller.eval()
+  # the controller is fixed, so the architectures of all steps are sampled in one pass
+  with torch.no_grad():
+    _, _, sampled_archs = controller.sample(len(xloader))
+    sampled_archs = sampled_archs.tolist()
 
   for step, (inputs, targets) in enumerate(xloader):
     scheduler.update(None, 1.0 * step / len(xloader))
@@ -33,11 +37,8 @@ def train_shared_cnn(xloader, shared_cnn, controller, criterion, scheduler, opti
     # measure data loading time
     data_time.update(time.time() - xend)
     
-    with torch.no_grad():
-      _, _, sampled_arch = controller()
-
     optimizer.zero_grad()
-    shared_cnn.module.update_arch(sampled_arch)
+    shared_cnn.module.update_arch(sampled_archs[step])
     _, logits = shared_cnn(inputs)
     loss      = criterion(logits, targets)
     loss.backward()
@@ -82,7 +83,11 @@ def train_controller(xloader, shared_cnn, controller, criterion, optimizer, conf
     # measure data loading time
     data_time.update(time.time() - xend)
     
-    log_prob, entropy, sampled_arch = controller()
+    # the ctl_num_aggre architectures of one update are sampled in one pass
+    if step % config.ctl_num_aggre == 0:
+      log_probs, entropys, sampled_archs = controller.sample(config.ctl_num_aggre)
+      sampled_archs, ctl_losses = sampled_archs.tolist(), []
+    log_prob, entropy, sampled_arch = log_probs[step % config.ctl_num_aggre], entropys[step % config.ctl_num_aggre], sampled_archs[step % config.ctl_num_aggre]
     with torch.no_grad():
       shared_cnn.module.update_arch(sampled_arch)
       _, logits = shared_cnn(inputs)
@@ -103,14 +108,14 @@ def train_controller(xloader, shared_cnn, controller, criterion, optimizer, conf
     LossMeter.update(loss.item())
     EntropyMeter.update(entropy.item())
   
-    # Average gradient over controller_num_aggregate samples
-    loss = loss / config.ctl_num_aggre
-    loss.backward(retain_graph=True)
+    ctl_losses.append( loss )
 
     # measure elapsed time
     batch_time.update(time.time() - xend)
     xend = time.time()
     if (step+1) % config.ctl_num_aggre == 0:
+      # Average gradient over controller_num_aggregate samples
+      torch.cat(ctl_losses).mean().backward()
       grad_norm = torch.nn.utils.clip_grad_norm_(controller.parameters(), 5.0)
       GradnormMeter.update(grad_norm)
       optimizer.step()
@@ -131,15 +136,15 @@ def get_best_arch(controller, shared_cnn, xloader, n_samples=10):
     controller.eval()
     shared_cnn.eval()
     archs, valid_accs = [], []
+    _, _, sampled_archs = controller.sample(n_samples)
     loader_iter = iter(xloader)
-    for i in range(n_samples):
+    for sampled_arch in sampled_archs.tolist():
       try:
         inputs, targets = next(loader_iter)
       except:
         loader_iter = iter(xloader)
         inputs, targets = next(loader_iter)
 
-      _, _, sampled_arch = controller()
       arch = shared_cnn.module.update_arch(sampled_arch)
       _, logits = shared_cnn(inputs)
       val_top1, val_top5 = obtain_accuracy(logits.cpu().data, targets.data, topk=(1, 5))
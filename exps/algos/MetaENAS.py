@@ -14,6 +14,7 @@ if str(lib_dir) not in sys.path: sys.path.insert(0, str(lib_dir))
 from config_utils import load_config, dict2config, configure2str
 from datasets     import get_datasets, get_nas_search_loaders
 from procedures   import prepare_seed, prepare_logger, save_checkpoint, copy_checkpoint, get_optim_scheduler
+from procedures   import cache_batches, SupernetEvaluator
 from utils        import get_model_infos, obtain_accuracy
 from log_utils    import AverageMeter, time_string, convert_secs2time
 from models       import get_cell_based_tiny_net, get_search_spaces
@@ -143,7 +144,11 @@ def train_controller(xloader, w_loader, shared_cnn, controller, criterion, optim
     # measure data loading time
     data_time.update(time.time() - xend)
 
-    log_prob, entropy, sampled_arch = controller()
+    # the ctl_num_aggre architectures of one update are sampled in one pass
+    if step % config.ctl_num_aggre == 0:
+      log_probs, entropys, sampled_archs = controller.sample(config.ctl_num_aggre)
+      sampled_archs, ctl_losses = sampled_archs.tolist(), []
+    log_prob, entropy, sampled_arch = log_probs[step % config.ctl_num_aggre], entropys[step % config.ctl_num_aggre], sampled_archs[step % config.ctl_num_aggre]
     shared_cnn.update_arch(sampled_arch)
     #few shot start
     if n_shot > 0:
@@ -205,11 +210,11 @@ def train_controller(xloader, w_loader, shared_cnn, controller, criterion, optim
     LossMeter.update(loss.item())
     EntropyMeter.update(entropy.item())
 
-    # Average gradient over controller_num_aggregate samples
-    loss = loss / config.ctl_num_aggre
-    loss.backward(retain_graph=True)
+    ctl_losses.append( loss )
 
     if (step+1) % config.ctl_num_aggre == 0:
+      # Average gradient over controller_num_aggregate samples
+      torch.cat(ctl_losses).mean().backward()
       grad_norm = torch.nn.utils.clip_grad_norm_(controller.parameters(), 5.0)
       GradnormMeter.update(grad_norm)
       optimizer.step()
@@ -229,55 +234,26 @@ def train_controller(xloader, w_loader, shared_cnn, controller, criterion, optim
   return LossMeter.avg, ValAccMeter.avg, BaselineMeter.avg, RewardMeter.avg, baseline.item(), few_shot_time.sum
 
 
-def get_best_arch(controller, shared_cnn, xloader, n_samples=10):
+def sample_archs(controller, shared_cnn, n_samples):
   with torch.no_grad():
     controller.eval()
-    shared_cnn.eval()
-    archs, valid_accs = [], []
-    loader_iter = iter(xloader)
-    for i in range(n_samples):
-      try:
-        inputs, targets = next(loader_iter)
-      except:
-        loader_iter = iter(xloader)
-        inputs, targets = next(loader_iter)
-
-      _, _, sampled_arch = controller()
-      arch = shared_cnn.update_arch(sampled_arch)
-      inputs = inputs.cuda()
-      _, logits = shared_cnn(inputs)
-      val_top1, val_top5 = obtain_accuracy(logits.cpu().data, targets.data, topk=(1, 5))
-
-      archs.append( arch )
-      valid_accs.append( val_top1.item() )
-
-    best_idx = np.argmax(valid_accs)
-    best_arch, best_valid_acc = archs[best_idx], valid_accs[best_idx]
-    return best_arch, best_valid_acc
-
+    _, _, sampled_archs = controller.sample(n_samples)
+    archs = [shared_cnn.update_arch(sampled_arch) for sampled_arch in sampled_archs.tolist()]
+  return archs
+
+# all candidates are evaluated on the same `num_batches` cached batches
+def get_best_arch(controller, shared_cnn, xloader, n_samples=10, num_batches=1):
+  archs = sample_archs(controller, shared_cnn, n_samples)
+  evaluator = SupernetEvaluator(shared_cnn, archs)
+  best_arch, best_valid_acc, _ = evaluator.get_best( cache_batches(xloader, num_batches) )
+  return best_arch, best_valid_acc
+
+# all candidates are evaluated on the whole loader, which is streamed only once
 def get_true_best_arch(controller, shared_cnn, xloader, n_samples=10):
-  with torch.no_grad():
-    controller.eval()
-    shared_cnn.eval()
-    archs, valid_accs = [], []
-    # loader_iter = iter(xloader)
-    for i in range(n_samples):
-        _, _, sampled_arch = controller()
-        arch = shared_cnn.update_arch(sampled_arch)
-        valid_top1_mean = 0.
-        # valid_top5_mean = 0.
-        for inputs, targets in xloader:
-          inputs = inputs.cuda()
-          _, logits = shared_cnn(inputs)
-          val_top1, val_top5 = obtain_accuracy(logits.cpu().data, targets.data, topk=(1, 5))
-          valid_top1_mean += val_top1.item() / len(xloader)
-          # valid_top5_mean += val_top5.item() / len(xloader)
-        archs.append( arch )
-        valid_accs.append( valid_top1_mean )
-
-    best_idx = np.argmax(valid_accs)
-    best_arch, best_valid_acc = archs[best_idx], valid_accs[best_idx]
-    return best_arch, best_valid_acc
+  archs = sample_archs(controller, shared_cnn, n_samples)
+  evaluator = SupernetEvaluator(shared_cnn, archs)
+  best_arch, best_valid_acc, _ = evaluator.get_best( xloader )
+  return best_arch, best_valid_acc
 
 def valid_func(xloader, network, criterion):
   data_time, batch_time = AverageMeter(), AverageMeter()
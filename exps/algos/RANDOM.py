@@ -11,11 +11,11 @@ lib_dir = (Path(__file__).parent / '..' / '..' / 'lib').resolve()
 if str(lib_dir) not in sys.path: sys.path.insert(0, str(lib_dir))
 from config_utils import load_config, dict2config, configure2str
 from datasets     import get_datasets, SearchDataset
-from procedures   import prepare_seed, prepare_logger, save_checkpoint, copy_checkpoint, get_optim_scheduler
+from procedures   import prepare_seed, prepare_logger, save_checkpoint, copy_checkpoint, get_optim_scheduler, run_trials
 from utils        import get_model_infos, obtain_accuracy
 from log_utils    import AverageMeter, time_string, convert_secs2time
 from models       import get_search_spaces
-from nas_201_api  import NASBench201API as API
+from nas_201_api  import NASBench201API as API, NASBench201ColumnarAPI as ColumnarAPI, NASBench201Client as ClientAPI, is_server_address, load_authkey
 from R_EA         import train_and_eval, random_architecture_func
 
 
@@ -98,22 +98,25 @@ if __name__ == '__main__':
   parser.add_argument('--workers',            type=int,   default=2,    help='number of data loading workers (default: 2)')
   parser.add_argument('--save_dir',           type=str,   help='Folder to save checkpoints and log.')
   parser.add_argument('--arch_nas_dataset',   type=str,   help='The path to load the architecture dataset (tiny-nas-benchmark).')
+  parser.add_argument('--authkey',            type=str,   help='The file of the authkey of the server in arch_nas_dataset (default: the environment variable NAS_BENCH_201_AUTHKEY).')
   parser.add_argument('--print_freq',         type=int,   help='print frequency (default: 200)')
   parser.add_argument('--rand_seed',          type=int,   help='manual seed')
+  parser.add_argument('--num_trials',         type=int,   default=500,  help='the number of trials with random seeds if rand_seed < 0')
+  parser.add_argument('--trial_workers',      type=int,   default=1,    help='the number of processes to run the trials if rand_seed < 0')
   args = parser.parse_args()
   #if args.rand_seed is None or args.rand_seed < 0: args.rand_seed = random.randint(1, 100000)
-  if args.arch_nas_dataset is None or not os.path.isfile(args.arch_nas_dataset):
+  if args.arch_nas_dataset is not None and is_server_address(args.arch_nas_dataset):
+    print ('{:} connect to the NAS-Benchmark-API server at {:}'.format(time_string(), args.arch_nas_dataset))
+    nas_bench = ClientAPI(args.arch_nas_dataset, load_authkey(args.authkey)) # see exps/NAS-Bench-201/serve.py
+  elif args.arch_nas_dataset is None or not os.path.exists(args.arch_nas_dataset):
     nas_bench = None
   else:
     print ('{:} build NAS-Benchmark-API from {:}'.format(time_string(), args.arch_nas_dataset))
-    nas_bench = API(args.arch_nas_dataset)
+    if os.path.isdir(args.arch_nas_dataset): nas_bench = ColumnarAPI(args.arch_nas_dataset) # see exps/NAS-Bench-201/convert-columnar.py
+    else                                   : nas_bench = API(args.arch_nas_dataset)
   if args.rand_seed < 0:
-    save_dir, all_indexes, num = None, [], 500
-    for i in range(num):
-      print ('{:} : {:03d}/{:03d}'.format(time_string(), i, num))
-      args.rand_seed = random.randint(1, 100000)
-      save_dir, index = main(args, nas_bench)
-      all_indexes.append( index )
+    results = run_trials(main, args, nas_bench, args.num_trials, args.trial_workers)
+    save_dir, all_indexes = results[0][0], [x[1] for x in results]
     torch.save(all_indexes, save_dir / 'results.pth')
   else:
     main(args, nas_bench)
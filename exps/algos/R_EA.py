@@ -13,11 +13,11 @@ lib_dir = (Path(__file__).parent / '..' / '..' / 'lib').resolve()
 if str(lib_dir) not in sys.path: sys.path.insert(0, str(lib_dir))
 from config_utils import load_config, dict2config, configure2str
 from datasets     import get_datasets, SearchDataset
-from procedures   import prepare_seed, prepare_logger, save_checkpoint, copy_checkpoint, get_optim_scheduler
+from procedures   import prepare_seed, prepare_logger, save_checkpoint, copy_checkpoint, get_optim_scheduler, run_trials
 from utils        import get_model_infos, obtain_accuracy
 from log_utils    import AverageMeter, time_string, convert_secs2time
-from nas_201_api  import NASBench201API as API
-from models       import CellStructure, get_search_spaces
+from nas_201_api  import NASBench201API as API, NASBench201ColumnarAPI as ColumnarAPI, NASBench201Client as ClientAPI, is_server_address, load_authkey
+from models       import CellStructure, CellArchCodec, get_search_spaces
 
 
 class Model(object):
@@ -167,6 +167,84 @@ def regularized_evolution(cycles, population_size, sample_size, time_budget, ran
   return history, total_time_cost
 
 
+def regularized_evolution_batch(num_runs, population_size, sample_size, time_budget, codec, nas_bench, dataname, rng):
+  """Run `num_runs` independent regularized evolutions side by side, which is the same algorithm as `regularized_evolution` with `train_and_eval(..., use_012_epoch_training=True)`.
+  The architectures are the code vectors of `codec` stored in integer arrays, and each run produces one child per cycle.
+  The children of all runs in one cycle are evaluated by one `get_more_info_batch` query, where the codes are mapped to the benchmark indexes by `nas_bench.code2index()`.
+  Both the mutations and the trial of each evaluation are drawn by `rng`.
+
+  Returns:
+    best_indexes, best_accuracies, num_archs, total_costs: the arrays of [num_runs], where best_indexes are the benchmark indexes and num_archs is the length of the history of each run.
+  """
+  num_ops, num_edges = len(codec.op_names), codec.num_edges
+  bases = np.array([num_ops ** (num_edges-1-k) for k in range(num_edges)], dtype=np.int64)
+  code2index = nas_bench.code2index()
+  assert len(code2index) == num_ops ** num_edges, 'the codec does not match the benchmark : {:} vs {:}'.format(num_ops ** num_edges, len(code2index))
+  # the k-th edge of the i-th node (i=1,2,...) is at position i*(i-1)/2 + k of the code vector
+  node_starts = np.array([i * (i-1) // 2 for i in range(1, codec.max_nodes)], dtype=np.int64)
+  runs = np.arange(num_runs)
+
+  def query(codes):
+    info = nas_bench.get_more_info_batch(code2index[codes.reshape(-1, num_edges).dot(bases)], dataname, None, True, rng)
+    accuracies, time_costs = info['valid-accuracy'], info['train-all-time'] + info['valid-per-time']
+    return accuracies.reshape(codes.shape[:-1]), time_costs.reshape(codes.shape[:-1])
+
+  # Initialize the population with random models, where population[:, heads] is the oldest model of each run.
+  population = rng.randint(0, num_ops, size=(num_runs, population_size, num_edges))
+  accuracies, time_costs = query(population)
+  heads, num_archs = np.zeros(num_runs, dtype=np.int64), np.full(num_runs, population_size, dtype=np.int64)
+  total_costs = time_costs.sum(axis=1)
+  best_pos = accuracies.argmax(axis=1)
+  best_codes, best_accuracies = population[runs, best_pos], accuracies[runs, best_pos]
+
+  active = total_costs < time_budget
+  while active.any():
+    start_time, xruns = time.time(), runs[active]
+    # Sample randomly chosen models from the current population, and the parent is the best model in the sample.
+    samples = rng.randint(0, population_size, size=(len(xruns), sample_size))
+    parents = samples[np.arange(len(xruns)), accuracies[xruns[:,None], samples].argmax(axis=1)]
+    # Mutate one operation of the parent to another one, where the node and then its input edge are uniformly chosen.
+    children = population[xruns, parents].copy()
+    nodes    = rng.randint(0, len(node_starts), size=len(xruns))
+    edges    = node_starts[nodes] + (rng.random_sample(len(xruns)) * (nodes + 1)).astype(np.int64)
+    children[np.arange(len(xruns)), edges] = (children[np.arange(len(xruns)), edges] + rng.randint(1, num_ops, size=len(xruns))) % num_ops
+    total_costs[xruns] += (time.time() - start_time) / len(xruns)
+    child_accs, child_costs = query(children)
+    # The run stops if its child exceeds the time budget; otherwise, the child replaces the oldest model.
+    finish = total_costs[xruns] + child_costs > time_budget
+    active[xruns[finish]] = False
+    xruns, children, child_accs, child_costs = xruns[~finish], children[~finish], child_accs[~finish], child_costs[~finish]
+    total_costs[xruns] += child_costs
+    population[xruns, heads[xruns]], accuracies[xruns, heads[xruns]] = children, child_accs
+    heads[xruns] = (heads[xruns] + 1) % population_size
+    num_archs[xruns] += 1
+    better = child_accs > best_accuracies[xruns]
+    best_codes[xruns[better]], best_accuracies[xruns[better]] = children[better], child_accs[better]
+    active[xruns] = total_costs[xruns] < time_budget
+  return code2index[best_codes.dot(bases)], best_accuracies, num_archs, total_costs
+
+
+def main_batch(xargs, nas_bench):
+  """Run `xargs.num_trials` evolutions with the benchmark in one process by `regularized_evolution_batch`, and return (the log dir, the list of the best indexes)."""
+  assert nas_bench is not None and xargs.ea_fast_by_api, 'the batched evolution requires the benchmark API'
+  if xargs.rand_seed is None or xargs.rand_seed < 0: xargs.rand_seed = random.randint(1, 100000)
+  prepare_seed(xargs.rand_seed)
+  logger = prepare_logger(args)
+  dataname = 'cifar10-valid' if xargs.dataset == 'cifar10' else xargs.dataset
+  codec = CellArchCodec(get_search_spaces('cell', xargs.search_space_name), xargs.max_nodes)
+  index2code = nas_bench.index2code()
+  x_start_time = time.time()
+  logger.log('{:} use nas_bench : {:}'.format(time_string(), nas_bench))
+  logger.log('-'*30 + ' start {:} searches with the time budget of {:} s'.format(xargs.num_trials, xargs.time_budget))
+  best_indexes, best_accuracies, num_archs, total_costs = regularized_evolution_batch(xargs.num_trials, xargs.ea_population, xargs.ea_sample_size, xargs.time_budget, codec, nas_bench, dataname, np.random.RandomState(xargs.rand_seed))
+  for i, (index, accuracy, num, cost) in enumerate(zip(best_indexes, best_accuracies, num_archs, total_costs)):
+    logger.log('[{:03d}/{:03d}] best arch is {:} ({:5d}), valid-accuracy={:.2f}%, visit {:} archs with {:.1f} s'.format(i, xargs.num_trials, codec.tostr(int(index2code[index])), index, accuracy, num, cost))
+  logger.log('{:} {:} regularized evolutions finish with {:.1f} s (real-cost={:.2f} s).'.format(time_string(), xargs.num_trials, total_costs.mean(), time.time()-x_start_time))
+  logger.log('-'*100)
+  logger.close()
+  return logger.log_dir, [int(index) for index in best_indexes]
+
+
 def main(xargs, nas_bench):
   assert torch.cuda.is_available(), 'CUDA is not available.'
   torch.backends.cudnn.enabled   = True
@@ -245,24 +323,31 @@ if __name__ == '__main__':
   parser.add_argument('--workers',            type=int,   default=2,    help='number of data loading workers (default: 2)')
   parser.add_argument('--save_dir',           type=str,   help='Folder to save checkpoints and log.')
   parser.add_argument('--arch_nas_dataset',   type=str,   help='The path to load the architecture dataset (tiny-nas-benchmark).')
+  parser.add_argument('--authkey',            type=str,   help='The file of the authkey of the server in arch_nas_dataset (default: the environment variable NAS_BENCH_201_AUTHKEY).')
   parser.add_argument('--print_freq',         type=int,   help='print frequency (default: 200)')
   parser.add_argument('--rand_seed',          type=int,   default=-1,   help='manual seed')
+  parser.add_argument('--num_trials',         type=int,   default=500,  help='the number of trials with random seeds if rand_seed < 0')
+  parser.add_argument('--trial_workers',      type=int,   default=1,    help='the number of processes to run the trials if rand_seed < 0')
+  parser.add_argument('--ea_batch_runs',      action='store_true',      help='run num_trials evolutions side by side in one process, whose RNG is seeded by rand_seed if rand_seed >= 0 (requires ea_fast_by_api).')
   args = parser.parse_args()
   #if args.rand_seed is None or args.rand_seed < 0: args.rand_seed = random.randint(1, 100000)
   args.ea_fast_by_api = args.ea_fast_by_api > 0
 
-  if args.arch_nas_dataset is None or not os.path.isfile(args.arch_nas_dataset):
+  if args.arch_nas_dataset is not None and is_server_address(args.arch_nas_dataset):
+    print ('{:} connect to the NAS-Benchmark-API server at {:}'.format(time_string(), args.arch_nas_dataset))
+    nas_bench = ClientAPI(args.arch_nas_dataset, load_authkey(args.authkey)) # see exps/NAS-Bench-201/serve.py
+  elif args.arch_nas_dataset is None or not os.path.exists(args.arch_nas_dataset):
     nas_bench = None
   else:
     print ('{:} build NAS-Benchmark-API from {:}'.format(time_string(), args.arch_nas_dataset))
-    nas_bench = API(args.arch_nas_dataset)
-  if args.rand_seed < 0:
-    save_dir, all_indexes, num = None, [], 500
-    for i in range(num):
-      print ('{:} : {:03d}/{:03d}'.format(time_string(), i, num))
-      args.rand_seed = random.randint(1, 100000)
-      save_dir, index = main(args, nas_bench)
-      all_indexes.append( index )
+    if os.path.isdir(args.arch_nas_dataset): nas_bench = ColumnarAPI(args.arch_nas_dataset) # see exps/NAS-Bench-201/convert-columnar.py
+    else                                   : nas_bench = API(args.arch_nas_dataset)
+  if args.ea_batch_runs:
+    save_dir, all_indexes = main_batch(args, nas_bench)
+    torch.save(all_indexes, save_dir / 'results.pth')
+  elif args.rand_seed < 0:
+    results = run_trials(main, args, nas_bench, args.num_trials, args.trial_workers)
+    save_dir, all_indexes = results[0][0], [x[1] for x in results]
     torch.save(all_indexes, save_dir / 'results.pth')
   else:
     main(args, nas_bench)
@@ -14,11 +14,11 @@ lib_dir = (Path(__file__).parent / '..' / '..' / 'lib').resolve()
 if str(lib_dir) not in sys.path: sys.path.insert(0, str(lib_dir))
 from config_utils import load_config, dict2config, configure2str
 from datasets     import get_datasets, SearchDataset
-from procedures   import prepare_seed, prepare_logger, save_checkpoint, copy_checkpoint, get_optim_scheduler
+from procedures   import prepare_seed, prepare_logger, save_checkpoint, copy_checkpoint, get_optim_scheduler, run_trials
 from utils        import get_model_infos, obtain_accuracy
 from log_utils    import AverageMeter, time_string, convert_secs2time
-from nas_201_api  import NASBench201API as API
-from models       import CellStructure, get_search_spaces
+from nas_201_api  import NASBench201API as API, NASBench201ColumnarAPI as ColumnarAPI, NASBench201Client as ClientAPI, is_server_address, load_authkey
+from models       import CellStructure, CellArchCodec, get_search_spaces
 from R_EA import train_and_eval
 
 
@@ -89,6 +89,60 @@ def select_action(policy):
   return m.log_prob(action), action.cpu().tolist()
 
 
+def select_actions(policy, batch_size):
+  # sample `batch_size` architectures at once, and return their log-probabilities [B] and actions [B, num_edges]
+  probs = policy()
+  m = Categorical(probs)
+  actions = m.sample((batch_size,))
+  return m.log_prob(actions).sum(-1), actions.cpu().numpy()
+
+
+def reinforce_batch(policy, optimizer, baseline, batch_size, time_budget, nas_bench, dataname, logger):
+  """The batched version of the REINFORCE loop in `main` with `train_and_eval(..., use_012_epoch_training=True)`.
+  Each step samples `batch_size` architectures, queries them by one `get_more_info_batch`, and makes one update, where the baseline of each sample is
+  the mean reward of the other samples in the batch (the EMA baseline is only used for a single sample). The samples are charged in the sampled order,
+  and the search stops at the first sample that exceeds the time budget (which can still be the best one), the same as the serial loop.
+  The sampled actions are CellArchCodec codes, which are mapped to the benchmark indexes by `nas_bench.code2index()` before the query.
+  """
+  codec = CellArchCodec(policy.search_space, policy.max_nodes)
+  bases = np.array([len(codec.op_names) ** (codec.num_edges-1-k) for k in range(codec.num_edges)], dtype=np.int64)
+  code2index = nas_bench.code2index()
+  total_steps, total_costs, trace_codes, trace_indexes, trace_rewards = 0, 0, [], [], []
+  while total_costs < time_budget:
+    start_time = time.time()
+    log_probs, actions = select_actions(policy, batch_size)
+    codes   = actions.dot(bases)
+    indexes = code2index[codes]
+    info    = nas_bench.get_more_info_batch(indexes, dataname, None, True, True)
+    rewards, cost_times = np.asarray(info['valid-accuracy']), np.asarray(info['train-all-time'] + info['valid-per-time'])
+    # accumulate time
+    accept  = total_costs + np.cumsum(cost_times) < time_budget
+    num     = int(accept.sum()) if accept.all() else int(accept.argmin())
+    total_costs += float(cost_times[:num].sum())
+    ntrace = min(num + 1, batch_size) # the sample that exceeds the time budget is also in the trace, as the serial loop
+    trace_codes.extend( codes[:ntrace].tolist() )
+    trace_indexes.extend( indexes[:ntrace].tolist() )
+    trace_rewards.extend( rewards[:ntrace].tolist() )
+    if num == 0: break
+    rewards = torch.from_numpy(rewards[:num]).float()
+    for reward in rewards.tolist(): baseline.update(reward)
+    if num > 1: advantages = rewards - (rewards.sum() - rewards) / (num - 1)
+    else      : advantages = rewards - baseline.value()
+    # calculate loss
+    policy_loss = ( -log_probs[:num] * advantages ).mean()
+    optimizer.zero_grad()
+    policy_loss.backward()
+    optimizer.step()
+    # accumulate time
+    total_costs += time.time() - start_time
+    total_steps += 1
+    logger.log('step [{:3d}] : {:} samples : average-reward={:.3f} : policy_loss={:.4f} : {:}'.format(total_steps, num, baseline.value(), policy_loss.item(), policy.genotype()))
+    if num < batch_size: break
+  best = int(np.argmax(trace_rewards))
+  logger.log('the best of {:} samples is the {:}-th architecture in the benchmark with valid-accuracy={:.2f}%'.format(len(trace_rewards), trace_indexes[best], trace_rewards[best]))
+  return codec.decode(int(trace_codes[best])), total_steps, total_costs
+
+
 def main(xargs, nas_bench):
   assert torch.cuda.is_available(), 'CUDA is not available.'
   torch.backends.cudnn.enabled   = True
@@ -145,34 +199,38 @@ def main(xargs, nas_bench):
   # attempts = 0
   x_start_time = time.time()
   logger.log('Will start searching with time budget of {:} s.'.format(xargs.time_budget))
-  total_steps, total_costs, trace = 0, 0, []
   #for istep in range(xargs.RL_steps):
-  while total_costs < xargs.time_budget:
-    start_time = time.time()
-    log_prob, action = select_action( policy )
-    arch   = policy.generate_arch( action )
-    reward, cost_time = train_and_eval(arch, nas_bench, extra_info, dataname)
-    trace.append( (reward, arch) )
-    # accumulate time
-    if total_costs + cost_time < xargs.time_budget:
-      total_costs += cost_time
-    else: break
+  if xargs.RL_batch > 1:
+    assert nas_bench is not None, 'the batched REINFORCE requires the benchmark API'
+    best_arch, total_steps, total_costs = reinforce_batch(policy, optimizer, baseline, xargs.RL_batch, xargs.time_budget, nas_bench, dataname, logger)
+  else:
+    total_steps, total_costs, trace = 0, 0, []
+    while total_costs < xargs.time_budget:
+      start_time = time.time()
+      log_prob, action = select_action( policy )
+      arch   = policy.generate_arch( action )
+      reward, cost_time = train_and_eval(arch, nas_bench, extra_info, dataname)
+      trace.append( (reward, arch) )
+      # accumulate time
+      if total_costs + cost_time < xargs.time_budget:
+        total_costs += cost_time
+      else: break
 
-    baseline.update(reward)
-    # calculate loss
-    policy_loss = ( -log_prob * (reward - baseline.value()) ).sum()
-    optimizer.zero_grad()
-    policy_loss.backward()
-    optimizer.step()
-    # accumulate time
-    total_costs += time.time() - start_time
-    total_steps += 1
-    logger.log('step [{:3d}] : average-reward={:.3f} : policy_loss={:.4f} : {:}'.format(total_steps, baseline.value(), policy_loss.item(), policy.genotype()))
-    #logger.log('----> {:}'.format(policy.arch_parameters))
-    #logger.log('')
+      baseline.update(reward)
+      # calculate loss
+      policy_loss = ( -log_prob * (reward - baseline.value()) ).sum()
+      optimizer.zero_grad()
+      policy_loss.backward()
+      optimizer.step()
+      # accumulate time
+      total_costs += time.time() - start_time
+      total_steps += 1
+      logger.log('step [{:3d}] : average-reward={:.3f} : policy_loss={:.4f} : {:}'.format(total_steps, baseline.value(), policy_loss.item(), policy.genotype()))
+      #logger.log('----> {:}'.format(policy.arch_parameters))
+      #logger.log('')
 
-  # best_arch = policy.genotype() # first version
-  best_arch = max(trace, key=lambda x: x[0])[1]
+    # best_arch = policy.genotype() # first version
+    best_arch = max(trace, key=lambda x: x[0])[1]
   logger.log('REINFORCE finish with {:} steps and {:.1f} s (real cost={:.3f}).'.format(total_steps, total_costs, time.time()-x_start_time))
   info = nas_bench.query_by_arch( best_arch )
   if info is None: logger.log('Did not find this architecture : {:}.'.format(best_arch))
@@ -196,26 +254,30 @@ if __name__ == '__main__':
   #parser.add_argument('--RL_steps',           type=int,   help='The steps for REINFORCE.')
   parser.add_argument('--EMA_momentum',       type=float, help='The momentum value for EMA.')
   parser.add_argument('--time_budget',        type=int,   help='The total time cost budge for searching (in seconds).')
+  parser.add_argument('--RL_batch',           type=int,   default=1,    help='The number of architectures sampled (and queried at once) for each update.')
   # log
   parser.add_argument('--workers',            type=int,   default=2,    help='number of data loading workers (default: 2)')
   parser.add_argument('--save_dir',           type=str,   help='Folder to save checkpoints and log.')
   parser.add_argument('--arch_nas_dataset',   type=str,   help='The path to load the architecture dataset (tiny-nas-benchmark).')
+  parser.add_argument('--authkey',            type=str,   help='The file of the authkey of the server in arch_nas_dataset (default: the environment variable NAS_BENCH_201_AUTHKEY).')
   parser.add_argument('--print_freq',         type=int,   help='print frequency (default: 200)')
   parser.add_argument('--rand_seed',          type=int,   default=-1,   help='manual seed')
+  parser.add_argument('--num_trials',         type=int,   default=500,  help='the number of trials with random seeds if rand_seed < 0')
+  parser.add_argument('--trial_workers',      type=int,   default=1,    help='the number of processes to run the trials if rand_seed < 0')
   args = parser.parse_args()
   #if args.rand_seed is None or args.rand_seed < 0: args.rand_seed = random.randint(1, 100000)
-  if args.arch_nas_dataset is None or not os.path.isfile(args.arch_nas_dataset):
+  if args.arch_nas_dataset is not None and is_server_address(args.arch_nas_dataset):
+    print ('{:} connect to the NAS-Benchmark-API server at {:}'.format(time_string(), args.arch_nas_dataset))
+    nas_bench = ClientAPI(args.arch_nas_dataset, load_authkey(args.authkey)) # see exps/NAS-Bench-201/serve.py
+  elif args.arch_nas_dataset is None or not os.path.exists(args.arch_nas_dataset):
     nas_bench = None
   else:
     print ('{:} build NAS-Benchmark-API from {:}'.format(time_string(), args.arch_nas_dataset))
-    nas_bench = API(args.arch_nas_dataset)
+    if os.path.isdir(args.arch_nas_dataset): nas_bench = ColumnarAPI(args.arch_nas_dataset) # see exps/NAS-Bench-201/convert-columnar.py
+    else                                   : nas_bench = API(args.arch_nas_dataset)
   if args.rand_seed < 0:
-    save_dir, all_indexes, num = None, [], 500
-    for i in range(num):
-      print ('{:} : {:03d}/{:03d}'.format(time_string(), i, num))
-      args.rand_seed = random.randint(1, 100000)
-      save_dir, index = main(args, nas_bench)
-      all_indexes.append( index )
+    results = run_trials(main, args, nas_bench, args.num_trials, args.trial_workers)
+    save_dir, all_indexes = results[0][0], [x[1] for x in results]
     torch.save(all_indexes, save_dir / 'results.pth')
   else:
     main(args, nas_bench)
@@ -6,16 +6,19 @@ from typing import List, Text
 import torch
 
 __all__ = ['change_key', 'get_cell_based_tiny_net', 'get_search_spaces', 'get_cifar_models', 'get_imagenet_models', \
-           'obtain_model', 'obtain_search_model', 'load_net_from_checkpoint', \
-           'CellStructure', 'CellArchitectures',
+           'obtain_model', 'obtain_search_model', 'load_net_from_checkpoint', 'set_infer_pruning', \
+           'CellStructure', 'CellArchitectures', 'CellArchCodec', 'TinyNetworkCosts', 'NASNetCosts', 'LatencyTable', 'TinyNetworkLatency',
            "FeatureMatching"
            ]
 
 # useful modules
 from config_utils import dict2config
 from .SharedUtils import change_key
-from .cell_searchs import CellStructure, CellArchitectures
+from .cell_searchs import CellStructure, CellArchitectures, CellArchCodec
+from .cell_costs   import TinyNetworkCosts, NASNetCosts
+from .cell_latency import LatencyTable, TinyNetworkLatency
 from .fitnet_model import FeatureMatching
+from .cell_infers  import set_infer_pruning
 
 
 # Cell-based NAS Models
@@ -0,0 +1,216 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+############################################################################################
+# An analytical cost model of the cell-based networks (TinyNetwork and NASNetonCIFAR),     #
+# which computes the FLOPs, parameters and activations from the genotype without building #
+# any module. The costs of each OPS entry are cached as a table by (op, C_in, C_out,      #
+# stride, H, W), and they are the same as utils.get_model_infos (the hook-based counting) #
+# of the network that runs all edges (not set_infer_pruning), as the benchmark counts:    #
+#  -- FLOPs       : the multiply-adds of Conv2d and Linear per image, in M                 #
+#  -- Params      : the number of parameters (BN included, auxiliary head excluded), in M #
+#  -- Activations : the number of elements in the outputs of all leaf modules except      #
+#                   Identity per image, in M                                              #
+############################################################################################
+import numpy as np
+from functools import lru_cache
+from .cell_searchs.genotypes import Structure, ArchCodec
+
+
+__all__ = ['op_costs', 'basicblock_costs', 'TinyNetworkCosts', 'NASNetCosts']
+
+
+def conv_size(H, kernel, stride, padding, dilation=1):
+  return (H + 2 * padding - dilation * (kernel - 1) - 1) // stride + 1
+
+
+def conv_costs(C_in, C_out, kernel, stride, padding, dilation, groups, H, W, bias=False):
+  Ho, Wo = conv_size(H, kernel, stride, padding, dilation), conv_size(W, kernel, stride, padding, dilation)
+  flops  = kernel * kernel * C_in * C_out / groups * Ho * Wo + (C_out * Ho * Wo if bias else 0)
+  params = kernel * kernel * C_in // groups * C_out + (C_out if bias else 0)
+  return np.array([flops, params, C_out * Ho * Wo], dtype=np.float64), Ho, Wo
+
+
+def relu_conv_bn_costs(C_in, C_out, kernel, stride, padding, dilation, H, W):
+  # ReLU -> Conv2d -> BatchNorm2d (affine)
+  costs, Ho, Wo = conv_costs(C_in, C_out, kernel, stride, padding, dilation, 1, H, W)
+  return costs + np.array([0, 2 * C_out, C_in * H * W + C_out * Ho * Wo]), Ho, Wo
+
+
+def sep_conv_costs(C_in, C_out, kernel, stride, padding, dilation, H, W):
+  # ReLU -> depth-wise Conv2d -> point-wise Conv2d -> BatchNorm2d
+  costs_a, Ho, Wo = conv_costs(C_in, C_in , kernel, stride, padding, dilation, C_in, H, W)
+  costs_b, Ho, Wo = conv_costs(C_in, C_out,      1,      1,       0,        1,    1, Ho, Wo)
+  return costs_a + costs_b + np.array([0, 2 * C_out, C_in * H * W + C_out * Ho * Wo]), Ho, Wo
+
+
+@lru_cache(maxsize=None)
+def _op_costs(op_name, C_in, C_out, stride, H, W):
+  zeros = np.zeros(3)
+  if op_name == 'none': # Zero keeps the input size if C_in != C_out
+    if C_in == C_out: Ho, Wo = conv_size(H, 1, stride, 0), conv_size(W, 1, stride, 0)
+    else            : Ho, Wo = H, W
+    return zeros + np.array([0, 0, C_out * Ho * Wo]), Ho, Wo
+  elif op_name == 'skip_connect':
+    if stride == 1 and C_in == C_out: return zeros, H, W
+    # FactorizedReduce
+    if stride == 2:
+      costs, Ho, Wo = conv_costs(C_in, C_out, 1, 2, 0, 1, 1, H, W)
+      costs = costs + np.array([0, 2 * C_out, C_in * H * W + C_in * (H+1) * (W+1) + C_out * Ho * Wo])
+    else:
+      costs, Ho, Wo = conv_costs(C_in, C_out, 1, 1, 0, 1, 1, H, W)
+      costs = costs + np.array([0, 2 * C_out, C_out * Ho * Wo])
+    return costs, Ho, Wo
+  elif op_name == 'avg_pool_3x3' or op_name == 'max_pool_3x3':
+    if C_in == C_out: costs = zeros
+    else            : costs, H, W = relu_conv_bn_costs(C_in, C_out, 1, 1, 0, 1, H, W)
+    Ho, Wo = conv_size(H, 3, stride, 1), conv_size(W, 3, stride, 1)
+    return costs + np.array([0, 0, C_out * Ho * Wo]), Ho, Wo
+  elif op_name in ('nor_conv_7x7', 'nor_conv_3x3', 'nor_conv_1x1'):
+    kernel = int(op_name[-1])
+    return relu_conv_bn_costs(C_in, C_out, kernel, stride, kernel // 2, 1, H, W)
+  elif op_name in ('dua_sepc_3x3', 'dua_sepc_5x5'):
+    kernel = int(op_name[-1])
+    costs_a, Ho, Wo = sep_conv_costs(C_in, C_in , kernel, stride, kernel // 2, 1, H, W)
+    costs_b, Ho, Wo = sep_conv_costs(C_in, C_out, kernel,      1, kernel // 2, 1, Ho, Wo)
+    return costs_a + costs_b, Ho, Wo
+  elif op_name in ('dil_sepc_3x3', 'dil_sepc_5x5'):
+    kernel = int(op_name[-1])
+    return sep_conv_costs(C_in, C_out, kernel, stride, kernel - 1, 2, H, W)
+  else:
+    raise ValueError('invalid op name : {:}'.format(op_name))
+
+
+def op_costs(op_name, C_in, C_out, stride, H, W):
+  """Return the [FLOPs, Params, Activations] (not in M) of OPS[op_name](C_in, C_out, stride, True, True) on a (C_in, H, W) input, and the output size of (H, W)."""
+  costs, Ho, Wo = _op_costs(op_name, C_in, C_out, stride, H, W)
+  return costs.copy(), Ho, Wo
+
+
+def basicblock_costs(inplanes, planes, stride, H, W):
+  """Return the [FLOPs, Params, Activations] of ResNetBasicblock(inplanes, planes, stride) and the output size of (H, W)."""
+  costs_a, Ho, Wo = relu_conv_bn_costs(inplanes, planes, 3, stride, 1, 1, H, W)
+  costs_b, Ho, Wo = relu_conv_bn_costs(  planes, planes, 3,      1, 1, 1, Ho, Wo)
+  costs = costs_a + costs_b
+  if stride == 2:
+    costs_d, _, _ = conv_costs(inplanes, planes, 1, 1, 0, 1, 1, H // 2, W // 2)
+    costs += costs_d + np.array([0, 0, inplanes * (H // 2) * (W // 2)])
+  elif inplanes != planes:
+    costs_d, _, _ = relu_conv_bn_costs(inplanes, planes, 1, 1, 0, 1, H, W)
+    costs += costs_d
+  return costs, Ho, Wo
+
+
+def head_costs(C_stem, C_last, num_classes, H, W, Hl, Wl):
+  # the stem (Conv2d + BatchNorm2d) on the (3, H, W) input, and lastact (BatchNorm2d + ReLU), global_pooling and classifier on the (C_last, Hl, Wl) feature
+  stem, _, _ = conv_costs(3, C_stem, 3, 1, 1, 1, 1, H, W)
+  stem      += np.array([0, 2 * C_stem, C_stem * H * W])
+  last       = np.array([C_last * num_classes + num_classes, 2 * C_last + C_last * num_classes + num_classes, 2 * C_last * Hl * Wl + C_last + num_classes], dtype=np.float64)
+  return stem + last
+
+
+class TinyNetworkCosts(object):
+  """The costs of TinyNetwork(C, N, genotype, num_classes) in NAS-Bench-201 for every genotype in the space of `op_names` and `max_nodes`.
+     Since all InferCells share one genotype, the costs of the k-th edge with each operation are summed over all cells as a [num_edges, num_ops, 3] table,
+     and the costs of an architecture are the fixed costs (stem, residual blocks, and classifier) plus one table entry per edge.
+  """
+  def __init__(self, C, N, num_classes, op_names, max_nodes=4, shape=(1, 3, 32, 32)):
+    self.C, self.N, self.num_classes = C, N, num_classes
+    self.codec = ArchCodec(op_names, max_nodes)
+    self.shape = tuple(shape)
+    H, W       = shape[2], shape[3]
+    layer_channels   = [C    ] * N + [C*2 ] + [C*2  ] * N + [C*4 ] + [C*4  ] * N
+    layer_reductions = [False] * N + [True] + [False] * N + [True] + [False] * N
+    self.fixed = np.zeros(3)
+    self.table = np.zeros((self.codec.num_edges, len(self.codec.op_names), 3))
+    C_prev = C
+    for C_curr, reduction in zip(layer_channels, layer_reductions):
+      if reduction:
+        costs, H, W = basicblock_costs(C_prev, C_curr, 2, H, W)
+        self.fixed += costs
+      else:
+        for k, (i, j) in enumerate(self.codec.edges):
+          for iop, op_name in enumerate(self.codec.op_names):
+            self.table[k, iop] += op_costs(op_name, C_prev if j == 0 else C_curr, C_curr, 1, H, W)[0]
+      C_prev = C_curr
+    self.fixed += head_costs(C, C_prev, num_classes, shape[2], shape[3], H, W)
+    self._edge_pos = np.arange(self.codec.num_edges)
+    # scale everything into M once
+    self.fixed, self.table = self.fixed / 1e6, self.table / 1e6
+
+  def __repr__(self):
+    return ('{name}(C={C}, N={N}, num_classes={num_classes}, shape={shape}, {codec})'.format(name=self.__class__.__name__, **self.__dict__))
+
+  def costs(self, arch):
+    """Return (FLOPs, Params, Activations) in M of a Structure, an architecture string, a code vector, or a code integer of ArchCodec.
+       Note that the code integer is not the NAS-Bench-201 index, and costs(api.index2code()[index]) is the costs of the `index`-th architecture."""
+    if isinstance(arch, str): arch = Structure.str2structure(arch)
+    if isinstance(arch, Structure):
+      costs = self.fixed.copy()
+      for i, node_info in enumerate(arch.nodes):
+        for op_name, j in node_info:
+          costs += self.table[self.codec.edge2pos[(i+1, j)], self.codec.op2index[op_name]]
+    else:
+      if isinstance(arch, (int, np.integer)): arch = self.codec.int2vector(int(arch))
+      costs = self.fixed + self.table[self._edge_pos, np.asarray(arch)].sum(0)
+    return tuple(float(x) for x in costs)
+
+  def costs_batch(self, codes) -> np.ndarray:
+    """Return the [B, 3] array of (FLOPs, Params, Activations) in M, where `codes` is a [B, num_edges] array of code vectors or a [B] array of code integers."""
+    codes = np.asarray(codes, dtype=np.int64)
+    if codes.ndim == 1:
+      bases = np.array(self.codec._bases, dtype=np.int64)
+      codes = (codes[:, None] // bases) % len(self.codec.op_names)
+    return self.fixed + self.table[self._edge_pos, codes].sum(1)
+
+  def all_costs(self) -> np.ndarray:
+    """Return the costs of all architectures, where the i-th row is for the code integer i of ArchCodec (not the NAS-Bench-201 index).
+       all_costs()[api.index2code()] re-orders the rows by the NAS-Bench-201 index."""
+    return self.costs_batch( np.arange(self.codec.num_archs) )
+
+
+class NASNetCosts(object):
+  """The costs of NASNetonCIFAR(C, N, stem_multiplier, num_classes, genotype, auxiliary) in evaluation mode, i.e., without the auxiliary head."""
+
+  def __init__(self, C, N, stem_multiplier, num_classes, shape=(1, 3, 32, 32)):
+    self.C, self.N, self.stem_multiplier, self.num_classes = C, N, stem_multiplier, num_classes
+    self.shape = tuple(shape)
+
+  def __repr__(self):
+    return ('{name}(C={C}, N={N}, stem_multiplier={stem_multiplier}, num_classes={num_classes}, shape={shape})'.format(name=self.__class__.__name__, **self.__dict__))
+
+  @staticmethod
+  def cell_costs(genotype, C_prev_prev, C_prev, C, reduction, reduction_prev, size_prev_prev, size_prev):
+    # the costs of NASNetInferCell, where size_prev_prev and size_prev are the (H, W) of s0 and s1
+    H, W = size_prev
+    if reduction_prev: costs, _, _ = op_costs('skip_connect', C_prev_prev, C, 2, *size_prev_prev)
+    else             : costs, _, _ = op_costs('nor_conv_1x1', C_prev_prev, C, 1, *size_prev_prev)
+    costs += op_costs('nor_conv_1x1', C_prev, C, 1, H, W)[0]
+    if not reduction: nodes, concats = genotype['normal'], genotype['normal_concat']
+    else            : nodes, concats = genotype['reduce'], genotype['reduce_concat']
+    Ho, Wo = (conv_size(H, 1, 2, 0), conv_size(W, 1, 2, 0)) if reduction else (H, W)
+    # the edges are keyed by 'i<-j', so two inputs from the same node share the module of the latter one, which runs twice but has the params once
+    edges, counted = {'{:}<-{:}'.format(i+2, in_node[1]): in_node[0] for i, node in enumerate(nodes) for in_node in node}, set()
+    for i, node in enumerate(nodes):
+      for in_node in node:
+        node_str, j = '{:}<-{:}'.format(i+2, in_node[1]), in_node[1]
+        stride = 2 if reduction and j < 2 else 1
+        xcosts = op_costs(edges[node_str], C, C, stride, H if j < 2 else Ho, W if j < 2 else Wo)[0]
+        if node_str in counted: xcosts[1] = 0
+        counted.add(node_str)
+        costs += xcosts
+    return costs, len(concats), Ho, Wo
+
+  def costs(self, genotype):
+    """Return (FLOPs, Params, Activations) in M of a NASNet genotype dict with normal, normal_concat, reduce, and reduce_concat."""
+    C, N, H, W = self.C, self.N, self.shape[2], self.shape[3]
+    layer_channels   = [C    ] * N + [C*2 ] + [C*2  ] * (N-1) + [C*4 ] + [C*4  ] * (N-1)
+    layer_reductions = [False] * N + [True] + [False] * (N-1) + [True] + [False] * (N-1)
+    C_prev_prev, C_prev, reduction_prev = C*self.stem_multiplier, C*self.stem_multiplier, False
+    total, size_prev_prev, size_prev = np.zeros(3), (H, W), (H, W)
+    for C_curr, reduction in zip(layer_channels, layer_reductions):
+      costs, multiplier, Hc, Wc = self.cell_costs(genotype, C_prev_prev, C_prev, C_curr, reduction, reduction_prev, size_prev_prev, size_prev)
+      total += costs
+      C_prev_prev, C_prev, reduction_prev = C_prev, multiplier*C_curr, reduction
+      size_prev_prev, size_prev = size_prev, (Hc, Wc)
+    total += head_costs(C*self.stem_multiplier, C_prev, self.num_classes, H, W, *size_prev)
+    return tuple(float(x) for x in total / 1e6)
@@ -4,3 +4,4 @@
 from .tiny_network import TinyNetwork
 from .macro_tiny_network import MacroTinyNetwork
 from .nasnet_cifar import NASNetonCIFAR
+from .cells import set_infer_pruning
@@ -5,7 +5,8 @@
 import torch
 import torch.nn as nn
 from copy import deepcopy
-from ..cell_operations import OPS
+from ..cell_operations import OPS, zero_outputs
+from ..cell_searchs.genotypes import live_edges
 
 
 # Cell for NAS-Bench-201
@@ -35,6 +36,13 @@ class InferCell(nn.Module):
     self.nodes   = len(genotype)
     self.in_dim  = C_in
     self.out_dim = C_out
+    self.stride  = stride
+    # the layers to compute, without the zero edges and the nodes that do not reach the output (see live_edges)
+    lives = live_edges([genotype[i-1] for i in range(1, len(genotype))])
+    self.live_IX = [tuple(node_layers[k] for k in live) for node_layers, live in zip(self.node_IX, lives)]
+    self.live_IN = [tuple(node_innods[k] for k in live) for node_innods, live in zip(self.node_IN, lives)]
+    self.zero_output = len(lives[-1]) == 0
+    self.prune = False # True to skip the zero edges and dead nodes, e.g., for the inference (see set_infer_pruning)
 
   def extra_repr(self):
     string = 'info :: nodes={nodes}, inC={in_dim}, outC={out_dim}'.format(**self.__dict__)
@@ -46,13 +54,25 @@ class InferCell(nn.Module):
     return string + ', [{:}]'.format( ' | '.join(laystr) ) + ', {:}'.format(self.genotype.tostr())
 
   def forward(self, inputs):
+    if self.prune and self.zero_output: return zero_outputs(inputs, self.out_dim, self.stride)
+    node_IX, node_IN = (self.live_IX, self.live_IN) if self.prune else (self.node_IX, self.node_IN)
     nodes = [inputs]
-    for i, (node_layers, node_innods) in enumerate(zip(self.node_IX,self.node_IN)):
-      node_feature = sum( self.layers[_il](nodes[_ii]) for _il, _ii in zip(node_layers, node_innods) )
+    for i, (node_layers, node_innods) in enumerate(zip(node_IX, node_IN)):
+      node_feature = sum( self.layers[_il](nodes[_ii]) for _il, _ii in zip(node_layers, node_innods) ) # a dead node is 0 and never used
       nodes.append( node_feature )
     return nodes[-1]
 
 
+def set_infer_pruning(model: nn.Module, prune: bool) -> nn.Module:
+  """Switch whether the InferCells in `model` skip the zero edges and dead nodes, which is off by default. The outputs are the same,
+     but the hook-based counting of utils.get_model_infos only sees the computed layers (the benchmark and cell_costs count all of them),
+     and the skipped layers get no gradient, so that SGD skips their weight decay. Turn it on only to run the inference.
+  """
+  for module in model.modules():
+    if isinstance(module, InferCell): module.prune = prune
+  return model
+
+
 
 # Learning Transferable Architectures for Scalable Image Recognition, CVPR 2018
 class NASNetInferCell(nn.Module):
@@ -0,0 +1,187 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+############################################################################################
+# A CPU latency lookup table of the NAS-Bench-201 primitives, where every OPS entry, the  #
+# ResNetBasicblock reduction, the stem, and the classifier head are timed on CPU at each  #
+# (C, H, W, stride) used by TinyNetwork, with warmup and a fixed number of threads.       #
+# The overhead of InferCell is measured by a cell of all skip_connect edges, and the sum  #
+# is scaled to the timed latency of a few whole networks (see LatencyTable.calibrate).    #
+# TinyNetworkLatency sums the table entries to predict the latency of any genotype.       #
+############################################################################################
+import json, time, platform, torch
+import numpy as np
+import torch.nn as nn
+from pathlib import Path
+from typing import Text, Union, Dict
+from .cell_operations import OPS, ResNetBasicblock
+from .cell_infers.cells import InferCell
+from .cell_searchs.genotypes import Structure, ArchCodec
+
+
+__all__ = ['time_module', 'LatencyTable', 'TinyNetworkLatency']
+
+
+STATISTICS = ('mean', 'std', 'min', 'p50', 'p90', 'p99')
+
+
+class Head(nn.Module):
+  # lastact -> global_pooling -> classifier of TinyNetwork
+
+  def __init__(self, C, num_classes):
+    super(Head, self).__init__()
+    self.lastact = nn.Sequential(nn.BatchNorm2d(C), nn.ReLU(inplace=True))
+    self.global_pooling = nn.AdaptiveAvgPool2d(1)
+    self.classifier = nn.Linear(C, num_classes)
+
+  def forward(self, x):
+    out = self.global_pooling( self.lastact(x) )
+    return self.classifier( out.view(out.size(0), -1) )
+
+
+def time_module(module, shape, warmup: int=10, repeats: int=50, num_threads: int=1) -> Dict[Text, float]:
+  """Return the statistics (see STATISTICS) of the CPU latency in microseconds of `module` on a random input of `shape`."""
+  old_threads = torch.get_num_threads()
+  torch.set_num_threads(num_threads)
+  module, inputs, times = module.cpu().eval(), torch.rand(*shape), []
+  try:
+    with torch.no_grad():
+      for _ in range(warmup): module(inputs)
+      for _ in range(repeats):
+        start = time.perf_counter()
+        module(inputs)
+        times.append( (time.perf_counter() - start) * 1e6 )
+  finally:
+    torch.set_num_threads(old_threads)
+  times = np.array(times)
+  return {'mean': float(times.mean()), 'std': float(times.std()), 'min': float(times.min()),
+          'p50' : float(np.percentile(times, 50)), 'p90': float(np.percentile(times, 90)), 'p99': float(np.percentile(times, 99))}
+
+
+class LatencyTable(object):
+
+  def __init__(self, entries: Dict[Text, Dict[Text, float]], meta: Dict):
+    self.entries = entries
+    self.meta    = meta
+
+  def __len__(self):
+    return len(self.entries)
+
+  def __repr__(self):
+    return ('{name}({num} entries, {meta})'.format(name=self.__class__.__name__, num=len(self), meta=self.meta))
+
+  @staticmethod
+  def key(name: Text, C_in: int, C_out: int, stride: int, H: int, W: int) -> Text:
+    return '{:}|{:}|{:}|{:}|{:}x{:}'.format(name, C_in, C_out, stride, H, W)
+
+  def latency(self, key: Text, statistic: Text='p50') -> float:
+    assert key in self.entries, 'can not find {:} in {:}'.format(key, self)
+    return self.entries[key][statistic]
+
+  def measure(self, key: Text, module, C_in: int, H: int, W: int) -> None:
+    if key in self.entries: return
+    self.entries[key] = time_module(module, (self.meta['batch_size'], C_in, H, W), self.meta['warmup'], self.meta['repeats'], self.meta['num_threads'])
+
+  @staticmethod
+  def build(C, N, num_classes, op_names, max_nodes=4, shape=(1, 3, 32, 32), num_threads=1, warmup=10, repeats=50, verbose=False):
+    """Time every module of TinyNetwork(C, N, genotype, num_classes) for all genotypes in the space of `op_names`, where shape[0] is the batch size."""
+    meta  = {'C': C, 'N': N, 'num_classes': num_classes, 'op_names': list(op_names), 'max_nodes': max_nodes,
+             'shape': list(shape), 'batch_size': shape[0], 'num_threads': num_threads, 'warmup': warmup, 'repeats': repeats,
+             'torch': torch.__version__, 'machine': platform.machine(), 'processor': platform.processor()}
+    table = LatencyTable(dict(), meta)
+    H, W  = shape[2], shape[3]
+    table.measure(LatencyTable.key('stem', shape[1], C, 1, H, W), nn.Sequential(nn.Conv2d(shape[1], C, kernel_size=3, padding=1, bias=False), nn.BatchNorm2d(C)), shape[1], H, W)
+    for C_curr, C_next in ((C, C*2), (C*2, C*4), (C*4, None)):
+      for op_name in op_names:
+        table.measure(LatencyTable.key(op_name, C_curr, C_curr, 1, H, W), OPS[op_name](C_curr, C_curr, 1, True, True), C_curr, H, W)
+      # the cell of all skip_connect edges measures the overhead of InferCell (node sums and calls), on which the op latencies are added
+      skip_cell = InferCell(Structure([tuple(('skip_connect', j) for j in range(i)) for i in range(1, max_nodes)]), C_curr, C_curr, 1)
+      table.measure(LatencyTable.key('skip-cell', C_curr, C_curr, 1, H, W), skip_cell, C_curr, H, W)
+      if C_next is None:
+        table.measure(LatencyTable.key('head', C_curr, num_classes, 1, H, W), Head(C_curr, num_classes), C_curr, H, W)
+      else:
+        table.measure(LatencyTable.key('resblock', C_curr, C_next, 2, H, W), ResNetBasicblock(C_curr, C_next, 2, True), C_curr, H, W)
+        H, W = (H - 1) // 2 + 1, (W - 1) // 2 + 1
+      if verbose: print('{:} : {:} entries are measured'.format(table, len(table)))
+    return table
+
+  def calibrate(self, num_networks: int=5, seed: int=0, statistic: Text='p50') -> float:
+    """The isolated entries miss the cache misses and the calls between modules in a whole network, so `num_networks` random networks are timed,
+       and the median of timed / predicted is saved as the scale of the prediction (which keeps the ranking of the architectures).
+       The networks run all edges (set_infer_pruning(network, False)), because the prediction is additive over the edges as TinyNetworkCosts."""
+    from .cell_infers import TinyNetwork, set_infer_pruning
+    meta, rng = self.meta, np.random.RandomState(seed)
+    self.meta['scale'] = 1.0
+    predictor, ratios = TinyNetworkLatency(self, statistic), []
+    for index in rng.choice(predictor.codec.num_archs, num_networks, replace=False):
+      network = set_infer_pruning(TinyNetwork(meta['C'], meta['N'], predictor.codec.decode(int(index)), meta['num_classes']), False)
+      timed   = time_module(network, meta['shape'], meta['warmup'], meta['repeats'], meta['num_threads'])[statistic]
+      ratios.append( timed / predictor.predict(int(index)) )
+    self.meta['scale'] = float(np.median(ratios))
+    return self.meta['scale']
+
+  def save(self, path: Union[Text, Path]) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(str(path), 'w') as cfile:
+      json.dump({'meta': self.meta, 'entries': self.entries}, cfile, indent=1, sort_keys=True)
+
+  @staticmethod
+  def load(path: Union[Text, Path]):
+    with open(str(path), 'r') as cfile:
+      data = json.load(cfile)
+    return LatencyTable(data['entries'], data['meta'])
+
+
+class TinyNetworkLatency(object):
+  """Predict the CPU latency (microseconds per batch) of TinyNetwork by summing the LatencyTable entries, in the same way as models.TinyNetworkCosts:
+     the fixed latency of the stem, residual blocks, head and the cells of all skip_connect edges, plus one [num_edges, num_ops] table entry per edge
+     summed over all cells, which is the latency of the op minus that of skip_connect.
+  """
+  def __init__(self, table: LatencyTable, statistic: Text='p50'):
+    meta, shape = table.meta, table.meta['shape']
+    self.table, self.statistic = table, statistic
+    self.codec = ArchCodec(meta['op_names'], meta['max_nodes'])
+    C, N, H, W = meta['C'], meta['N'], shape[2], shape[3]
+    self.fixed = table.latency(LatencyTable.key('stem', shape[1], C, 1, H, W), statistic)
+    self.edges = np.zeros((self.codec.num_edges, len(self.codec.op_names)))
+    for C_curr, C_next in ((C, C*2), (C*2, C*4), (C*4, None)):
+      skip = table.latency(LatencyTable.key('skip_connect', C_curr, C_curr, 1, H, W), statistic)
+      for k in range(self.codec.num_edges):
+        for iop, op_name in enumerate(self.codec.op_names):
+          self.edges[k, iop] += N * (table.latency(LatencyTable.key(op_name, C_curr, C_curr, 1, H, W), statistic) - skip)
+      self.fixed += N * table.latency(LatencyTable.key('skip-cell', C_curr, C_curr, 1, H, W), statistic)
+      if C_next is None:
+        self.fixed += table.latency(LatencyTable.key('head', C_curr, meta['num_classes'], 1, H, W), statistic)
+      else:
+        self.fixed += table.latency(LatencyTable.key('resblock', C_curr, C_next, 2, H, W), statistic)
+        H, W = (H - 1) // 2 + 1, (W - 1) // 2 + 1
+    self.fixed, self.edges = self.fixed * meta.get('scale', 1.0), self.edges * meta.get('scale', 1.0)
+    self._edge_pos = np.arange(self.codec.num_edges)
+
+  def __repr__(self):
+    return ('{name}(statistic={statistic}, {codec}, {table})'.format(name=self.__class__.__name__, **self.__dict__))
+
+  def predict(self, arch) -> float:
+    """Return the latency of a Structure, an architecture string, a code vector, or a code integer of ArchCodec.
+       Note that the code integer is not the NAS-Bench-201 index, and predict(api.index2code()[index]) is the latency of the `index`-th architecture."""
+    if isinstance(arch, str): arch = Structure.str2structure(arch)
+    if isinstance(arch, Structure):
+      latency = self.fixed
+      for i, node_info in enumerate(arch.nodes):
+        for op_name, j in node_info:
+          latency += self.edges[self.codec.edge2pos[(i+1, j)], self.codec.op2index[op_name]]
+      return float(latency)
+    if isinstance(arch, (int, np.integer)): arch = self.codec.int2vector(int(arch))
+    return float(self.fixed + self.edges[self._edge_pos, np.asarray(arch)].sum())
+
+  def predict_batch(self, codes) -> np.ndarray:
+    """Return the [B] latencies, where `codes` is a [B, num_edges] array of code vectors or a [B] array of code integers."""
+    codes = np.asarray(codes, dtype=np.int64)
+    if codes.ndim == 1:
+      bases = np.array(self.codec._bases, dtype=np.int64)
+      codes = (codes[:, None] // bases) % len(self.codec.op_names)
+    return self.fixed + self.edges[self._edge_pos, codes].sum(1)
+
+  def predict_all(self) -> np.ndarray:
+    """Return the latencies of all architectures in the order of the code integer (not the NAS-Bench-201 index), see TinyNetworkCosts.all_costs."""
+    return self.predict_batch( np.arange(self.codec.num_archs) )
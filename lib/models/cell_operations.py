@@ -157,6 +157,12 @@ class Zero(nn.Module):
     return 'C_in={C_in}, C_out={C_out}, stride={stride}'.format(**self.__dict__)
 
 
+def zero_outputs(x, C_out, stride):
+  # the zero output of a cell (C_out channels, and the spatial size reduced by stride), which is always zero and need not be computed
+  N, _, H, W = x.shape
+  return x.new_zeros((N, C_out, (H-1)//stride+1, (W-1)//stride+1))
+
+
 class FactorizedReduce(nn.Module):
 
   def __init__(self, C_in, C_out, stride, affine, track_running_stats):
@@ -8,7 +8,7 @@ from .search_model_setn     import TinyNetworkSETN
 from .search_model_enas     import TinyNetworkENAS
 from .search_model_metaenas import TinyNetworkMetaENAS
 from .search_model_random   import TinyNetworkRANDOM
-from .genotypes             import Structure as CellStructure, architectures as CellArchitectures
+from .genotypes             import Structure as CellStructure, architectures as CellArchitectures, ArchCodec as CellArchCodec
 # NASNet-based macro structure
 from .search_model_gdas_nasnet import NASNetworkGDAS
 from .search_model_darts_nasnet import NASNetworkDARTS
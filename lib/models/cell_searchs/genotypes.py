@@ -19,7 +19,25 @@ def get_combination(space, num):
           new_combs.append( xstring )
       combs = new_combs
   return combs
-  
+
+
+def live_edges(nodes, is_zero=None):
+  """Dead-path elimination of a cell, where nodes[i-1] is a tuple of (op, input-node) of the i-th node, e.g., Structure.nodes.
+     Return a list whose (i-1)-th element is the tuple of the positions in nodes[i-1] of the edges to compute, which drops an edge if
+     (1) is_zero(op) is True (by default, op is the 'none' operation), (2) its input node is always zero, or (3) it goes into a node that
+     does not reach the output node. If the last element is empty, the output of the cell is always zero."""
+  if is_zero is None: is_zero = lambda op: op == 'none'
+  zeros, lives = [False], []
+  for node_info in nodes:
+    live = tuple(k for k, (op, j) in enumerate(node_info) if not is_zero(op) and not zeros[j])
+    zeros.append( len(live) == 0 )
+    lives.append( live )
+  needs = [False] * len(nodes) + [True]
+  for i in range(len(nodes), 0, -1):
+    if not needs[i]: lives[i-1] = ()
+    for k in lives[i-1]: needs[ nodes[i-1][k][1] ] = True
+  return lives
+
 
 
 class Structure:
@@ -74,6 +92,9 @@ class Structure:
       nodes[i+1] = sum(sums) > 0
     return nodes[len(self.nodes)]
 
+  def live_edges(self):
+    return live_edges(self.nodes)
+
   def to_unique_str(self, consider_zero=False):
     # this is used to identify the isomorphic cell, which rerquires the prior knowledge of operation
     # two operations are special, i.e., none and skip_connect
@@ -162,6 +183,74 @@ class Structure:
 
 
 
+class ArchCodec:
+  """The bidirectional codec between Structure and the compact encodings of a cell, where every edge (i<-j) takes exactly one operation.
+     -- code vector : a tuple of the operation indexes, whose k-th element is on the k-th edge of (1<-0), (2<-0), (2<-1), (3<-0), ...
+     -- code integer : the base-len(op_names) number of the code vector, with the first edge as the most significant digit.
+     The code integer is NOT the architecture index in NAS-Bench-201, whose `meta_archs` are shuffled; NASBench201API.code2index()
+     and NASBench201API.index2code() convert them with the NAS-Bench-201 search space.
+  """
+  def __init__(self, op_names, max_nodes):
+    self.op_names  = tuple(op_names)
+    self.op2index  = {op_name: i for i, op_name in enumerate(self.op_names)}
+    self.max_nodes = max_nodes
+    self.edges     = tuple((i, j) for i in range(1, max_nodes) for j in range(i))
+    self.edge2pos  = {edge: k for k, edge in enumerate(self.edges)}
+    self.num_edges = len(self.edges)
+    self.num_archs = len(self.op_names) ** self.num_edges
+    self._bases    = tuple(len(self.op_names) ** (self.num_edges-1-k) for k in range(self.num_edges))
+    self._structures = dict() # code vector -> the shared Structure, see structure
+
+  def __repr__(self):
+    return ('{name}({num_edges} edges, {num_archs} architectures, ops={op_names})'.format(name=self.__class__.__name__, **self.__dict__))
+
+  def encode(self, arch, strict=True):
+    """Return the code vector of a Structure (or an architecture string). If `arch` has a missing or duplicated edge, raise ValueError (strict=True) or return None."""
+    if isinstance(arch, str): arch = Structure.str2structure(arch)
+    code, valid = [None] * self.num_edges, len(arch.nodes) == self.max_nodes - 1
+    for i, node_info in enumerate(arch.nodes if valid else []):
+      for op_name, j in node_info:
+        k = self.edge2pos.get((i+1, j), None)
+        if k is None or code[k] is not None or op_name not in self.op2index: valid = False
+        else: code[k] = self.op2index[op_name]
+    if not valid or any(x is None for x in code):
+      if strict: raise ValueError('can not encode {:} by {:}'.format(arch, self))
+      else     : return None
+    return tuple(code)
+
+  def decode(self, code):
+    """Return the Structure of a code vector or a code integer."""
+    if isinstance(code, int): code = self.int2vector(code)
+    assert len(code) == self.num_edges, 'invalid code length : {:} vs. {:}'.format(len(code), self.num_edges)
+    genotypes, k = [], 0
+    for i in range(1, self.max_nodes):
+      genotypes.append( tuple((self.op_names[ code[k+j] ], j) for j in range(i)) )
+      k += i
+    return Structure( genotypes )
+
+  def structure(self, code):
+    """The same as decode, but the Structure of each code vector is created once and shared by all calls, so that it should not be modified."""
+    if isinstance(code, int): code = self.int2vector(code)
+    arch = self._structures.get(code, None)
+    if arch is None: arch = self._structures[code] = self.decode(code)
+    return arch
+
+  def vector2int(self, code) -> int:
+    return sum(int(x) * base for x, base in zip(code, self._bases))
+
+  def int2vector(self, code: int):
+    assert 0 <= code < self.num_archs, 'invalid code integer : {:} vs. {:}'.format(code, self.num_archs)
+    return tuple((code // base) % len(self.op_names) for base in self._bases)
+
+  def encode_int(self, arch, strict=True):
+    code = self.encode(arch, strict)
+    return None if code is None else self.vector2int(code)
+
+  def tostr(self, code):
+    return self.decode(code).tostr()
+
+
+
 ResNet_CODE = Structure(
   [(('nor_conv_3x3', 0), ), # node-1 
    (('nor_conv_3x3', 1), ), # node-2
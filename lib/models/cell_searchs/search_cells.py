@@ -6,7 +6,8 @@ import warnings
 import torch.nn as nn
 import torch.nn.functional as F
 from copy import deepcopy
-from ..cell_operations import OPS
+from ..cell_operations import OPS, ReLUConvBN, SepConv, zero_outputs
+from .genotypes import live_edges
 
 
 # This module is used for NAS-Bench-201, represents a small search space with a complete DAG
@@ -20,6 +21,7 @@ class NAS201SearchCell(nn.Module):
     self.max_nodes = max_nodes
     self.in_dim    = C_in
     self.out_dim   = C_out
+    self.stride    = stride
     for i in range(1, max_nodes):
       for j in range(i):
         node_str = '{:}<-{:}'.format(i, j)
@@ -31,33 +33,47 @@ class NAS201SearchCell(nn.Module):
     self.edge_keys  = sorted(list(self.edges.keys()))
     self.edge2index = {key:i for i, key in enumerate(self.edge_keys)}
     self.num_edges  = len(self.edges)
+    # pre-compute the edge keys and operation indexes, to avoid formatting strings in forward
+    self.op2index   = {op_name: i for i, op_name in enumerate(self.op_names)}
+    self.edge_strs  = {(i, j): '{:}<-{:}'.format(i, j) for i in range(1, max_nodes) for j in range(i)}
+    self.code_edges = tuple((i, j, self.edge_strs[(i, j)]) for i in range(1, max_nodes) for j in range(i)) # the edge order of ArchCodec
+    self._plans     = dict() # code vector -> execution plan, see get_plan
+    self._fused     = dict() # edge key -> FusedMixedOp, see get_fused
+    self._cache_id  = id(self) # the caches hold the modules of this cell, so that a copy (or a replica of DataParallel) rebuilds its own caches
 
   def extra_repr(self):
     string = 'info :: {max_nodes} nodes, inC={in_dim}, outC={out_dim}'.format(**self.__dict__)
     return string
 
+  def get_fused(self, node_str):
+    if self._cache_id != id(self): self._plans, self._fused, self._cache_id = dict(), dict(), id(self)
+    if node_str not in self._fused: self._fused[node_str] = FusedMixedOp(self.edges[node_str])
+    return self._fused[node_str]
+
   def forward(self, inputs, weightss):
     nodes = [inputs]
     for i in range(1, self.max_nodes):
       inter_nodes = []
       for j in range(i):
-        node_str = '{:}<-{:}'.format(i, j)
+        node_str = self.edge_strs[(i, j)]
         weights  = weightss[ self.edge2index[node_str] ]
-        inter_nodes.append( sum( layer(nodes[j]) * w for layer, w in zip(self.edges[node_str], weights) ) )
+        inter_nodes.append( self.get_fused(node_str)(nodes[j], weights) ) # = sum( layer(nodes[j]) * w for layer, w in zip(self.edges[node_str], weights) )
       nodes.append( sum(inter_nodes) )
       # nodes.append( sum(inter_nodes) / len(inter_nodes) )
     return nodes[-1]
 
-  # GDAS
+  # GDAS, where `index` is the list of the selected operation index of each edge, copied to host once by the network
   def forward_gdas(self, inputs, hardwts, index):
+    assert isinstance(index, list), 'index should be a list, copy it to host once per network forward : {:}'.format(type(index))
     nodes   = [inputs]
     for i in range(1, self.max_nodes):
       inter_nodes = []
       for j in range(i):
-        node_str = '{:}<-{:}'.format(i, j)
+        node_str = self.edge_strs[(i, j)]
         weights  = hardwts[ self.edge2index[node_str] ]
-        argmaxs  = index[ self.edge2index[node_str] ].item()
-        weigsum  = sum( weights[_ie] * edge(nodes[j]) if _ie == argmaxs else weights[_ie] for _ie, edge in enumerate(self.edges[node_str]) )
+        argmaxs  = index[ self.edge2index[node_str] ]
+        # = sum( weights[_ie] * edge(nodes[j]) if _ie == argmaxs else weights[_ie] for _ie, edge in enumerate(self.edges[node_str]) )
+        weigsum  = weights[argmaxs] * self.edges[node_str][argmaxs](nodes[j]) + (weights.sum() - weights[argmaxs])
         inter_nodes.append( weigsum )
       nodes.append( sum(inter_nodes) )
       # nodes.append( sum(inter_nodes) / len(inter_nodes) )
@@ -69,10 +85,10 @@ class NAS201SearchCell(nn.Module):
     for i in range(1, self.max_nodes):
       inter_nodes = []
       for j in range(i):
-        node_str = '{:}<-{:}'.format(i, j)
+        node_str = self.edge_strs[(i, j)]
         weights  = weightss[ self.edge2index[node_str] ]
         #aggregation = sum( layer(nodes[j]) * w for layer, w in zip(self.edges[node_str], weights) ) / weights.numel()
-        aggregation = sum( layer(nodes[j]) * w for layer, w in zip(self.edges[node_str], weights) )
+        aggregation = self.get_fused(node_str)(nodes[j], weights)
         inter_nodes.append( aggregation )
       nodes.append( sum(inter_nodes) )
       # nodes.append( sum(inter_nodes) / len(inter_nodes) )
@@ -80,21 +96,22 @@ class NAS201SearchCell(nn.Module):
 
   # uniform random sampling per iteration, SETN
   def forward_urs(self, inputs):
-    nodes = [inputs]
+    nodes, sops = [inputs], []
     for i in range(1, self.max_nodes):
       while True: # to avoid select zero for all ops
-        sops, has_non_zero = [], False
+        cur_sops, has_non_zero = [], False
         for j in range(i):
-          node_str   = '{:}<-{:}'.format(i, j)
+          node_str   = self.edge_strs[(i, j)]
           candidates = self.edges[node_str]
           select_op  = random.choice(candidates)
-          sops.append( select_op )
+          cur_sops.append( (select_op, j) )
           if not hasattr(select_op, 'is_zero') or select_op.is_zero is False: has_non_zero=True
         if has_non_zero: break
-      inter_nodes = []
-      for j, select_op in enumerate(sops):
-        inter_nodes.append( select_op(nodes[j]) )
-      nodes.append( sum(inter_nodes) )
+      sops.append( tuple(cur_sops) )
+    # skip the zero edges and the nodes that do not reach the output
+    lives = live_edges(sops, lambda op: getattr(op, 'is_zero', False))
+    for i, node_sops in enumerate(sops):
+      nodes.append( sum(node_sops[k][0](nodes[ node_sops[k][1] ]) for k in lives[i]) )
       # nodes.append( sum(inter_nodes) / len(inter_nodes) )
     return nodes[-1]
 
@@ -113,19 +130,105 @@ class NAS201SearchCell(nn.Module):
     return nodes[-1]
 
   # forward with a specific structure
+  # `structure` can be a Structure or its code vector by ArchCodec (a tuple of operation indexes)
   def forward_dynamic(self, inputs, structure):
+    if isinstance(structure, tuple): return self.forward_encoded(inputs, structure)
+    lives = live_edges(structure.nodes)
+    if len(lives[-1]) == 0: return zero_outputs(inputs, self.out_dim, self.stride)
     nodes = [inputs]
     for i in range(1, self.max_nodes):
       cur_op_node = structure.nodes[i-1]
       inter_nodes = []
-      for op_name, j in cur_op_node:
-        node_str = '{:}<-{:}'.format(i, j)
-        op_index = self.op_names.index( op_name )
+      for k in lives[i-1]:
+        op_name, j  = cur_op_node[k]
+        node_str = self.edge_strs[(i, j)]
+        op_index = self.op2index[ op_name ]
         inter_nodes.append( self.edges[node_str][op_index]( nodes[j] ) )
-      nodes.append( sum(inter_nodes) )
+      nodes.append( sum(inter_nodes) ) # a dead node is 0 and never used
       # nodes.append( sum(inter_nodes) / len(inter_nodes) )
     return nodes[-1]
 
+  # the execution plan of a code vector of ArchCodec, i.e., the k-th operation index is for the k-th edge in `code_edges`.
+  # a plan is a tuple of nodes, each of which is a tuple of (operation-module, input-node), and is resolved once for each code.
+  # the zero edges and the nodes that do not reach the output are removed by `live_edges`, and the plan is None if the output is always zero.
+  def get_plan(self, code):
+    if self._cache_id != id(self): self._plans, self._fused, self._cache_id = dict(), dict(), id(self)
+    if code in self._plans: return self._plans[code]
+    genotypes, k = [], 0
+    for i in range(1, self.max_nodes):
+      genotypes.append( tuple((self.op_names[ code[k+j] ], j) for j in range(i)) )
+      k += i
+    lives, plan = live_edges(genotypes), []
+    for i, node_info in enumerate(genotypes):
+      plan.append( tuple((self.edges[ self.edge_strs[(i+1, j)] ][ self.op2index[op_name] ], j) for op_name, j in (node_info[x] for x in lives[i])) )
+    plan = self._plans[code] = None if len(lives[-1]) == 0 else tuple(plan)
+    return plan
+
+  # forward with the code vector of ArchCodec
+  def forward_encoded(self, inputs, code):
+    plan = self.get_plan(code)
+    if plan is None: return zero_outputs(inputs, self.out_dim, self.stride)
+    nodes = [inputs]
+    for node_plan in plan:
+      nodes.append( sum(op(nodes[j]) for op, j in node_plan) ) # a dead node is 0 and never used
+    return nodes[-1]
+
+
+
+class FusedMixedOp(object):
+  """The weighted sum of the candidate operations on one edge, i.e., sum( op(x) * w for op, w in zip(ops, weights) ), with fewer kernels:
+     (1) the Zero operations are skipped, (2) the leading ReLU of ReLUConvBN and SepConv is computed once and shared,
+     (3) the convolutions of ReLUConvBN are fused into one convolution, where the smaller kernels are zero-padded to the largest one and all kernels
+         are concatenated along the output channels, and then the BatchNorm of each candidate is applied on its slice of channels,
+     (4) the weighted sum is one tensordot over the stacked outputs.
+     It only keeps the references of the operations (not their parameters), so that it is created once for each edge.
+  """
+  def __init__(self, ops):
+    self.ops, convs, self.relu_ops, self.other_ops = list(ops), [], [], []
+    for k, op in enumerate(self.ops):
+      if getattr(op, 'is_zero', False): continue
+      elif self.fusible(op)           : convs.append(k)
+      elif isinstance(op, (ReLUConvBN, SepConv)) and isinstance(op.op[0], nn.ReLU): self.relu_ops.append(k)
+      else                            : self.other_ops.append(k)
+    # only the convolutions with the same input, output, and stride are fused
+    signatures = set((self.ops[k].op[1].in_channels, self.ops[k].op[1].out_channels, self.ops[k].op[1].stride) for k in convs)
+    if len(convs) < 2 or len(signatures) > 1: convs, self.relu_ops = [], sorted(convs + self.relu_ops)
+    self.conv_ops = convs
+    self.kernel   = max([self.ops[k].op[1].kernel_size[0] for k in convs] + [1])
+    self.index    = self.conv_ops + self.relu_ops + self.other_ops # the order of the stacked outputs
+    self.tails    = {k: list(self.ops[k].op)[1:] for k in self.relu_ops}
+
+  @staticmethod
+  def fusible(op):
+    if not isinstance(op, ReLUConvBN) or len(op.op) != 3 or not isinstance(op.op[0], nn.ReLU): return False
+    conv = op.op[1]
+    return conv.groups == 1 and conv.bias is None and conv.padding_mode == 'zeros' and conv.dilation == (1, 1) \
+             and conv.kernel_size[0] == conv.kernel_size[1] and conv.kernel_size[0] % 2 == 1 and conv.padding == (conv.kernel_size[0] // 2,) * 2
+
+  def fused_weight(self):
+    weights = []
+    for k in self.conv_ops:
+      weight = self.ops[k].op[1].weight
+      pad    = (self.kernel - weight.size(-1)) // 2
+      weights.append( F.pad(weight, (pad, pad, pad, pad)) if pad > 0 else weight )
+    return torch.cat(weights, dim=0)
+
+  def __call__(self, x, weights):
+    if len(self.index) == 0: return sum( op(x) * w for op, w in zip(self.ops, weights) )
+    outs = []
+    if len(self.conv_ops) + len(self.relu_ops) > 0: relu_x = F.relu(x)
+    if len(self.conv_ops) > 0:
+      conv = self.ops[self.conv_ops[0]].op[1]
+      features = F.conv2d(relu_x, self.fused_weight(), None, conv.stride, self.kernel // 2)
+      for k, feature in zip(self.conv_ops, features.split(conv.out_channels, dim=1)):
+        outs.append( self.ops[k].op[2](feature) )
+    for k in self.relu_ops:
+      feature = relu_x
+      for layer in self.tails[k]: feature = layer(feature)
+      outs.append( feature )
+    for k in self.other_ops:
+      outs.append( self.ops[k](x) )
+    return torch.tensordot(weights[self.index], torch.stack(outs), dims=1)
 
 
 class MixedOp(nn.Module):
@@ -136,12 +239,14 @@ class MixedOp(nn.Module):
     for primitive in space:
       op = OPS[primitive](C, C, stride, affine, track_running_stats)
       self._ops.append(op)
+    self._fused, self._fused_id = None, None # FusedMixedOp of this module, which is rebuilt by a copy (or a replica of DataParallel)
 
   def forward_gdas(self, x, weights, index):
     return self._ops[index](x) * weights[index]
 
   def forward_darts(self, x, weights):
-    return sum(w * op(x) for w, op in zip(weights, self._ops))
+    if self._fused_id != id(self): self._fused, self._fused_id = FusedMixedOp(self._ops), id(self)
+    return self._fused(x, weights) # = sum(w * op(x) for w, op in zip(weights, self._ops))
 
 
 # Learning Transferable Architectures for Scalable Image Recognition, CVPR 2018
@@ -170,6 +275,7 @@ class NASNetSearchCell(nn.Module):
     self.num_edges  = len(self.edges)
 
   def forward_gdas(self, s0, s1, weightss, indexs):
+    assert isinstance(indexs, list), 'indexs should be a list, copy it to host once per network forward : {:}'.format(type(indexs))
     s0 = self.preprocess0(s0)
     s1 = self.preprocess1(s1)
 
@@ -180,7 +286,7 @@ class NASNetSearchCell(nn.Module):
         node_str = '{:}<-{:}'.format(i, j)
         op = self.edges[ node_str ]
         weights = weightss[ self.edge2index[node_str] ]
-        index   = indexs[ self.edge2index[node_str] ].item()
+        index   = indexs[ self.edge2index[node_str] ]
         clist.append( op.forward_gdas(h, weights, index) )
       states.append( sum(clist) )
 
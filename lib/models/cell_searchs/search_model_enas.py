@@ -8,7 +8,7 @@ import torch.nn as nn
 from copy import deepcopy
 from ..cell_operations import ResNetBasicblock
 from .search_cells     import NAS201SearchCell as SearchCell
-from .genotypes        import Structure
+from .genotypes        import Structure, ArchCodec
 from .search_model_enas_utils import Controller
 
 
@@ -43,25 +43,20 @@ class TinyNetworkENAS(nn.Module):
     self.lastact    = nn.Sequential(nn.BatchNorm2d(C_prev), nn.ReLU(inplace=True))
     self.global_pooling = nn.AdaptiveAvgPool2d(1)
     self.classifier = nn.Linear(C_prev, num_classes)
-    # to maintain the sampled architecture
+    self.codec      = ArchCodec(search_space, max_nodes)
+    self.code_rows  = [edge2index['{:}<-{:}'.format(i, j)] for i, j in self.codec.edges] # the position in `edge2index` for each edge of the codec
+    # to maintain the sampled architecture and its code vector
     self.sampled_arch = None
+    self.sampled_code = None
 
   def update_arch(self, _arch):
     if _arch is None:
-      self.sampled_arch = None
+      self.sampled_arch, self.sampled_code = None, None
     elif isinstance(_arch, Structure):
-      self.sampled_arch = _arch
-    elif isinstance(_arch, (list, tuple)):
-      genotypes = []
-      for i in range(1, self.max_nodes):
-        xlist = []
-        for j in range(i):
-          node_str = '{:}<-{:}'.format(i, j)
-          op_index = _arch[ self.edge2index[node_str] ]
-          op_name  = self.op_names[ op_index ]
-          xlist.append((op_name, j))
-        genotypes.append( tuple(xlist) )
-      self.sampled_arch = Structure(genotypes)
+      self.sampled_arch, self.sampled_code = _arch, self.codec.encode(_arch, strict=False)
+    elif isinstance(_arch, (list, tuple)): # the operation index of each edge in the order of `edge2index`
+      self.sampled_code = tuple( int(_arch[k]) for k in self.code_rows )
+      self.sampled_arch = self.codec.structure( self.sampled_code )
     else:
       raise ValueError('invalid type of input architecture : {:}'.format(_arch))
     return self.sampled_arch
@@ -83,7 +78,7 @@ class TinyNetworkENAS(nn.Module):
     feature = self.stem(inputs)
     for i, cell in enumerate(self.cells):
       if isinstance(cell, SearchCell):
-        feature = cell.forward_dynamic(feature, self.sampled_arch)
+        feature = cell.forward_dynamic(feature, self.sampled_arch if self.sampled_code is None else self.sampled_code)
       else: feature = cell(feature)
 
     out = self.lastact(feature)
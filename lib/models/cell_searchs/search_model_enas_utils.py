@@ -30,26 +30,30 @@ class Controller(nn.Module):
     nn.init.uniform_(self.w_embd.weight      , -0.1, 0.1)
     nn.init.uniform_(self.w_pred.weight      , -0.1, 0.1)
 
-  def forward(self):
+  # sample `batch_size` architectures in one pass with a batched LSTM state, where nothing is synchronized to the host.
+  # return the log-probs [B], the entropies [B], and the operation indexes [B, num_edge] in the order of `edge2index`.
+  def sample(self, batch_size):
 
-    inputs, h0 = self.input_vars, None
-    log_probs, entropys, sampled_arch = [], [], []
+    inputs, h0 = self.input_vars.expand(1, batch_size, self.lstm_size), None
+    log_probs, entropys, sampled_archs = [], [], []
     for iedge in range(self.num_edge):
       outputs, h0 = self.w_lstm(inputs, h0)
       
-      logits = self.w_pred(outputs)
+      logits = self.w_pred(outputs[0])
       logits = logits / self.temperature
       logits = self.tanh_constant * torch.tanh(logits)
       # distribution
       op_distribution = Categorical(logits=logits)
       op_index    = op_distribution.sample()
-      sampled_arch.append( op_index.item() )
+      sampled_archs.append( op_index )
 
-      op_log_prob = op_distribution.log_prob(op_index)
-      log_probs.append( op_log_prob.view(-1) )
-      op_entropy  = op_distribution.entropy()
-      entropys.append( op_entropy.view(-1) )
+      log_probs.append( op_distribution.log_prob(op_index) )
+      entropys.append( op_distribution.entropy() )
       
       # obtain the input embedding for the next step
-      inputs = self.w_embd(op_index)
-    return torch.sum(torch.cat(log_probs)), torch.sum(torch.cat(entropys)), sampled_arch
+      inputs = self.w_embd(op_index).unsqueeze(0)
+    return torch.stack(log_probs, dim=1).sum(dim=1), torch.stack(entropys, dim=1).sum(dim=1), torch.stack(sampled_archs, dim=1)
+
+  def forward(self):
+    log_probs, entropys, sampled_archs = self.sample(1)
+    return log_probs[0], entropys[0], sampled_archs[0].tolist()
@@ -9,6 +9,21 @@ from .search_cells     import NAS201SearchCell as SearchCell
 from .genotypes        import Structure
 from ..cell_infers.cells     import InferCell
 
+
+def get_gumbel_prob(xins, tau):
+  # the hard one-hot weights (with the gradients of the soft probs) and the selected index of each row of `xins`.
+  # the exponential samples are clamped into (0, inf), so that the gumbels and probs are always finite (if xins is finite),
+  # which avoids re-sampling after checking isinf / isnan on the host, i.e., one synchronization per check.
+  finfo   = torch.finfo(xins.dtype)
+  gumbels = -torch.empty_like(xins).exponential_().clamp_(min=finfo.tiny, max=finfo.max).log()
+  logits  = (xins.log_softmax(dim=1) + gumbels) / tau
+  probs   = nn.functional.softmax(logits, dim=1)
+  index   = probs.max(-1, keepdim=True)[1]
+  one_h   = torch.zeros_like(logits).scatter_(-1, index, 1.0)
+  hardwts = one_h - probs.detach() + probs
+  return hardwts, index
+
+
 class TinyNetworkGDAS(nn.Module):
 
   #def __init__(self, C, N, max_nodes, num_classes, search_space, affine=False, track_running_stats=True):
@@ -94,16 +109,8 @@ class TinyNetworkGDAS(nn.Module):
     return Structure( genotypes )
 
   def forward_for_outs(self, inputs):
-    while True:
-      gumbels = -torch.empty_like(self.arch_parameters).exponential_().log()
-      logits  = (self.arch_parameters.log_softmax(dim=1) + gumbels) / self.tau
-      probs   = nn.functional.softmax(logits, dim=1)
-      index   = probs.max(-1, keepdim=True)[1]
-      one_h   = torch.zeros_like(logits).scatter_(-1, index, 1.0)
-      hardwts = one_h - probs.detach() + probs
-      if (torch.isinf(gumbels).any()) or (torch.isinf(probs).any()) or (torch.isnan(probs).any()):
-        continue
-      else: break
+    hardwts, index = get_gumbel_prob(self.arch_parameters, self.tau)
+    index = index.view(-1).tolist() # copy the selected indexes to host once, instead of once per edge in every cell
     all_outs = []
     feature = self.stem(inputs)
     for i, cell in enumerate(self.cells):
@@ -122,16 +129,8 @@ class TinyNetworkGDAS(nn.Module):
 
   def forward(self, inputs, out_all=False):
     if out_all: return self.forward_for_outs(inputs)
-    while True:
-      gumbels = -torch.empty_like(self.arch_parameters).exponential_().log()
-      logits  = (self.arch_parameters.log_softmax(dim=1) + gumbels) / self.tau
-      probs   = nn.functional.softmax(logits, dim=1)
-      index   = probs.max(-1, keepdim=True)[1]
-      one_h   = torch.zeros_like(logits).scatter_(-1, index, 1.0)
-      hardwts = one_h - probs.detach() + probs
-      if (torch.isinf(gumbels).any()) or (torch.isinf(probs).any()) or (torch.isnan(probs).any()):
-        continue
-      else: break
+    hardwts, index = get_gumbel_prob(self.arch_parameters, self.tau)
+    index = index.view(-1).tolist() # copy the selected indexes to host once, instead of once per edge in every cell
 
     feature = self.stem(inputs)
     for i, cell in enumerate(self.cells):
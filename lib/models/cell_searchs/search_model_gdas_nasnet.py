@@ -5,6 +5,7 @@ import torch
 import torch.nn as nn
 from copy import deepcopy
 from .search_cells import NASNetSearchCell as SearchCell
+from .search_model_gdas import get_gumbel_prob
 
 
 # The macro structure is based on NASNet
@@ -96,21 +97,10 @@ class NASNetworkGDAS(nn.Module):
             'reduce': gene_reduce, 'reduce_concat': list(range(2+self._steps-self._multiplier, self._steps+2))}
 
   def forward(self, inputs):
-    def get_gumbel_prob(xins):
-      while True:
-        gumbels = -torch.empty_like(xins).exponential_().log()
-        logits  = (xins.log_softmax(dim=1) + gumbels) / self.tau
-        probs   = nn.functional.softmax(logits, dim=1)
-        index   = probs.max(-1, keepdim=True)[1]
-        one_h   = torch.zeros_like(logits).scatter_(-1, index, 1.0)
-        hardwts = one_h - probs.detach() + probs
-        if (torch.isinf(gumbels).any()) or (torch.isinf(probs).any()) or (torch.isnan(probs).any()):
-          continue
-        else: break
-      return hardwts, index
-
-    normal_hardwts, normal_index = get_gumbel_prob(self.arch_normal_parameters)
-    reduce_hardwts, reduce_index = get_gumbel_prob(self.arch_reduce_parameters)
+    normal_hardwts, normal_index = get_gumbel_prob(self.arch_normal_parameters, self.tau)
+    reduce_hardwts, reduce_index = get_gumbel_prob(self.arch_reduce_parameters, self.tau)
+    # copy the selected indexes to host once, instead of once per edge in every cell
+    normal_index, reduce_index = normal_index.view(-1).tolist(), reduce_index.view(-1).tolist()
 
     s0 = s1 = self.stem(inputs)
     for i, cell in enumerate(self.cells):
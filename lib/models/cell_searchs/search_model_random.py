@@ -8,7 +8,7 @@ import torch.nn as nn
 from copy import deepcopy
 from ..cell_operations import ResNetBasicblock
 from .search_cells     import NAS201SearchCell as SearchCell
-from .genotypes        import Structure
+from .genotypes        import Structure, ArchCodec
 
 
 class TinyNetworkRANDOM(nn.Module):
@@ -42,7 +42,9 @@ class TinyNetworkRANDOM(nn.Module):
     self.lastact    = nn.Sequential(nn.BatchNorm2d(C_prev), nn.ReLU(inplace=True))
     self.global_pooling = nn.AdaptiveAvgPool2d(1)
     self.classifier = nn.Linear(C_prev, num_classes)
+    self.codec      = ArchCodec(search_space, max_nodes)
     self.arch_cache = None
+    self.code_cache = None # the code vector of arch_cache
     
   def get_message(self):
     string = self.extra_repr()
@@ -63,7 +65,7 @@ class TinyNetworkRANDOM(nn.Module):
         xlist.append((op_name, j))
       genotypes.append( tuple(xlist) )
     arch = Structure( genotypes )
-    if set_cache: self.arch_cache = arch
+    if set_cache: self.arch_cache, self.code_cache = arch, self.codec.encode(arch, strict=False)
     return arch
 
   def forward(self, inputs):
@@ -71,7 +73,7 @@ class TinyNetworkRANDOM(nn.Module):
     feature = self.stem(inputs)
     for i, cell in enumerate(self.cells):
       if isinstance(cell, SearchCell):
-        feature = cell.forward_dynamic(feature, self.arch_cache)
+        feature = cell.forward_dynamic(feature, self.arch_cache if self.code_cache is None else self.code_cache)
       else: feature = cell(feature)
 
     out = self.lastact(feature)
@@ -6,11 +6,21 @@
 import torch, random
 import torch.nn as nn
 from copy import deepcopy
+from functools import lru_cache
 from ..cell_operations import ResNetBasicblock
 from .search_cells     import NAS201SearchCell as SearchCell
-from .genotypes        import Structure
+from .genotypes        import Structure, ArchCodec
 from ..cell_infers.cells     import InferCell
 
+
+@lru_cache(maxsize=None)
+def all_arch_codes(op_names, max_nodes, device):
+  """The [num_archs, num_edges] LongTensor of the code vectors of all architectures, whose i-th row is `ArchCodec.int2vector(i)`."""
+  codec   = ArchCodec(op_names, max_nodes)
+  indexes = torch.arange(codec.num_archs, device=device)
+  bases   = [len(codec.op_names) ** (codec.num_edges-1-k) for k in range(codec.num_edges)]
+  return torch.stack([(indexes // base) % len(codec.op_names) for base in bases], dim=1)
+
 class TinyNetworkSETN(nn.Module):
 
   def __init__(self, C, N, max_nodes, num_classes, search_space, affine, track_running_stats, fixed_genotype=None, search_position=None):
@@ -51,14 +61,26 @@ class TinyNetworkSETN(nn.Module):
     self.global_pooling = nn.AdaptiveAvgPool2d(1)
     self.classifier = nn.Linear(C_prev, num_classes)
     self.arch_parameters = nn.Parameter( 1e-3*torch.randn(num_edge, len(search_space)) )
+    self.codec      = ArchCodec(search_space, max_nodes)
+    self.code_rows  = [edge2index['{:}<-{:}'.format(i, j)] for i, j in self.codec.edges] # the row of arch_parameters for each edge of the codec
     self.mode       = 'urs'
     self.dynamic_cell = None
+    self.dynamic_code = None
 
+  # in the dynamic mode, `dynamic_cell` can be a Structure, a code vector or a code integer of self.codec
   def set_cal_mode(self, mode, dynamic_cell=None):
     assert mode in ['urs', 'joint', 'select', 'dynamic']
     self.mode = mode
-    if mode == 'dynamic': self.dynamic_cell = deepcopy( dynamic_cell )
-    else                : self.dynamic_cell = None
+    if mode == 'dynamic':
+      if isinstance(dynamic_cell, (int, tuple)): dynamic_cell = self.codec.decode(dynamic_cell)
+      self.dynamic_cell = deepcopy( dynamic_cell )
+      self.dynamic_code = self.codec.encode(dynamic_cell, strict=False)
+    else:
+      self.dynamic_cell, self.dynamic_code = None, None
+
+  def get_dynamic_arch(self):
+    # the code vector is used in forward if the cell can be encoded
+    return self.dynamic_cell if self.dynamic_code is None else self.dynamic_code
 
   def get_cal_mode(self):
     return self.mode
@@ -116,25 +138,23 @@ class TinyNetworkSETN(nn.Module):
       genotypes.append( tuple(xlist) )
     return Structure( genotypes )
 
+  # `arch` can be a Structure or a code vector of self.codec
   def get_log_prob(self, arch):
+    code = arch if isinstance(arch, tuple) else self.codec.encode(arch)
     with torch.no_grad():
       logits = nn.functional.log_softmax(self.arch_parameters, dim=-1)
-    select_logits = []
-    for i, node_info in enumerate(arch.nodes):
-      for op, xin in node_info:
-        node_str = '{:}<-{:}'.format(i+1, xin)
-        op_index = self.op_names.index(op)
-        select_logits.append( logits[self.edge2index[node_str], op_index] )
-    return sum(select_logits).item()
+      return logits[self.code_rows, list(code)].sum().item()
 
 
+  # the log-probs of all architectures in the search space are computed by one gather, and the top-K are selected by torch.topk
   def return_topK(self, K):
-    archs = Structure.gen_all(self.op_names, self.max_nodes, False)
-    pairs = [(self.get_log_prob(arch), arch) for arch in archs]
-    if K < 0 or K >= len(archs): K = len(archs)
-    sorted_pairs = sorted(pairs, key=lambda x: -x[0])
-    return_pairs = [sorted_pairs[_][1] for _ in range(K)]
-    return return_pairs
+    codes = all_arch_codes(tuple(self.op_names), self.max_nodes, self.arch_parameters.device)
+    if K < 0 or K >= len(codes): K = len(codes)
+    with torch.no_grad():
+      logits    = nn.functional.log_softmax(self.arch_parameters, dim=-1)[self.code_rows]
+      log_probs = logits.gather(1, codes.t()).sum(dim=0)
+      _, indexes = torch.topk(log_probs, K)
+    return [self.codec.decode(index) for index in indexes.tolist()]
 
 
   def forward_for_outs(self, inputs): ###
@@ -153,7 +173,7 @@ class TinyNetworkSETN(nn.Module):
         elif self.mode == 'joint':
           feature = cell.forward_joint(feature, alphas)
         elif self.mode == 'dynamic':
-          feature = cell.forward_dynamic(feature, self.dynamic_cell)
+          feature = cell.forward_dynamic(feature, self.get_dynamic_arch())
         else: raise ValueError('invalid mode={:}'.format(self.mode))
       else: feature = cell(feature)
       all_outs.append(feature) ###
@@ -182,7 +202,7 @@ class TinyNetworkSETN(nn.Module):
         elif self.mode == 'joint':
           feature = cell.forward_joint(feature, alphas)
         elif self.mode == 'dynamic':
-          feature = cell.forward_dynamic(feature, self.dynamic_cell)
+          feature = cell.forward_dynamic(feature, self.get_dynamic_arch())
         else: raise ValueError('invalid mode={:}'.format(self.mode))
       else: feature = cell(feature)
 
@@ -2,7 +2,13 @@
 # Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
 #####################################################
 from .api import NASBench201API
-from .api import ArchResults, ResultsCount
+from .api import ArchResults, ArchResultsView, ResultsCount, ResultsCountView
+from .api_columnar import NASBench201ColumnarAPI, convert_to_columnar
+from .weights_cache import WeightsLRUCache
+from .metric_index import MetricIndex
+from .isomorphism  import IsomorphismIndex
+from .service      import NASBench201Server, NASBench201Client, is_server_address, load_authkey
+from .results_store import ResultsStore
 
 # NAS_BENCH_201_API_VERSION="v1.1"  # [2020.02.25]
 # NAS_BENCH_201_API_VERSION="v1.2"  # [2020.03.09]
@@ -9,8 +9,9 @@
 #
 # I'm still actively enhancing this benchmark. Please feel free to contact me if you have any question w.r.t. NAS-Bench-201.
 #
-import os, copy, random, torch, numpy as np
+import os, copy, random, threading, torch, numpy as np
 from pathlib import Path
+from types import MappingProxyType
 from typing import List, Text, Union, Dict
 from collections import OrderedDict, defaultdict
 
@@ -45,15 +46,24 @@ This is the class for API of NAS-Bench-201.
 """
 class NASBench201API(object):
 
-  """ The initialization function that takes the dataset file path (or a dict loaded from that path) as input. """
+  """ The initialization function that takes the dataset file path (or a dict loaded from that path, or the directory of a ResultsStore) as input. """
   def __init__(self, file_path_or_dict: Union[Text, Dict], verbose: bool=True):
-    self.filename = None
+    self.filename, self.file_path, self._store, self._fingerprint = None, None, None, None
     if isinstance(file_path_or_dict, str) or isinstance(file_path_or_dict, Path):
       file_path_or_dict = str(file_path_or_dict)
       if verbose: print('try to create the NAS-Bench-201 api from {:}'.format(file_path_or_dict))
-      assert os.path.isfile(file_path_or_dict), 'invalid path : {:}'.format(file_path_or_dict)
-      self.filename = Path(file_path_or_dict).name
-      file_path_or_dict = torch.load(file_path_or_dict, map_location='cpu')
+      self.filename, self.file_path = Path(file_path_or_dict).name, file_path_or_dict
+      if os.path.isdir(file_path_or_dict):
+        from .results_store import ResultsStore
+        assert ResultsStore.is_store(file_path_or_dict), 'invalid store : {:}'.format(file_path_or_dict)
+        self._store = ResultsStore(file_path_or_dict)
+        file_path_or_dict = self._store.to_dict()
+        self._fingerprint = self._store.read_fingerprint
+      else:
+        assert os.path.isfile(file_path_or_dict), 'invalid path : {:}'.format(file_path_or_dict)
+        xstat = os.stat(file_path_or_dict)
+        file_path_or_dict = torch.load(file_path_or_dict, map_location='cpu')
+        self._fingerprint = 'file-{:}-{:}'.format(xstat.st_mtime_ns, xstat.st_size)
     elif isinstance(file_path_or_dict, dict):
       file_path_or_dict = copy.deepcopy( file_path_or_dict )
     else: raise ValueError('invalid type : {:} not in [str, dict]'.format(type(file_path_or_dict)))
@@ -74,9 +84,12 @@ class NASBench201API(object):
       #assert arch.tostr() not in self.archstr2index, 'This [{:}]-th arch {:} already in the dict ({:}).'.format(idx, arch, self.archstr2index[arch.tostr()])
       assert arch not in self.archstr2index, 'This [{:}]-th arch {:} already in the dict ({:}).'.format(idx, arch, self.archstr2index[arch])
       self.archstr2index[ arch ] = idx
+    self._columnar = None
+    self._weights_cache = None
+    self._lock = threading.RLock() # guards the lazy builds, since NASBench201Server queries one api from many threads
 
   def __getitem__(self, index: int):
-    return copy.deepcopy( self.meta_archs[index] )
+    return self.meta_archs[index] # the architecture string is immutable
 
   def __len__(self):
     return len(self.meta_archs)
@@ -104,6 +117,35 @@ class NASBench201API(object):
     else: arch_index = -1
     return arch_index
 
+  # The code integers of `ArchCodec` (lib/models/cell_searchs/genotypes.py) with the NAS-Bench-201 search space are NOT the indexes of this benchmark,
+  # since `meta_archs` is shuffled (see exps/NAS-Bench-201/main.py). These two arrays convert them, and are computed once from `meta_archs` by `str2code`.
+  def index2code(self) -> np.ndarray:
+    """Return the int64 array whose i-th element is the code integer of the i-th architecture."""
+    with self._lock:
+      if getattr(self, '_index2code', None) is None:
+        self._index2code = np.array([NASBench201API.str2code(arch) for arch in self.meta_archs], dtype=np.int64)
+      return self._index2code
+
+  def code2index(self) -> np.ndarray:
+    """Return the int64 array whose c-th element is the index of the architecture of the code integer c."""
+    with self._lock:
+      if getattr(self, '_code2index', None) is None:
+        index2code = self.index2code()
+        code2index = np.full(len(index2code), -1, dtype=np.int64)
+        code2index[index2code] = np.arange(len(index2code))
+        self._code2index = code2index
+      return self._code2index
+
+  # This function returns the index of an architecture encoded by `ArchCodec` with the NAS-Bench-201 search space.
+  # The input code can be a code integer or a code vector (the operation index on each edge), and the index is looked up by `code2index`.
+  def query_index_by_code(self, code):
+    code2index = self.code2index()
+    if not isinstance(code, (int, np.integer)):
+      num_ops = int(round(len(code2index) ** (1.0 / len(code))))
+      assert num_ops ** len(code) == len(code2index), 'invalid code {:} for {:} architectures'.format(code, len(code2index))
+      code = sum(int(x) * num_ops ** (len(code)-1-k) for k, x in enumerate(code))
+    return int(code2index[code]) if 0 <= code < len(code2index) else -1
+
   def reload(self, archive_root: Text, index: int):
     """Overwrite all information of the 'index'-th architecture in the search space.
          It will load its data from 'archive_root'.
@@ -118,6 +160,77 @@ class NASBench201API(object):
     if index in self.arch2infos_full: del self.arch2infos_full[index]
     self.arch2infos_less[index] = ArchResults.create_from_state_dict( xdata['less'] )
     self.arch2infos_full[index] = ArchResults.create_from_state_dict( xdata['full'] )
+    if index not in self.evaluated_indexes: self.evaluated_indexes = sorted(self.evaluated_indexes + [index])
+    self._columnar = None
+    if self._weights_cache is not None: self._weights_cache.discard(index)
+    self._journaled(self._store.append({index: xdata}) if self._store is not None else None)
+
+  def fingerprint(self) -> Union[None, Text]:
+    """The fingerprint of the results in memory, which is that of the loaded file (mtime and size) or store (see `ResultsStore.fingerprint`),
+         and follows the changes journaled into the loaded store. It is None if the results are not the same as any file, e.g., after
+         the changes without a store, and then the saved indexes (see `get_metric_index`) are neither loaded nor saved.
+    """
+    return self._fingerprint
+
+  def _journaled(self, record: Union[None, Dict]) -> None:
+    # the results in memory are changed and `record` is the committed segment of this change (if any)
+    from .results_store import chain_fingerprint
+    if record is None or self._fingerprint is None or not os.path.isdir(self.file_path):
+      self._fingerprint = None
+    else:
+      self._fingerprint = chain_fingerprint(self._fingerprint, record)
+
+  def attach_store(self, root: Text):
+    """Journal the following changes (`reload`, `add_result`, `reset_latency`, ...) into the ResultsStore in 'root',
+         which is created with all results of this api if it does not exist. Then `NASBench201API(root)` sees these changes.
+    """
+    from .results_store import ResultsStore
+    exists      = ResultsStore.is_store(root)
+    self._store = ResultsStore(root, self.meta_archs)
+    if not exists:
+      for start in range(0, len(self.evaluated_indexes), 100):
+        self._store.append({index: {'full': self.arch2infos_full[index].state_dict(),
+                                    'less': self.arch2infos_less[index].state_dict()} for index in self.evaluated_indexes[start:start+100]})
+    return self._store
+
+  def apply_updates(self, updates: List[tuple]) -> None:
+    """Apply a list of (index, use_12epochs_result, op, args) updates (see `results_store.UPDATE_OPS`) in memory,
+         and commit them into the attached ResultsStore (if any) as one small segment.
+    """
+    from .results_store import apply_update
+    for index, use_12epochs_result, op, args in updates:
+      assert 0 <= index < len(self.meta_archs), 'invalid index of {:}'.format(index)
+      if index not in self.arch2infos_full:
+        self.arch2infos_less[index] = ArchResults(index, self.meta_archs[index])
+        self.arch2infos_full[index] = ArchResults(index, self.meta_archs[index])
+        self.evaluated_indexes = sorted(self.evaluated_indexes + [index])
+      if use_12epochs_result: apply_update(self.arch2infos_less[index], op, args)
+      else                  : apply_update(self.arch2infos_full[index], op, args)
+    self._columnar = None
+    self._journaled(self._store.append_updates(updates) if self._store is not None else None)
+
+  # add (or overwrite) the result of the `seed` trial of the 'index'-th architecture on `dataset`, where `result` is a ResultsCount
+  def add_result(self, index: int, dataset: Text, seed: int, result, use_12epochs_result: bool=False) -> None:
+    self.apply_updates([(index, use_12epochs_result, 'result', (dataset, seed, result.state_dict()))])
+
+  # the following functions reset the latency / train-times / eval-times of the 'index'-th architecture in all (seed=None) or one trial(s)
+  def reset_latency(self, index: int, dataset: Text, seed: Union[None, int], latency: float, use_12epochs_result: bool=False) -> None:
+    self.apply_updates([(index, use_12epochs_result, 'latency', (dataset, seed, latency))])
+
+  def reset_pseudo_train_times(self, index: int, dataset: Text, seed: Union[None, int], estimated_per_epoch_time: float, use_12epochs_result: bool=False) -> None:
+    self.apply_updates([(index, use_12epochs_result, 'train-times', (dataset, seed, estimated_per_epoch_time))])
+
+  def reset_pseudo_eval_times(self, index: int, dataset: Text, seed: Union[None, int], eval_name: Text, estimated_per_epoch_time: float, use_12epochs_result: bool=False) -> None:
+    self.apply_updates([(index, use_12epochs_result, 'eval-times', (dataset, seed, eval_name, estimated_per_epoch_time))])
+
+  def enable_lazy_weights(self, archive_root: Text, max_bytes: int = 4 * 1024**3):
+    """Drop all weights in memory, and then `get_net_param` will load the weights of each architecture
+         from 'archive_root' on demand, where at most 'max_bytes' bytes of weights are cached (least recently used first out).
+    """
+    from .weights_cache import WeightsLRUCache
+    for index in self.arch2infos_less.keys(): self.clear_params(index, None)
+    self._weights_cache = WeightsLRUCache(archive_root, max_bytes)
+    return self._weights_cache
 
   def clear_params(self, index: int, use_12epochs_result: Union[bool, None]):
     """Remove the architecture's weights to save memory.
@@ -168,47 +281,47 @@ class NASBench201API(object):
   #  -- cifar10 : training the model on the CIFAR-10 training + validation set.
   #  -- cifar100 : training the model on the CIFAR-100 training set.
   #  -- ImageNet16-120 : training the model on the ImageNet16-120 training set.
+  # ------
+  # If clone=True, return a deep copy (including the trained weights), which can be modified freely.
+  # If clone=False, return a read-only ArchResultsView (or the read-only ResultsCountView of each trial) without any copy.
   def query_by_index(self, arch_index: int, dataname: Union[None, Text] = None,
-                     use_12epochs_result: bool = False):
+                     use_12epochs_result: bool = False, clone: bool = True):
     if use_12epochs_result: basestr, arch2infos = '12epochs' , self.arch2infos_less
     else                  : basestr, arch2infos = '200epochs', self.arch2infos_full
     assert arch_index in arch2infos, 'arch_index [{:}] does not in arch2info with {:}'.format(arch_index, basestr)
-    archInfo = copy.deepcopy( arch2infos[ arch_index ] )
+    archInfo = copy.deepcopy( arch2infos[ arch_index ] ) if clone else ArchResultsView( arch2infos[ arch_index ] )
     if dataname is None: return archInfo
     else:
       assert dataname in archInfo.get_dataset_names(), 'invalid dataset-name : {:}'.format(dataname)
       info = archInfo.query(dataname)
       return info
 
-  def query_meta_info_by_index(self, arch_index, use_12epochs_result=False):
+  def query_meta_info_by_index(self, arch_index, use_12epochs_result=False, clone: bool = True):
     if use_12epochs_result: basestr, arch2infos = '12epochs' , self.arch2infos_less
     else                  : basestr, arch2infos = '200epochs', self.arch2infos_full
     assert arch_index in arch2infos, 'arch_index [{:}] does not in arch2info with {:}'.format(arch_index, basestr)
-    archInfo = copy.deepcopy( arch2infos[ arch_index ] )
-    return archInfo
+    if clone: return copy.deepcopy( arch2infos[ arch_index ] )
+    else    : return ArchResultsView( arch2infos[ arch_index ] )
 
   def find_best(self, dataset, metric_on_set, FLOP_max=None, Param_max=None, use_12epochs_result=False):
     """Find the architecture with the highest accuracy based on some constraints."""
-    if use_12epochs_result: basestr, arch2infos = '12epochs' , self.arch2infos_less
-    else                  : basestr, arch2infos = '200epochs', self.arch2infos_full
-    best_index, highest_accuracy = -1, None
-    for i, idx in enumerate(self.evaluated_indexes):
-      info = arch2infos[idx].get_compute_costs(dataset)
-      flop, param, latency = info['flops'], info['params'], info['latency']
-      if FLOP_max  is not None and flop  > FLOP_max : continue
-      if Param_max is not None and param > Param_max: continue
-      xinfo = arch2infos[idx].get_metrics(dataset, metric_on_set)
-      loss, accuracy = xinfo['loss'], xinfo['accuracy']
-      if best_index == -1:
-        best_index, highest_accuracy = idx, accuracy
-      elif highest_accuracy < accuracy:
-        best_index, highest_accuracy = idx, accuracy
-    return best_index, highest_accuracy
+    return self.get_metric_index(dataset, metric_on_set, None, use_12epochs_result).find_best(FLOP_max, Param_max)
+
+  # This function returns a MetricIndex of the accuracy on `metric_on_set` (averaged over all trials) for all architectures evaluated on `dataset`,
+  # which answers find_best / topk / random_k with the FLOP and Param constraints.
+  # It is built once and saved next to the benchmark file (e.g., $TORCH_HOME/NAS-Bench-201-v1_1-096897-index/).
+  def get_metric_index(self, dataset: Text, metric_on_set: Text, iepoch=None, use_12epochs_result: bool=False):
+    return self.columnar().get_metric_index(dataset, metric_on_set, iepoch, use_12epochs_result)
+
+  # This function returns an IsomorphismIndex, which maps each architecture index to the class of its isomorphic architectures and each class to its member indexes.
+  # It is used to skip the architectures that are equivalent to an evaluated one, e.g., `api.get_isomorphism_index().unique(indexes)`.
+  def get_isomorphism_index(self, consider_zero=True):
+    return self.columnar().get_isomorphism_index(consider_zero)
 
   def arch(self, index: int):
     """Return the topology structure of the `index`-th architecture."""
     assert 0 <= index < len(self.meta_archs), 'invalid index : {:} vs. {:}.'.format(index, len(self.meta_archs))
-    return copy.deepcopy(self.meta_archs[index])
+    return self.meta_archs[index]
 
   def get_net_param(self, index, dataset, seed, use_12epochs_result=False):
     """
@@ -219,7 +332,10 @@ class NASBench201API(object):
       Args [use_12epochs_result]:
         -- True : train the model by 12 epochs
         -- False : train the model by 200 epochs
+      If `enable_lazy_weights` is called, the weights are loaded from the archive via the LRU cache.
     """
+    if self._weights_cache is not None:
+      return self._weights_cache.get_net_param(index, dataset, seed, use_12epochs_result)
     if use_12epochs_result: arch2infos = self.arch2infos_less
     else: arch2infos = self.arch2infos_full
     arch_result = arch2infos[index]
@@ -276,13 +392,17 @@ class NASBench201API(object):
   #   When use_12epochs_result=False, it trains the network with 200 epochs and the LR decayed from 0.1 to 0 within 200 epochs
   # `is_random`
   #   When is_random=True, the performance of a random architecture will be returned
+  #   When is_random=np.random.RandomState(...), the random trial is selected by this RNG instead of the global one
   #   When is_random=False, the performanceo of all trials will be averaged.
   def get_more_info(self, index: int, dataset, iepoch=None, use_12epochs_result=False, is_random=True):
     if use_12epochs_result: basestr, arch2infos = '12epochs' , self.arch2infos_less
     else                  : basestr, arch2infos = '200epochs', self.arch2infos_full
     archresult = arch2infos[index]
     # if randomly select one trial, select the seed at first
-    if isinstance(is_random, bool) and is_random:
+    if isinstance(is_random, np.random.RandomState):
+      seeds = archresult.get_dataset_seeds(dataset)
+      is_random = seeds[is_random.randint(len(seeds))]
+    elif isinstance(is_random, bool) and is_random:
       seeds = archresult.get_dataset_seeds(dataset)
       is_random = random.choice(seeds)
     # collect the training information
@@ -395,6 +515,34 @@ class NASBench201API(object):
       return xifo
   """
 
+  def columnar(self):
+    """Return the in-memory NASBench201ColumnarAPI of this api, which serves the vectorized queries.
+       Call `reset_columnar` after modifying any ArchResults in place (e.g., `reset_latency`).
+    """
+    with self._lock:
+      if self._columnar is None:
+        from .api_columnar import NASBench201ColumnarAPI
+        self._columnar = NASBench201ColumnarAPI.from_api(self)
+      return self._columnar
+
+  def reset_columnar(self) -> None:
+    with self._lock:
+      self._columnar = None
+      self._fingerprint = None
+
+  # the batched version of `get_more_info`, which returns a dict of numpy arrays for all architectures in `indexes`
+  # please see `NASBench201ColumnarAPI.get_more_info_batch` for details
+  def get_more_info_batch(self, indexes, dataset, iepoch=None, use_12epochs_result=False, is_random=True) -> Dict[Text, np.ndarray]:
+    return self.columnar().get_more_info_batch(indexes, dataset, iepoch, use_12epochs_result, is_random)
+
+  def get_times_batch(self, indexes, dataset: Text, setname: Text, iepoch=None, is_random=False, use_12epochs_result: bool=False):
+    return self.columnar().get_times_batch(indexes, dataset, setname, iepoch, is_random, use_12epochs_result)
+
+  # the learning curves of all architectures as [arch, seed, epoch] arrays of loss, accuracy, time and cumulative-time
+  # please see `NASBench201ColumnarAPI.get_learning_curves` for details
+  def get_learning_curves(self, dataset: Text, setname: Text, use_12epochs_result: bool=False) -> Dict[Text, np.ndarray]:
+    return self.columnar().get_learning_curves(dataset, setname, use_12epochs_result)
+
   def show(self, index: int = -1) -> None:
     """
     This function will print the information of a specific (or all) architecture(s).
@@ -475,6 +623,26 @@ class NASBench201API(object):
       genotypes.append( input_infos )
     return genotypes
 
+  @staticmethod
+  def str2code(arch_str: Text,
+               search_space: List[Text] = ['none', 'skip_connect', 'nor_conv_1x1', 'nor_conv_3x3', 'avg_pool_3x3']) -> int:
+    """
+    This func returns the code integer of an architecture string, which is the same as `ArchCodec(search_space, num_nodes).encode_int`
+      in `AutoDL-Projects/lib/models/cell_searchs/genotypes.py`, i.e., the base-len(search_space) number of the operation index on each
+      edge (i<-j), ordered by (i, j) with the first edge as the most significant digit.
+
+    :usage
+      code = api.str2code( '|nor_conv_1x1~0|+|none~0|none~1|+|none~0|none~1|skip_connect~2|' )
+    """
+    code = 0
+    for i, node in enumerate(NASBench201API.str2lists(arch_str)):
+      node = sorted(node, key=lambda x: x[1])
+      assert [xin for _, xin in node] == list(range(i+1)), 'the {:}-th node of {:} does not have one edge from each previous node'.format(i+1, arch_str)
+      for op, _ in node:
+        if op not in search_space: raise ValueError('invalid op-name {:} not in {:}'.format(op, search_space))
+        code = code * len(search_space) + search_space.index(op)
+    return code
+
   @staticmethod
   def str2matrix(arch_str: Text,
                  search_space: List[Text] = ['none', 'skip_connect', 'nor_conv_1x1', 'nor_conv_3x3', 'avg_pool_3x3']) -> np.ndarray:
@@ -611,7 +779,7 @@ class ArchResults(object):
     return list(self.dataset_seed.keys())
 
   def get_dataset_seeds(self, dataset):
-    return copy.deepcopy( self.dataset_seed[dataset] )
+    return tuple( self.dataset_seed[dataset] )
 
   def get_net_param(self, dataset: Text, seed: Union[None, int] =None):
     """
@@ -756,6 +924,45 @@ class ArchResults(object):
     return ('{name}(arch-index={index}, arch={arch}, {num} runs, clear={clear})'.format(name=self.__class__.__name__, index=self.arch_index, arch=self.arch_str, num=len(self.all_results), clear=self.clear_net_done))
 
 
+"""
+This class is a read-only proxy of ArchResults, which shares (instead of copies) all the data.
+All the query functions are the same as ArchResults, while the functions that modify the data in place are disabled.
+`query` returns the read-only ResultsCountView of each trial, and `all_results` / `dataset_seed` are returned as read-only mappings.
+The weights of `get_net_param` and the dict of `state_dict` are still shared with the API, please use clone=True to modify them.
+"""
+class ArchResultsView(object):
+
+  _inplace_funcs = ('update', 'load_state_dict', 'clear_params', 'reset_latency', 'reset_pseudo_train_times', 'reset_pseudo_eval_times')
+
+  def __init__(self, archresult: ArchResults):
+    object.__setattr__(self, '_archresult', archresult)
+
+  def __getattr__(self, name):
+    if name.startswith('_'): raise AttributeError(name) # avoid the recursion on `_archresult` during copy or pickle
+    if name in self._inplace_funcs: raise AttributeError('{:} is read-only, please use clone=True to call {:}'.format(self, name))
+    if name == 'all_results':
+      return MappingProxyType({key: ResultsCountView(result) for key, result in self._archresult.all_results.items()})
+    if name == 'dataset_seed':
+      return MappingProxyType({dataset: tuple(seeds) for dataset, seeds in self._archresult.dataset_seed.items()})
+    return getattr(self._archresult, name)
+
+  def __setattr__(self, name, value):
+    raise AttributeError('{:} is read-only, can not set {:}'.format(self, name))
+
+  def query(self, dataset, seed=None):
+    """Return the read-only ResultsCountView (or the dict of them for all seeds) for 'dataset' and 'seed'"""
+    results = self._archresult.query(dataset, seed)
+    if seed is None: return {xseed: ResultsCountView(result) for xseed, result in results.items()}
+    else           : return ResultsCountView(results)
+
+  def copy(self) -> ArchResults:
+    """Return a deep copy of the underlying ArchResults, which can be modified."""
+    return copy.deepcopy( self._archresult )
+
+  def __repr__(self):
+    return ('{name}({arch})'.format(name=self.__class__.__name__, arch=self._archresult))
+
+
 """
 This class (ResultsCount) is used to save the information of one trial for a single architecture.
 I did not write much comment for this class, because it is the lowest-level class in NAS-Bench-201 API, which will be rarely called.
@@ -914,3 +1121,36 @@ class ResultsCount(object):
     x = ResultsCount(None, None, None, None, None, None, None, None, None, None)
     x.load_state_dict(state_dict)
     return x
+
+
+"""
+This class is a read-only proxy of ResultsCount, which is returned by ArchResultsView.query.
+The functions that modify the data in place are disabled, and the dict / list attributes are returned as read-only mappings / tuples.
+"""
+class ResultsCountView(object):
+
+  _inplace_funcs = ('update_train_info', 'reset_pseudo_train_times', 'reset_pseudo_eval_times', 'reset_eval', 'update_latency', 'update_eval', 'update_OLD_eval', 'load_state_dict')
+
+  def __init__(self, result: ResultsCount):
+    object.__setattr__(self, '_result', result)
+
+  def __getattr__(self, name):
+    if name.startswith('_'): raise AttributeError(name) # avoid the recursion on `_result` during copy or pickle
+    if name in self._inplace_funcs: raise AttributeError('{:} is read-only, please use clone=True to call {:}'.format(self, name))
+    value = getattr(self._result, name)
+    if isinstance(value, dict): return MappingProxyType(value)
+    if isinstance(value, list): return tuple(value)
+    return value
+
+  def __setattr__(self, name, value):
+    raise AttributeError('{:} is read-only, can not set {:}'.format(self, name))
+
+  def get_eval_set(self):
+    return tuple(self._result.eval_names)
+
+  def copy(self) -> ResultsCount:
+    """Return a deep copy of the underlying ResultsCount, which can be modified."""
+    return copy.deepcopy( self._result )
+
+  def __repr__(self):
+    return ('{name}({result})'.format(name=self.__class__.__name__, result=self._result))
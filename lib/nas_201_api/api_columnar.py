@@ -0,0 +1,564 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+############################################################################################
+# A memory-mapped columnar backend of NAS-Bench-201.                                       #
+# `convert_to_columnar` dumps all metrics of a NASBench201API into a directory of .npy     #
+# files once, and `NASBench201ColumnarAPI` serves the common queries lazily off these      #
+# arrays, so that its start-up takes less than one second and all processes on a host     #
+# share the same page cache.                                                               #
+############################################################################################
+# The layout of the directory is:
+#   meta.json                                  : the architecture strings, evaluated indexes and the shape of each table
+#   {12epochs,200epochs}/{dataset}/mask.npy    : [arch, seed] bool, whether this trial exists
+#   {12epochs,200epochs}/{dataset}/flops.npy   : [arch, seed] float64 (also params.npy and latency.npy)
+#   {12epochs,200epochs}/{dataset}/{setname}-{loss,accuracy,time}.npy : [arch, seed, epoch] float64, NaN if not available
+#
+import os, json, random, threading, numpy as np
+from pathlib import Path
+from typing import List, Text, Union, Dict
+from collections import defaultdict
+
+from .api import NASBench201API
+from .metric_index import MetricIndex
+from .isomorphism  import IsomorphismIndex
+
+
+COLUMNAR_VERSION = 'v1.0'
+METRIC_NAMES = ('loss', 'accuracy', 'time')
+
+
+def hp2name(use_12epochs_result: bool) -> Text:
+  return '12epochs' if use_12epochs_result else '200epochs'
+
+
+def _mean_or_none(values):
+  values = np.asarray(values, dtype=np.float64)
+  if values.size == 0 or np.isnan(values).any(): return None
+  return float(np.mean(values))
+
+
+def eval_set_names(dataset: Text) -> List:
+  """The (prefix, setname) pairs that `get_more_info` reports for the evaluation sets on `dataset`."""
+  if dataset == 'cifar10-valid' or dataset == 'cifar10':
+    return [('valid', 'x-valid'), ('test', 'ori-test')]
+  else:
+    return [('valid', 'x-valid'), ('test', 'x-test'), ('valtest', 'ori-test')]
+
+
+def build_columns(arch2infos, num_archs: int, dataset: Text):
+  """Collect the results of all architectures on `dataset` into dense arrays.
+     The seed axis follows the sorted union of all seeds, and the missing trials are marked by `mask`.
+     It returns (the dict of arrays, the table information), or (None, None) if no trial is on `dataset`.
+  """
+  seeds, epochs, setnames, config = set(), None, ['train'], None
+  for index, archresult in arch2infos.items():
+    if dataset not in archresult.dataset_seed: continue
+    for seed in archresult.dataset_seed[dataset]:
+      result = archresult.all_results[(dataset, seed)]
+      if epochs is None: epochs, config = result.epochs, result.get_config(None)
+      assert epochs == result.epochs, 'the {:}-th arch is trained by {:} epochs instead of {:} on {:}'.format(index, result.epochs, epochs, dataset)
+      for name in result.get_eval_set():
+        if name not in setnames: setnames.append( name )
+      seeds.add( seed )
+  if epochs is None: return None, None
+  seeds = sorted(list(seeds))
+  seed2index = {seed: i for i, seed in enumerate(seeds)}
+  shape = (num_archs, len(seeds))
+  columns = {'mask'   : np.zeros(shape, dtype=np.bool_),
+             'flops'  : np.full(shape, np.nan),
+             'params' : np.full(shape, np.nan),
+             'latency': np.full(shape, -1.0)}
+  for setname in setnames:
+    for metric in METRIC_NAMES:
+      columns['{:}-{:}'.format(setname, metric)] = np.full(shape + (epochs,), np.nan)
+  for index, archresult in arch2infos.items():
+    if dataset not in archresult.dataset_seed: continue
+    for seed in archresult.dataset_seed[dataset]:
+      result, iseed = archresult.all_results[(dataset, seed)], seed2index[seed]
+      columns['mask'][index, iseed]    = True
+      columns['flops'][index, iseed]   = result.flop
+      columns['params'][index, iseed]  = result.params
+      columns['latency'][index, iseed] = result.get_latency()
+      for iepoch in range(epochs):
+        columns['train-loss'][index, iseed, iepoch]     = result.train_losses[iepoch]
+        columns['train-accuracy'][index, iseed, iepoch] = result.train_acc1es[iepoch]
+        if result.train_times is not None:
+          columns['train-time'][index, iseed, iepoch]   = result.train_times[iepoch]
+        for name in result.get_eval_set():
+          xkey = '{:}@{:}'.format(name, iepoch)
+          if xkey in result.eval_losses: columns['{:}-loss'.format(name)][index, iseed, iepoch] = result.eval_losses[xkey]
+          if xkey in result.eval_acc1es: columns['{:}-accuracy'.format(name)][index, iseed, iepoch] = result.eval_acc1es[xkey]
+          if isinstance(result.eval_times, dict) and xkey in result.eval_times:
+            columns['{:}-time'.format(name)][index, iseed, iepoch] = result.eval_times[xkey]
+  table_info = {'epochs': epochs, 'seeds': seeds, 'setnames': setnames, 'config': config}
+  return columns, table_info
+
+
+def convert_to_columnar(api: NASBench201API, save_dir: Union[Text, Path], verbose: bool=True) -> Path:
+  """Convert the NASBench201API (or the path of a benchmark file) into the columnar format in `save_dir`.
+     The `meta.json` is written at last, so that an interrupted conversion can not be loaded by mistake.
+  """
+  if not isinstance(api, NASBench201API): api = NASBench201API(api, verbose)
+  save_dir = Path(save_dir)
+  save_dir.mkdir(parents=True, exist_ok=True)
+  meta = {'version'          : COLUMNAR_VERSION,
+          'source'           : api.filename,
+          'meta_archs'       : list(api.meta_archs),
+          'evaluated_indexes': [int(x) for x in api.evaluated_indexes],
+          'tables'           : dict()}
+  for use_12epochs_result in (True, False):
+    hpname = hp2name(use_12epochs_result)
+    arch2infos = api.arch2infos_less if use_12epochs_result else api.arch2infos_full
+    datasets = []
+    for archresult in arch2infos.values():
+      datasets += [dataset for dataset in archresult.get_dataset_names() if dataset not in datasets]
+    meta['tables'][hpname] = dict()
+    for dataset in datasets:
+      columns, table_info = build_columns(arch2infos, len(api), dataset)
+      if columns is None: continue
+      xdir = save_dir / hpname / dataset
+      xdir.mkdir(parents=True, exist_ok=True)
+      for key, value in columns.items():
+        np.save(str(xdir / '{:}.npy'.format(key)), value)
+      meta['tables'][hpname][dataset] = table_info
+      if verbose: print('convert {:} on {:} with {:} seeds and {:} epochs into {:}'.format(hpname, dataset, len(table_info['seeds']), table_info['epochs'], xdir))
+  temp_path = save_dir / 'meta.json.tmp'
+  with open(temp_path, 'w') as cfile:
+    json.dump(meta, cfile)
+  os.replace(str(temp_path), str(save_dir / 'meta.json'))
+  return save_dir
+
+
+"""
+This is the columnar version of NASBench201API, which only contains the metrics (no trained weights).
+The query functions keep the same names and return values as those in NASBench201API.
+"""
+class NASBench201ColumnarAPI(object):
+
+  def __init__(self, root: Union[Text, Path], verbose: bool=True):
+    root = Path(root)
+    meta_path = root / 'meta.json'
+    assert meta_path.is_file(), 'invalid columnar directory : {:}'.format(root)
+    if verbose: print('try to create the NAS-Bench-201 columnar api from {:}'.format(root))
+    with open(meta_path, 'r') as cfile:
+      meta = json.load(cfile)
+    self.root     = root
+    self.filename = root.name
+    self.verbose  = verbose
+    self.version  = meta['version']
+    self.meta_archs  = meta['meta_archs']
+    self.tables_info = meta['tables']
+    self.evaluated_indexes = meta['evaluated_indexes']
+    self.archstr2index = {arch: idx for idx, arch in enumerate(self.meta_archs)}
+    xstat = meta_path.stat()
+    self._fingerprint = 'columnar-{:}-{:}'.format(xstat.st_mtime_ns, xstat.st_size)
+    self._columns = dict()
+    self._source  = None
+    self._weights_cache = None
+    self._metric_indexes = dict()
+    self._isomorphism_indexes = dict()
+    self._lock = threading.RLock() # guards the lazy builds, see NASBench201API
+
+  @staticmethod
+  def from_api(api: NASBench201API):
+    """Create the columnar view of a loaded NASBench201API in memory (without any file), where each table is built at its first use."""
+    xapi = NASBench201ColumnarAPI.__new__(NASBench201ColumnarAPI)
+    xapi.root     = None
+    xapi.filename = api.filename
+    xapi.verbose  = api.verbose
+    xapi.version  = COLUMNAR_VERSION
+    xapi.meta_archs  = api.meta_archs
+    xapi.tables_info = dict()
+    for use_12epochs_result in (True, False):
+      arch2infos, datasets = api.arch2infos_less if use_12epochs_result else api.arch2infos_full, []
+      for archresult in arch2infos.values():
+        datasets += [dataset for dataset in archresult.get_dataset_names() if dataset not in datasets]
+      xapi.tables_info[hp2name(use_12epochs_result)] = {dataset: None for dataset in datasets}
+    xapi.evaluated_indexes = sorted(list(api.evaluated_indexes))
+    xapi.archstr2index = api.archstr2index
+    xapi._fingerprint  = api.fingerprint()
+    xapi._columns = dict()
+    xapi._source  = api
+    xapi._weights_cache = None
+    xapi._metric_indexes = dict()
+    xapi._isomorphism_indexes = dict()
+    xapi._lock = threading.RLock()
+    return xapi
+
+  def __getitem__(self, index: int):
+    return self.meta_archs[index]
+
+  def __len__(self):
+    return len(self.meta_archs)
+
+  def __repr__(self):
+    return ('{name}({num}/{total} architectures, root={root})'.format(name=self.__class__.__name__, num=len(self.evaluated_indexes), total=len(self.meta_archs), root=self.root))
+
+  def random(self):
+    """Return a random index of all architectures."""
+    return random.randint(0, len(self.meta_archs)-1)
+
+  def arch(self, index: int):
+    """Return the topology structure of the `index`-th architecture."""
+    assert 0 <= index < len(self.meta_archs), 'invalid index : {:} vs. {:}.'.format(index, len(self.meta_archs))
+    return self.meta_archs[index]
+
+  def query_index_by_arch(self, arch):
+    if isinstance(arch, str): arch_str = arch
+    elif hasattr(arch, 'tostr'): arch_str = arch.tostr()
+    else: return -1
+    return self.archstr2index.get(arch_str, -1)
+
+  index2code = NASBench201API.index2code
+  code2index = NASBench201API.code2index
+  query_index_by_code = NASBench201API.query_index_by_code
+
+  def table_info(self, dataset: Text, use_12epochs_result: bool=False) -> Dict:
+    hpname = hp2name(use_12epochs_result)
+    if dataset not in self.tables_info[hpname]: raise ValueError('can not find {:} in {:} : {:}'.format(dataset, hpname, list(self.tables_info[hpname].keys())))
+    if self.tables_info[hpname][dataset] is None: # build this table from the in-memory NASBench201API
+      with self._lock:
+        if self.tables_info[hpname][dataset] is None:
+          arch2infos = self._source.arch2infos_less if use_12epochs_result else self._source.arch2infos_full
+          columns, table_info = build_columns(arch2infos, len(self), dataset)
+          for key, value in columns.items():
+            value.setflags(write=False)
+            self._columns[(hpname, dataset, key)] = value
+          self.tables_info[hpname][dataset] = table_info
+    return self.tables_info[hpname][dataset]
+
+  def column(self, dataset: Text, key: Text, use_12epochs_result: bool=False) -> np.ndarray:
+    """Return the read-only memory-mapped array of `key` (e.g., mask, flops, x-valid-accuracy) on `dataset`."""
+    hpname = hp2name(use_12epochs_result)
+    ckey = (hpname, dataset, key)
+    if ckey not in self._columns:
+      self.table_info(dataset, use_12epochs_result)
+      if ckey in self._columns: return self._columns[ckey]
+      if self.root is None: raise ValueError('can not find {:} for {:} in {:}'.format(key, dataset, hpname))
+      xpath = self.root / hpname / dataset / '{:}.npy'.format(key)
+      if not xpath.is_file(): raise ValueError('can not find {:} for {:} in {:}'.format(key, dataset, hpname))
+      self._columns[ckey] = np.load(str(xpath), mmap_mode='r')
+    return self._columns[ckey]
+
+  def get_dataset_seeds(self, index: int, dataset: Text, use_12epochs_result: bool=False) -> tuple:
+    seeds = self.table_info(dataset, use_12epochs_result)['seeds']
+    iseeds = np.flatnonzero(self.column(dataset, 'mask', use_12epochs_result)[index])
+    return tuple(seeds[i] for i in iseeds)
+
+  def _select_seeds(self, index: int, dataset: Text, is_random, use_12epochs_result: bool):
+    """Return the positions along the seed axis w.r.t. `is_random`, the same as `ArchResults.get_metrics`."""
+    iseeds = np.flatnonzero(self.column(dataset, 'mask', use_12epochs_result)[index])
+    if len(iseeds) == 0: raise ValueError('the {:}-th architecture is not evaluated on {:}'.format(index, dataset))
+    if isinstance(is_random, bool) and is_random: # randomly select one
+      index = random.randint(0, len(iseeds)-1)
+      return iseeds[index:index+1]
+    elif isinstance(is_random, bool) and not is_random: # average
+      return iseeds
+    elif isinstance(is_random, int): # specify the seed
+      x_seeds = self.get_dataset_seeds(index, dataset, use_12epochs_result)
+      if is_random not in x_seeds: raise ValueError('can not find random seed ({:}) from {:}'.format(is_random, x_seeds))
+      index = x_seeds.index(is_random)
+      return iseeds[index:index+1]
+    else:
+      raise ValueError('invalid value for is_random: {:}'.format(is_random))
+
+  def get_metrics(self, index: int, dataset: Text, setname: Text, iepoch=None, is_random=False, use_12epochs_result: bool=False) -> Dict:
+    """The same as `ArchResults.get_metrics` of the `index`-th architecture."""
+    info = self.table_info(dataset, use_12epochs_result)
+    if setname not in info['setnames']: raise ValueError('invalid setname {:} for {:} : {:}'.format(setname, dataset, info['setnames']))
+    iepoch = self._check_iepoch(dataset, iepoch, use_12epochs_result)
+    iseeds = self._select_seeds(index, dataset, is_random, use_12epochs_result)
+    losses = self.column(dataset, '{:}-loss'.format(setname), use_12epochs_result)[index, iseeds, iepoch]
+    accs   = self.column(dataset, '{:}-accuracy'.format(setname), use_12epochs_result)[index, iseeds, iepoch]
+    times  = self.column(dataset, '{:}-time'.format(setname), use_12epochs_result)[index, iseeds, :iepoch+1]
+    loss, accuracy = _mean_or_none(losses), _mean_or_none(accs)
+    if loss is None or accuracy is None: raise ValueError('{:} of the {:}-th arch on {:} is not avaliable'.format(setname, index, dataset))
+    return {'iepoch'  : iepoch,
+            'loss'    : loss,
+            'accuracy': accuracy,
+            'cur_time': _mean_or_none(times[:, -1]),
+            'all_time': _mean_or_none(times.sum(axis=-1))}
+
+  def get_compute_costs(self, index: int, dataset: Text, use_12epochs_result: bool=False) -> Dict:
+    """The same as `ArchResults.get_compute_costs` of the `index`-th architecture."""
+    info   = self.table_info(dataset, use_12epochs_result)
+    iseeds = self._select_seeds(index, dataset, False, use_12epochs_result)
+    latencies = self.column(dataset, 'latency', use_12epochs_result)[index, iseeds]
+    latencies = latencies[latencies > 0]
+    xinfo = {'flops'  : float(np.mean(self.column(dataset, 'flops', use_12epochs_result)[index, iseeds])),
+             'params' : float(np.mean(self.column(dataset, 'params', use_12epochs_result)[index, iseeds])),
+             'latency': float(np.mean(latencies)) if len(latencies) > 0 else None}
+    for setname in info['setnames']:
+      times = self.column(dataset, '{:}-time'.format(setname), use_12epochs_result)[index, iseeds]
+      xinfo['T-{:}@epoch'.format(setname)] = _mean_or_none(times.mean(axis=-1))
+      xinfo['T-{:}@total'.format(setname)] = _mean_or_none(times.sum(axis=-1))
+    return xinfo
+
+  def get_cost_info(self, index: int, dataset: Text, use_12epochs_result: bool = False) -> Dict[Text, float]:
+    """To obtain the cost metric for the `index`-th architecture on a dataset."""
+    return self.get_compute_costs(index, dataset, use_12epochs_result)
+
+  def get_latency(self, index: int, dataset: Text, use_12epochs_result: bool = False) -> float:
+    return self.get_cost_info(index, dataset, use_12epochs_result)['latency']
+
+  def enable_lazy_weights(self, archive_root: Union[Text, Path], max_bytes: int = 4 * 1024**3):
+    """The columnar format has no weights, this makes `get_net_param` load them from 'archive_root' via an LRU cache of at most 'max_bytes' bytes."""
+    from .weights_cache import WeightsLRUCache
+    self._weights_cache = WeightsLRUCache(archive_root, max_bytes)
+    return self._weights_cache
+
+  def get_net_param(self, index: int, dataset: Text, seed, use_12epochs_result: bool=False):
+    """The same as `NASBench201API.get_net_param`, please call `enable_lazy_weights` at first."""
+    if self._weights_cache is None: raise ValueError('the columnar api has no weights, please call enable_lazy_weights at first')
+    return self._weights_cache.get_net_param(index, dataset, seed, use_12epochs_result)
+
+  def get_net_config(self, index: int, dataset: Text):
+    config = dict(self.table_info(dataset, False)['config'])
+    config['arch_str'] = self.meta_archs[index]
+    return config
+
+  def get_more_info(self, index: int, dataset, iepoch=None, use_12epochs_result=False, is_random=True):
+    """The same as `NASBench201API.get_more_info`."""
+    if isinstance(is_random, np.random.RandomState):
+      seeds = self.get_dataset_seeds(index, dataset, use_12epochs_result)
+      is_random = seeds[is_random.randint(len(seeds))]
+    elif isinstance(is_random, bool) and is_random:
+      seeds = self.get_dataset_seeds(index, dataset, use_12epochs_result)
+      is_random = random.choice(seeds)
+    setnames = self.table_info(dataset, use_12epochs_result)['setnames']
+    def get_metrics(setname):
+      if setname not in setnames: return None
+      try:
+        return self.get_metrics(index, dataset, setname, iepoch, is_random, use_12epochs_result)
+      except ValueError:
+        return None
+    train_info = self.get_metrics(index, dataset, 'train', iepoch, is_random, use_12epochs_result)
+    total = train_info['iepoch'] + 1
+    xinfo = {'train-loss'    : train_info['loss'],
+             'train-accuracy': train_info['accuracy'],
+             'train-per-time': train_info['all_time'] / total if train_info['all_time'] is not None else None,
+             'train-all-time': train_info['all_time']}
+    for prefix, setname in eval_set_names(dataset):
+      info = get_metrics(setname)
+      if info is None: continue
+      xinfo['{:}-loss'.format(prefix)]     = info['loss']
+      xinfo['{:}-accuracy'.format(prefix)] = info['accuracy']
+      xinfo['{:}-per-time'.format(prefix)] = info['all_time'] / total if info['all_time'] is not None else None
+      xinfo['{:}-all-time'.format(prefix)] = info['all_time']
+    return xinfo
+
+  def _batch_weights(self, indexes: np.ndarray, dataset: Text, is_random, use_12epochs_result: bool) -> np.ndarray:
+    """The vectorized `_select_seeds`, which returns the [len(indexes), seed] weights to reduce the seed axis.
+       Note that is_random=True draws one trial for each architecture by the global RNG of numpy, and is_random=np.random.RandomState(...) draws them by the given RNG.
+    """
+    mask   = np.asarray(self.column(dataset, 'mask', use_12epochs_result)[indexes])
+    counts = mask.sum(axis=-1)
+    if (counts == 0).any(): raise ValueError('the {:}-th architecture is not evaluated on {:}'.format(indexes[np.argmin(counts)], dataset))
+    if isinstance(is_random, np.random.RandomState) or (isinstance(is_random, bool) and is_random): # randomly select one
+      rng = is_random if isinstance(is_random, np.random.RandomState) else np.random
+      choices = np.minimum((rng.random_sample(len(indexes)) * counts).astype(np.int64), counts - 1)
+      return (mask & (np.cumsum(mask, axis=-1) == choices[:, None] + 1)).astype(np.float64)
+    elif isinstance(is_random, bool) and not is_random: # average
+      return mask / counts[:, None]
+    elif isinstance(is_random, int): # specify the seed
+      seeds = self.table_info(dataset, use_12epochs_result)['seeds']
+      if is_random not in seeds or not mask[:, seeds.index(is_random)].all(): raise ValueError('can not find random seed ({:}) for all architectures'.format(is_random))
+      weights = np.zeros(mask.shape)
+      weights[:, seeds.index(is_random)] = 1
+      return weights
+    else:
+      raise ValueError('invalid value for is_random: {:}'.format(is_random))
+
+  @staticmethod
+  def _reduce_seeds(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # the selected NaN values are kept, while the unselected ones are ignored
+    return (np.where(weights > 0, values, 0) * weights).sum(axis=-1)
+
+  def _batch_times(self, indexes: np.ndarray, dataset: Text, setname: Text, iepoch: int, weights: np.ndarray, use_12epochs_result: bool):
+    times = self.column(dataset, '{:}-time'.format(setname), use_12epochs_result)[indexes, :, :iepoch+1]
+    return self._reduce_seeds(times[:, :, -1], weights), self._reduce_seeds(times.sum(axis=-1), weights)
+
+  def _check_iepoch(self, dataset: Text, iepoch, use_12epochs_result: bool) -> int:
+    epochs = self.table_info(dataset, use_12epochs_result)['epochs']
+    if iepoch is None: iepoch = epochs-1
+    assert 0 <= iepoch < epochs, 'invalid iepoch={:} < {:}'.format(iepoch, epochs)
+    return iepoch
+
+  def cumulative_time(self, dataset: Text, setname: Text, use_12epochs_result: bool=False) -> np.ndarray:
+    """Return the read-only [arch, seed, epoch] array of the total time cost of the first epoch+1 epochs on `setname`, which is computed once and cached."""
+    ckey = (hp2name(use_12epochs_result), dataset, '{:}-cumulative-time'.format(setname))
+    if ckey not in self._columns:
+      with self._lock:
+        if ckey not in self._columns:
+          xtimes = np.cumsum(self.column(dataset, '{:}-time'.format(setname), use_12epochs_result), axis=-1)
+          xtimes.setflags(write=False)
+          self._columns[ckey] = xtimes
+    return self._columns[ckey]
+
+  def get_learning_curves(self, dataset: Text, setname: Text, use_12epochs_result: bool=False) -> Dict[Text, np.ndarray]:
+    """Return the learning curves of all architectures on `setname` of `dataset`, i.e., the read-only [arch, seed, epoch] arrays of
+       loss, accuracy, time (of each epoch) and cumulative-time, with mask [arch, seed] of the available trials and the seeds of the seed axis.
+       The metrics of any budget (e.g., curves['accuracy'][indexes, :, budget-1]) can be obtained by slicing, and the missing values are NaN.
+    """
+    if setname not in self.table_info(dataset, use_12epochs_result)['setnames']: raise ValueError('invalid setname {:} for {:}'.format(setname, dataset))
+    return {'loss'           : self.column(dataset, '{:}-loss'.format(setname), use_12epochs_result),
+            'accuracy'       : self.column(dataset, '{:}-accuracy'.format(setname), use_12epochs_result),
+            'time'           : self.column(dataset, '{:}-time'.format(setname), use_12epochs_result),
+            'cumulative-time': self.cumulative_time(dataset, setname, use_12epochs_result),
+            'mask'           : self.column(dataset, 'mask', use_12epochs_result),
+            'seeds'          : np.array(self.table_info(dataset, use_12epochs_result)['seeds'])}
+
+  def get_times_batch(self, indexes, dataset: Text, setname: Text, iepoch=None, is_random=False, use_12epochs_result: bool=False):
+    """Return two arrays of the time cost of the `iepoch`-th epoch and the total time cost of the first `iepoch`+1 epochs on `setname` for each architecture in `indexes`."""
+    indexes = np.asarray(indexes, dtype=np.int64).reshape(-1)
+    if setname not in self.table_info(dataset, use_12epochs_result)['setnames']: raise ValueError('invalid setname {:} for {:}'.format(setname, dataset))
+    iepoch  = self._check_iepoch(dataset, iepoch, use_12epochs_result)
+    weights = self._batch_weights(indexes, dataset, is_random, use_12epochs_result)
+    return self._batch_times(indexes, dataset, setname, iepoch, weights, use_12epochs_result)
+
+  def get_more_info_batch(self, indexes, dataset, iepoch=None, use_12epochs_result=False, is_random=True) -> Dict[Text, np.ndarray]:
+    """The batched version of `get_more_info`, where each value is an array with one entry for each architecture in `indexes`.
+       All sets of an architecture use the same trial, and the metrics that are not available are NaN.
+    """
+    indexes  = np.asarray(indexes, dtype=np.int64).reshape(-1)
+    setnames = self.table_info(dataset, use_12epochs_result)['setnames']
+    iepoch   = self._check_iepoch(dataset, iepoch, use_12epochs_result)
+    weights  = self._batch_weights(indexes, dataset, is_random, use_12epochs_result)
+    total, xinfo = iepoch + 1, dict()
+    for prefix, setname in [('train', 'train')] + eval_set_names(dataset):
+      if setname not in setnames: continue
+      losses = self.column(dataset, '{:}-loss'.format(setname), use_12epochs_result)[indexes, :, iepoch]
+      accs   = self.column(dataset, '{:}-accuracy'.format(setname), use_12epochs_result)[indexes, :, iepoch]
+      _, all_times = self._batch_times(indexes, dataset, setname, iepoch, weights, use_12epochs_result)
+      xinfo['{:}-loss'.format(prefix)]     = self._reduce_seeds(losses, weights)
+      xinfo['{:}-accuracy'.format(prefix)] = self._reduce_seeds(accs, weights)
+      xinfo['{:}-per-time'.format(prefix)] = all_times / total
+      xinfo['{:}-all-time'.format(prefix)] = all_times
+    return xinfo
+
+  def _mean_over_seeds(self, dataset: Text, key: Text, indexes: np.ndarray, use_12epochs_result: bool, iepoch=None) -> np.ndarray:
+    mask = np.asarray(self.column(dataset, 'mask', use_12epochs_result)[indexes])
+    data = self.column(dataset, key, use_12epochs_result)
+    if data.ndim == 3: data = data[indexes, :, -1 if iepoch is None else iepoch]
+    else             : data = data[indexes]
+    data = np.where(mask, data, 0)
+    return data.sum(axis=-1) / np.maximum(mask.sum(axis=-1), 1)
+
+  def fingerprint(self) -> Union[None, Text]:
+    """The fingerprint of the results (see `NASBench201API.fingerprint`), where that of a columnar directory is the mtime and size of its meta.json."""
+    return self._fingerprint
+
+  def metric_index_dir(self) -> Union[None, Path]:
+    """The directory to save the metric indexes, i.e., `{root}/metric-index` or `{benchmark-file-without-.pth}-index`."""
+    if self.root is not None: return self.root / 'metric-index'
+    elif self._source.file_path is not None:
+      xpath = Path(self._source.file_path)
+      return xpath.parent / '{:}-index'.format(xpath.stem)
+    else: return None
+
+  def get_metric_index(self, dataset: Text, metric_on_set: Text, iepoch=None, use_12epochs_result: bool=False) -> MetricIndex:
+    """Return the MetricIndex of the `metric_on_set` accuracy (averaged over all trials), which is loaded from `metric_index_dir` or built once.
+       The saved index is only used if its fingerprint is the same as that of the results, otherwise it is rebuilt and overwritten.
+    """
+    key = (hp2name(use_12epochs_result), dataset, metric_on_set, iepoch)
+    with self._lock:
+      if key in self._metric_indexes: return self._metric_indexes[key]
+      xdir = self.metric_index_dir() if self.fingerprint() is not None else None
+      xpath = xdir / '{:}-{:}-{:}-{:}.npz'.format(key[0], dataset, metric_on_set, 'last' if iepoch is None else iepoch) if xdir is not None else None
+      index = None
+      if xpath is not None and xpath.is_file():
+        index = MetricIndex.load(xpath)
+        if index.meta.get('fingerprint') != self.fingerprint(): index = None
+      if index is None:
+        index = MetricIndex.build(self, dataset, metric_on_set, iepoch, use_12epochs_result)
+        if xpath is not None:
+          try:
+            index.save(xpath)
+          except OSError as e:
+            if self.verbose: print('can not save the metric index into {:} : {:}'.format(xpath, e))
+      self._metric_indexes[key] = index
+      return index
+
+  def get_isomorphism_index(self, consider_zero=True) -> IsomorphismIndex:
+    """Return the IsomorphismIndex of all architectures (see `isomorphism.to_unique_str` for `consider_zero`), which is loaded from `metric_index_dir` or built once."""
+    with self._lock:
+      if consider_zero in self._isomorphism_indexes: return self._isomorphism_indexes[consider_zero]
+      xdir = self.metric_index_dir()
+      xpath = xdir / 'isomorphism-{:}.npz'.format(consider_zero) if xdir is not None else None
+      index = None
+      if xpath is not None and xpath.is_file():
+        index = IsomorphismIndex.load(xpath)
+        if index.meta['consider_zero'] != consider_zero or index.meta['num_archs'] != len(self.meta_archs): index = None
+      if index is None:
+        index = IsomorphismIndex.build(self.meta_archs, consider_zero, self.filename)
+        if xpath is not None:
+          try:
+            index.save(xpath)
+          except OSError as e:
+            if self.verbose: print('can not save the isomorphism index into {:} : {:}'.format(xpath, e))
+      self._isomorphism_indexes[consider_zero] = index
+      return index
+
+  def find_best(self, dataset, metric_on_set, FLOP_max=None, Param_max=None, use_12epochs_result=False):
+    """Find the architecture with the highest accuracy based on some constraints."""
+    return self.get_metric_index(dataset, metric_on_set, None, use_12epochs_result).find_best(FLOP_max, Param_max)
+
+  def query_by_arch(self, arch, use_12epochs_result=False):
+    if isinstance(arch, int): arch_index = arch
+    else                    : arch_index = self.query_index_by_arch(arch)
+    if arch_index == -1: return None
+    if not (0 <= arch_index < len(self.meta_archs)) or not self._is_evaluated(arch_index, use_12epochs_result):
+      print ('Find this arch-index : {:}, but this arch is not evaluated.'.format(arch_index))
+      return None
+    strings = self.print_information(arch_index, use_12epochs_result, 'arch-index={:}'.format(arch_index))
+    return '\n'.join(strings)
+
+  def _is_evaluated(self, index: int, use_12epochs_result: bool) -> bool:
+    for dataset in self.tables_info[hp2name(use_12epochs_result)].keys():
+      if self.column(dataset, 'mask', use_12epochs_result)[index].any(): return True
+    return False
+
+  def print_information(self, index: int, use_12epochs_result: bool=False, extra_info=None, show=False):
+    """The same as `print_information` in api.py but based on the columnar arrays."""
+    dataset_names = [dataset for dataset in self.tables_info[hp2name(use_12epochs_result)].keys()
+                       if self.column(dataset, 'mask', use_12epochs_result)[index].any()]
+    strings = [self.meta_archs[index], 'datasets : {:}, extra-info : {:}'.format(dataset_names, extra_info)]
+    def metric2str(info):
+      return 'loss = {:.3f}, top1 = {:.2f}%'.format(info['loss'], info['accuracy'])
+    for dataset in dataset_names:
+      metric = self.get_compute_costs(index, dataset, use_12epochs_result)
+      flop, param, latency = metric['flops'], metric['params'], metric['latency']
+      str1 = '{:14s} FLOP={:6.2f} M, Params={:.3f} MB, latency={:} ms.'.format(dataset, flop, param, '{:.2f}'.format(latency*1000) if latency is not None and latency > 0 else None)
+      train_info = self.get_metrics(index, dataset, 'train', None, False, use_12epochs_result)
+      if dataset == 'cifar10-valid':
+        valid_info = self.get_metrics(index, dataset, 'x-valid', None, False, use_12epochs_result)
+        str2 = '{:14s} train : [{:}], valid : [{:}]'.format(dataset, metric2str(train_info), metric2str(valid_info))
+      elif dataset == 'cifar10':
+        test__info = self.get_metrics(index, dataset, 'ori-test', None, False, use_12epochs_result)
+        str2 = '{:14s} train : [{:}], test  : [{:}]'.format(dataset, metric2str(train_info), metric2str(test__info))
+      else:
+        valid_info = self.get_metrics(index, dataset, 'x-valid', None, False, use_12epochs_result)
+        test__info = self.get_metrics(index, dataset, 'x-test', None, False, use_12epochs_result)
+        str2 = '{:14s} train : [{:}], valid : [{:}], test : [{:}]'.format(dataset, metric2str(train_info), metric2str(valid_info), metric2str(test__info))
+      strings += [str1, str2]
+    if show: print('\n'.join(strings))
+    return strings
+
+  def show(self, index: int) -> None:
+    for use_12epochs_result in (False, True):
+      strings = self.print_information(index, use_12epochs_result)
+      print('>' * 40 + ' {:} '.format(hp2name(use_12epochs_result)) + '>' * 40)
+      print('\n'.join(strings))
+
+  def statistics(self, dataset: Text, use_12epochs_result: bool) -> Dict[int, int]:
+    """This function will count the number of total trials."""
+    nums = defaultdict(lambda: 0)
+    if dataset not in self.tables_info[hp2name(use_12epochs_result)]:
+      nums[0] = len(self)
+    else:
+      for num, count in zip(*np.unique(self.column(dataset, 'mask', use_12epochs_result).sum(axis=-1), return_counts=True)):
+        nums[int(num)] += int(count)
+    return dict(nums)
+
+  str2lists  = staticmethod(NASBench201API.str2lists)
+  str2matrix = staticmethod(NASBench201API.str2matrix)
@@ -0,0 +1,104 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+############################################################################################
+# The isomorphism classes of the NAS-Bench-201 architectures, where two architectures are #
+# in the same class if they have the same unique string (see to_unique_str).              #
+# It maps an architecture index to its class id and a class id to its member indexes.    #
+############################################################################################
+import os, json, numpy as np
+from pathlib import Path
+from typing import Text, Union, Dict, List
+from .api import NASBench201API
+
+
+def to_unique_str(arch_str: Text, consider_zero=False) -> Text:
+  # the same as Structure.to_unique_str (lib/models/cell_searchs/genotypes.py) of the architecture string, which is used to identify the isomorphic cell
+  # with the prior knowledge of two special operations, i.e., none and skip_connect
+  nodes = {0: '0'}
+  for i_node, node_info in enumerate(NASBench201API.str2lists(arch_str)):
+    cur_node = []
+    for op, xin in node_info:
+      if consider_zero is None:
+        x = '('+nodes[xin]+')' + '@{:}'.format(op)
+      elif consider_zero:
+        if op == 'none' or nodes[xin] == '#': x = '#' # zero
+        elif op == 'skip_connect': x = nodes[xin]
+        else: x = '('+nodes[xin]+')' + '@{:}'.format(op)
+      else:
+        if op == 'skip_connect': x = nodes[xin]
+        else: x = '('+nodes[xin]+')' + '@{:}'.format(op)
+      cur_node.append(x)
+    nodes[i_node+1] = '+'.join( sorted(cur_node) )
+  return nodes[ len(nodes)-1 ]
+
+
+class IsomorphismIndex(object):
+
+  def __init__(self, class_ids: np.ndarray, meta: Dict):
+    # the class ids are numbered by the first member, so the smaller class id has the smaller representative
+    self.class_ids = np.asarray(class_ids, dtype=np.int64)
+    self.meta      = meta
+    self.order     = np.argsort(self.class_ids, kind='stable') # the member indexes grouped by class, ascending in each class
+    counts         = np.bincount(self.class_ids) if len(self.class_ids) > 0 else np.zeros(0, dtype=np.int64)
+    self.offsets   = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+  def __len__(self):
+    return len(self.class_ids)
+
+  def __repr__(self):
+    return ('{name}({num} architectures, {num_classes} classes, {meta})'.format(name=self.__class__.__name__, num=len(self), num_classes=self.num_classes, meta=self.meta))
+
+  @property
+  def num_classes(self) -> int:
+    return len(self.offsets) - 1
+
+  @staticmethod
+  def build(meta_archs: List[Text], consider_zero=True, source=None):
+    """Hash the unique string of every architecture once, i.e., linear in the number of architectures."""
+    unique2class, class_ids = dict(), []
+    for arch_str in meta_archs:
+      xstr = to_unique_str(arch_str, consider_zero)
+      if xstr not in unique2class: unique2class[xstr] = len(unique2class)
+      class_ids.append( unique2class[xstr] )
+    meta = {'source'       : source,
+            'consider_zero': consider_zero,
+            'num_archs'    : len(meta_archs)}
+    return IsomorphismIndex(np.array(class_ids, dtype=np.int64), meta)
+
+  def save(self, path: Union[Text, Path]) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.parent / '{:}.{:}.tmp.npz'.format(path.name, os.getpid())
+    np.savez(str(temp_path), class_ids=self.class_ids, meta=np.array(json.dumps(self.meta)))
+    os.replace(str(temp_path), str(path))
+
+  @staticmethod
+  def load(path: Union[Text, Path]):
+    with np.load(str(path)) as data:
+      return IsomorphismIndex(data['class_ids'], json.loads(str(data['meta'])))
+
+  def class_of(self, index: int) -> int:
+    return int(self.class_ids[index])
+
+  def members(self, class_id: int) -> np.ndarray:
+    """Return the architecture indexes (ascending) in the `class_id`-th class."""
+    assert 0 <= class_id < self.num_classes, 'invalid class id : {:} vs. {:}'.format(class_id, self.num_classes)
+    return self.order[self.offsets[class_id]:self.offsets[class_id+1]]
+
+  def equivalents(self, index: int) -> np.ndarray:
+    """Return the indexes of all architectures that are isomorphic to the `index`-th architecture (including itself)."""
+    return self.members( self.class_of(index) )
+
+  def representative(self, index: int) -> int:
+    """Return the smallest index in the class of the `index`-th architecture."""
+    return int(self.order[self.offsets[self.class_of(index)]])
+
+  def representatives(self) -> np.ndarray:
+    """Return the smallest index of each class, which is ascending."""
+    return self.order[self.offsets[:-1]]
+
+  def unique(self, indexes) -> np.ndarray:
+    """Return the first index of each class in `indexes`, following the order of `indexes`."""
+    indexes = np.asarray(indexes, dtype=np.int64).reshape(-1)
+    _, first = np.unique(self.class_ids[indexes], return_index=True)
+    return indexes[np.sort(first)]
@@ -0,0 +1,113 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+############################################################################################
+# The sorted index of one metric (e.g., the ori-test accuracy on CIFAR-100 after 200      #
+# epochs) over all architectures, with FLOPs and Params as the secondary keys. It answers #
+# find_best, top-K and random-K queries with constraints, and is saved as a .npz file.     #
+############################################################################################
+import os, json, numpy as np
+from pathlib import Path
+from typing import Text, Union, Dict
+
+
+class MetricIndex(object):
+
+  def __init__(self, indexes: np.ndarray, accuracies: np.ndarray, flops: np.ndarray, params: np.ndarray, meta: Dict):
+    # sort by the accuracy in descending order, where the smaller index is in front for the same accuracy
+    order = np.lexsort((indexes, -accuracies))
+    self.indexes    = np.asarray(indexes)[order]
+    self.accuracies = np.asarray(accuracies)[order]
+    self.flops      = np.asarray(flops)[order]
+    self.params     = np.asarray(params)[order]
+    self.meta       = meta
+    # the prefix minimum is non-increasing, so we can binary search the first position that may satisfy a constraint
+    self._neg_min_flops  = -np.minimum.accumulate(self.flops)  if len(self) > 0 else self.flops
+    self._neg_min_params = -np.minimum.accumulate(self.params) if len(self) > 0 else self.params
+
+  def __len__(self):
+    return len(self.indexes)
+
+  def __repr__(self):
+    return ('{name}({num} architectures, {meta})'.format(name=self.__class__.__name__, num=len(self), meta=self.meta))
+
+  @staticmethod
+  def build(api, dataset: Text, metric_on_set: Text, iepoch=None, use_12epochs_result: bool=False):
+    """Build the index from a NASBench201ColumnarAPI, where the metrics are averaged over all trials."""
+    info = api.table_info(dataset, use_12epochs_result)
+    if metric_on_set not in info['setnames']: raise ValueError('invalid setname {:} for {:} : {:}'.format(metric_on_set, dataset, info['setnames']))
+    indexes = np.array(api.evaluated_indexes, dtype=np.int64)
+    indexes = indexes[ np.asarray(api.column(dataset, 'mask', use_12epochs_result)[indexes]).any(axis=-1) ]
+    accuracies = api._mean_over_seeds(dataset, '{:}-accuracy'.format(metric_on_set), indexes, use_12epochs_result, iepoch)
+    flops      = api._mean_over_seeds(dataset, 'flops' , indexes, use_12epochs_result)
+    params     = api._mean_over_seeds(dataset, 'params', indexes, use_12epochs_result)
+    valid      = ~np.isnan(accuracies)
+    meta = {'source'      : api.filename,
+            'dataset'     : dataset,
+            'setname'     : metric_on_set,
+            'iepoch'      : iepoch,
+            'epochs'      : '12epochs' if use_12epochs_result else '200epochs',
+            'num_archs'   : len(api.evaluated_indexes),
+            'fingerprint' : api.fingerprint()}
+    return MetricIndex(indexes[valid], accuracies[valid], flops[valid], params[valid], meta)
+
+  def save(self, path: Union[Text, Path]) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.parent / '{:}.{:}.tmp.npz'.format(path.name, os.getpid())
+    np.savez(str(temp_path), indexes=self.indexes, accuracies=self.accuracies, flops=self.flops, params=self.params, meta=np.array(json.dumps(self.meta)))
+    os.replace(str(temp_path), str(path))
+
+  @staticmethod
+  def load(path: Union[Text, Path]):
+    with np.load(str(path)) as data:
+      return MetricIndex(data['indexes'], data['accuracies'], data['flops'], data['params'], json.loads(str(data['meta'])))
+
+  def _lower_bound(self, FLOP_max, Param_max) -> int:
+    start = 0
+    if FLOP_max  is not None: start = max(start, int(np.searchsorted(self._neg_min_flops , -FLOP_max , side='left')))
+    if Param_max is not None: start = max(start, int(np.searchsorted(self._neg_min_params, -Param_max, side='left')))
+    return start
+
+  def _valid(self, start: int, end: int, FLOP_max, Param_max) -> np.ndarray:
+    valid = np.ones(end - start, dtype=np.bool_)
+    if FLOP_max  is not None: valid &= self.flops[start:end] <= FLOP_max
+    if Param_max is not None: valid &= self.params[start:end] <= Param_max
+    return valid
+
+  def select(self, k=None, FLOP_max=None, Param_max=None) -> np.ndarray:
+    """Return the positions (sorted by the accuracy) of the first `k` (or all if k is None) architectures satisfying the constraints."""
+    if k is None: k = len(self)
+    start, chunk, positions = self._lower_bound(FLOP_max, Param_max), max(k, 64), []
+    while start < len(self) and k > 0:
+      end = min(len(self), start + chunk)
+      xpositions = np.flatnonzero(self._valid(start, end, FLOP_max, Param_max))[:k] + start
+      positions.append( xpositions )
+      start, chunk, k = end, chunk * 2, k - len(xpositions)
+    return np.concatenate(positions) if len(positions) > 0 else np.zeros(0, dtype=np.int64)
+
+  def find_best(self, FLOP_max=None, Param_max=None):
+    """The same as `NASBench201API.find_best`, which returns (the index, the accuracy) or (-1, None)."""
+    positions = self.select(1, FLOP_max, Param_max)
+    if len(positions) == 0: return -1, None
+    return int(self.indexes[positions[0]]), float(self.accuracies[positions[0]])
+
+  def topk(self, k: int, FLOP_max=None, Param_max=None):
+    """Return the indexes and accuracies of the top-k architectures satisfying the constraints."""
+    positions = self.select(k, FLOP_max, Param_max)
+    return self.indexes[positions], self.accuracies[positions]
+
+  def random_k(self, k: int, FLOP_max=None, Param_max=None, rng=None):
+    """Return the indexes and accuracies of k random architectures satisfying the constraints, sorted by the accuracy."""
+    if rng is None: rng = np.random
+    if FLOP_max is None and Param_max is None: positions = np.arange(len(self))
+    else: positions = self.select(None, FLOP_max, Param_max)
+    assert 0 <= k <= len(positions), 'invalid k={:} vs. {:} candidates'.format(k, len(positions))
+    positions = np.sort(rng.choice(positions, k, replace=False))
+    return self.indexes[positions], self.accuracies[positions]
+
+  def to_dict(self, positions: np.ndarray, meta_archs) -> Dict:
+    """Return {arch-index: {arch_str, accuracy, flop, param}} of the `positions`, which is the format of `list_arch` in ranking.py."""
+    return {int(self.indexes[i]): {'arch_str': meta_archs[self.indexes[i]],
+                                   'accuracy': float(self.accuracies[i]),
+                                   'flop'    : float(self.flops[i]),
+                                   'param'   : float(self.params[i])} for i in positions}
@@ -0,0 +1,229 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+############################################################################################
+# An appendable on-disk store of the NAS-Bench-201 results, where the results are written #
+# as small segment files and each segment is committed by one line of the journal:        #
+#   {root}/meta.json, {root}/journal.jsonl, {root}/segments/*.pth                           #
+# A `results` segment overwrites the results of the same architecture in the earlier ones,#
+# and an `updates` segment records the small changes (a new seed, a latency, ...) applied #
+# to the current results. `compact` folds all segments into new `results` segments.       #
+############################################################################################
+import os, json, uuid, fcntl, hashlib, threading, torch
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Text, Union, Dict, List, Tuple
+from collections import defaultdict
+
+from .api import ArchResults, ResultsCount
+
+
+STORE_VERSION = 'v1'
+
+
+# an update is (arch-index, use_12epochs_result, op, args), where op and args are one of
+#   'result'      : (dataset, seed, ResultsCount.state_dict()), add (or overwrite) the result of one trial
+#   'latency'     : (dataset, seed or None, latency)
+#   'train-times' : (dataset, seed or None, estimated_per_epoch_time)
+#   'eval-times'  : (dataset, seed or None, eval_name, estimated_per_epoch_time)
+UPDATE_OPS = ('result', 'latency', 'train-times', 'eval-times')
+
+
+def apply_update(arch_results: ArchResults, op: Text, args: Tuple) -> None:
+  if op == 'result':
+    dataset, seed, state_dict = args
+    if seed in arch_results.dataset_seed.get(dataset, []):
+      arch_results.dataset_seed[dataset].remove(seed)
+      del arch_results.all_results[(dataset, seed)]
+    arch_results.update(dataset, seed, ResultsCount.create_from_state_dict(state_dict))
+  elif op == 'latency'    : arch_results.reset_latency(*args)
+  elif op == 'train-times': arch_results.reset_pseudo_train_times(*args)
+  elif op == 'eval-times' : arch_results.reset_pseudo_eval_times(*args)
+  else: raise ValueError('invalid update op : {:}'.format(op))
+
+
+# the fingerprint of the journal, which is chained over the names of the committed segments
+# so that the in-memory results of a NASBench201API can follow its own appends (see `NASBench201API.fingerprint`)
+def chain_fingerprint(fingerprint: Text, record: Dict) -> Text:
+  return hashlib.sha1('{:}/{:}'.format(fingerprint, record['segment']).encode('utf-8')).hexdigest()
+
+
+class ResultsStore(object):
+
+  def __init__(self, root: Union[Text, Path], meta_archs: List[Text]=None):
+    """Open the store in `root`, or create it if `meta_archs` is given and the store does not exist."""
+    self.root = Path(root)
+    self.meta_path    = self.root / 'meta.json'
+    self.journal_path = self.root / 'journal.jsonl'
+    self.segment_dir  = self.root / 'segments'
+    self.lock_path    = self.root / 'journal.lock'
+    self.compact_path = self.root / 'compact.lock'
+    if not self.meta_path.is_file():
+      assert meta_archs is not None, 'can not find the store in {:}'.format(self.root)
+      self.segment_dir.mkdir(parents=True, exist_ok=True)
+      temp_path = self.root / 'meta.json.tmp'
+      with open(str(temp_path), 'w') as cfile:
+        json.dump({'version': STORE_VERSION, 'meta_archs': list(meta_archs)}, cfile)
+      os.replace(str(temp_path), str(self.meta_path))
+    with open(str(self.meta_path), 'r') as cfile:
+      meta = json.load(cfile)
+    assert meta_archs is None or list(meta_archs) == meta['meta_archs'], 'the meta_archs do not match the store in {:}'.format(self.root)
+    self.version    = meta['version']
+    self.meta_archs = meta['meta_archs']
+
+  def __repr__(self):
+    return ('{name}({num} segments, root={root})'.format(name=self.__class__.__name__, num=len(self.segments()), root=self.root))
+
+  @staticmethod
+  def is_store(root: Union[Text, Path]) -> bool:
+    return (Path(root) / 'meta.json').is_file() and (Path(root) / 'segments').is_dir()
+
+  def segments(self) -> List[Dict]:
+    """Return the committed segments in the order of the journal, where an incomplete line (e.g., of a crashed writer) is ignored."""
+    if not self.journal_path.is_file(): return []
+    records = []
+    with open(str(self.journal_path), 'r') as cfile:
+      for line in cfile:
+        try:
+          records.append( json.loads(line) )
+        except ValueError:
+          continue
+    return records
+
+  def fingerprint(self, records: List[Dict]=None) -> Text:
+    """Return the fingerprint of the committed segments, which changes at every append and compaction."""
+    fingerprint = 'store'
+    for record in (self.segments() if records is None else records):
+      fingerprint = chain_fingerprint(fingerprint, record)
+    return fingerprint
+
+  @contextmanager
+  def _locked(self, path: Path, blocking: bool=True):
+    # an exclusive lock among the processes, which yields False if `blocking` is False and the lock is held by others
+    with open(str(path), 'a') as lfile:
+      try:
+        fcntl.flock(lfile.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+      except BlockingIOError:
+        yield False
+        return
+      try:
+        yield True
+      finally:
+        fcntl.flock(lfile.fileno(), fcntl.LOCK_UN)
+
+  def _write_segment(self, kind: Text, data, indexes) -> Dict:
+    name = 'segment-{:}.pth'.format(uuid.uuid4().hex)
+    temp_path = self.segment_dir / (name + '.tmp')
+    torch.save(data, str(temp_path))
+    os.replace(str(temp_path), str(self.segment_dir / name))
+    return {'segment': name, 'kind': kind, 'indexes': sorted(set(int(x) for x in indexes))}
+
+  def _commit(self, record: Dict) -> Dict:
+    with self._locked(self.lock_path), open(str(self.journal_path), 'a+b') as cfile:
+      # a torn last line of a crashed writer is terminated, so that it does not swallow this record
+      torn = cfile.seek(0, os.SEEK_END) > 0 and cfile.seek(-1, os.SEEK_END) >= 0 and cfile.read(1) != b'\n'
+      cfile.write((b'\n' if torn else b'') + json.dumps(record).encode('utf-8') + b'\n')
+      cfile.flush()
+      os.fsync(cfile.fileno())
+    return record
+
+  def append(self, arch2infos: Dict[int, Dict], source: Text=None) -> Dict:
+    """Write {arch-index: {'full': ArchResults.state_dict(), 'less': ...}} as a new segment, and commit it into the journal.
+       The optional `source` (e.g., the directory of the checkpoints) is kept in the record, but not after `compact`."""
+    record = self._write_segment('results', arch2infos, arch2infos.keys())
+    if source is not None: record['source'] = source
+    return self._commit( record )
+
+  def append_updates(self, updates: List[Tuple]) -> Dict:
+    """Write a list of updates (see UPDATE_OPS) as a new segment, and commit it into the journal."""
+    for index, use_12epochs_result, op, args in updates:
+      assert 0 <= index < len(self.meta_archs), 'invalid arch-index : {:}'.format(index)
+      assert op in UPDATE_OPS, 'invalid update op : {:}'.format(op)
+    return self._commit( self._write_segment('updates', list(updates), [x[0] for x in updates]) )
+
+  def load_segment(self, record: Dict):
+    return torch.load(str(self.segment_dir / record['segment']), map_location='cpu')
+
+  def apply_updates(self, index: int, infos: Union[None, Dict], updates: List[Tuple]) -> Dict:
+    if len(updates) == 0: return infos
+    if infos is None: archs = {'full': ArchResults(index, self.meta_archs[index]), 'less': ArchResults(index, self.meta_archs[index])}
+    else            : archs = {key: ArchResults.create_from_state_dict(value) for key, value in infos.items()}
+    for _, use_12epochs_result, op, args in updates:
+      apply_update(archs['less' if use_12epochs_result else 'full'], op, args)
+    return {key: value.state_dict() for key, value in archs.items()}
+
+  def iterate(self, records: List[Dict]=None):
+    """Yield (arch-index, infos) of the latest results of each architecture, loading one `results` segment at a time.
+       The `updates` segments are usually small and loaded together, and each update is applied to the results committed before it."""
+    if records is None: records = self.segments()
+    latest, updates = dict(), defaultdict(list)
+    for i, record in enumerate(records):
+      if record.get('kind', 'results') == 'results':
+        for index in record['indexes']: latest[index] = i
+    for i, record in enumerate(records):
+      if record.get('kind', 'results') == 'updates':
+        for update in self.load_segment(record):
+          if latest.get(update[0], -1) < i: updates[update[0]].append(update)
+    for i, record in enumerate(records):
+      indexes = [index for index in record['indexes'] if latest.get(index, -1) == i]
+      if record.get('kind', 'results') != 'results' or len(indexes) == 0: continue
+      arch2infos = self.load_segment(record)
+      for index in indexes: yield index, self.apply_updates(index, arch2infos[index], updates.pop(index, []))
+    # the architectures that are only created by the updates
+    for index in sorted(updates.keys()):
+      yield index, self.apply_updates(index, None, updates[index])
+
+  def to_dict(self) -> Dict:
+    """Return the dict in the format of the benchmark file, which can be used to create NASBench201API.
+       The fingerprint of the read segments is kept in `self.read_fingerprint`."""
+    for _ in range(3):
+      try:
+        records = self.segments()
+        arch2infos = dict(self.iterate(records))
+        break
+      except FileNotFoundError: # the read segments are removed by a concurrent `compact`, and the journal is read again
+        continue
+    else:
+      records = self.segments()
+      arch2infos = dict(self.iterate(records))
+    self.read_fingerprint = self.fingerprint(records)
+    return {'meta_archs'       : list(self.meta_archs),
+            'arch2infos'       : arch2infos,
+            'evaluated_indexes': sorted(list(arch2infos.keys()))}
+
+  def export(self, path: Union[Text, Path]) -> Path:
+    """Save the whole store as one benchmark file."""
+    path = Path(path)
+    temp_path = path.parent / (path.name + '.tmp')
+    torch.save(self.to_dict(), str(temp_path))
+    os.replace(str(temp_path), str(path))
+    return path
+
+  def compact(self, segment_size: int=100) -> bool:
+    """Fold all committed segments into new `results` segments of `segment_size` architectures, and then remove the old segments.
+       The writers are only blocked when the journal is swapped, and the segments committed during compaction are kept after the new ones.
+       Return False if another compaction is running."""
+    with self._locked(self.compact_path, blocking=False) as acquired:
+      if not acquired: return False
+      records, new_records, arch2infos = self.segments(), [], dict()
+      for index, infos in self.iterate(records):
+        arch2infos[index] = infos
+        if len(arch2infos) >= segment_size:
+          new_records.append( self._write_segment('results', arch2infos, arch2infos.keys()) )
+          arch2infos = dict()
+      if len(arch2infos) > 0: new_records.append( self._write_segment('results', arch2infos, arch2infos.keys()) )
+      with self._locked(self.lock_path):
+        tail_records = self.segments()[len(records):]
+        temp_path = self.root / 'journal.jsonl.tmp'
+        with open(str(temp_path), 'w') as cfile:
+          for record in new_records + tail_records: cfile.write(json.dumps(record) + '\n')
+          cfile.flush()
+          os.fsync(cfile.fileno())
+        os.replace(str(temp_path), str(self.journal_path))
+      for record in records:
+        (self.segment_dir / record['segment']).unlink()
+    return True
+
+  def compact_in_background(self, segment_size: int=100) -> threading.Thread:
+    thread = threading.Thread(target=self.compact, args=(segment_size,))
+    thread.start()
+    return thread
@@ -0,0 +1,210 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+############################################################################################
+# A local query service of NAS-Bench-201, where one long-lived server process holds the   #
+# benchmark in memory and many search processes on the same host query it through        #
+# NASBench201Client, which has the same query functions as NASBench201API.               #
+# The requests are pickled, so a TCP server on a non-loopback host requires an authkey,   #
+# and the Unix domain socket can only be connected by its owner.                         #
+#   python exps/NAS-Bench-201/serve.py --api_path $TORCH_HOME/NAS-Bench-201-v1_1-096897.pth --address /tmp/nas-bench-201.sock
+############################################################################################
+import os, stat, random, threading, ipaddress, numpy as np
+from typing import Text, Union, List, Tuple
+from multiprocessing.connection import Listener, Client
+
+
+# the read-only functions served by NASBench201Server
+SERVED_FUNCTIONS = ('query_index_by_arch', 'query_index_by_code', 'index2code', 'code2index', 'query_by_arch', 'arch', 'get_more_info', 'get_cost_info', 'find_best',
+                    'get_more_info_batch', 'get_times_batch', 'get_learning_curves', '__len__')
+
+
+def parse_address(address: Union[Text, Tuple]):
+  """A path is a Unix domain socket, and 'host:port' (or a (host, port) tuple) is a TCP address."""
+  if isinstance(address, tuple): return address
+  if ':' in address and not os.path.sep in address:
+    host, port = address.rsplit(':', 1)
+    return (host, int(port))
+  return address
+
+
+# the environment variable of the authkey, if it is not given by a key file
+AUTHKEY_ENV = 'NAS_BENCH_201_AUTHKEY'
+
+
+def load_authkey(key_file: Union[None, Text]=None) -> Union[None, bytes]:
+  """Return the authkey read from `key_file`, or from the environment variable NAS_BENCH_201_AUTHKEY if key_file is None (None if it is not set)."""
+  if key_file is not None:
+    with open(key_file, 'rb') as cfile:
+      authkey = cfile.read().strip()
+    assert len(authkey) > 0, 'empty authkey in {:}'.format(key_file)
+    return authkey
+  authkey = os.environ.get(AUTHKEY_ENV, '')
+  return authkey.encode() if authkey else None
+
+
+def is_loopback(host: Text) -> bool:
+  if host == 'localhost': return True
+  try:
+    return ipaddress.ip_address(host).is_loopback
+  except ValueError:
+    return False
+
+
+def is_server_address(address: Union[Text, Tuple]) -> bool:
+  """Whether `address` is a TCP address ('host:port' or a (host, port) tuple) or the Unix domain socket of a running NASBench201Server."""
+  if isinstance(address, tuple): return len(address) == 2
+  if not isinstance(address, str): return False
+  if ':' in address and not os.path.sep in address: return address.rsplit(':', 1)[1].isdigit()
+  return os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode)
+
+
+def client_rng(is_random, by_numpy: bool=True):
+  # the server is multi-threaded and shared, so the random trials are drawn by an RNG seeded on the client: from the given RandomState,
+  # or for is_random=True, from the global RNG of this process (set by prepare_seed), which is numpy or `random` (by_numpy=False) as in NASBench201API.
+  # It makes the trials reproducible across the runs of a client, but they are not the trials that a local NASBench201API draws with the same seed.
+  if isinstance(is_random, np.random.RandomState): return np.random.RandomState(is_random.randint(2**31))
+  if isinstance(is_random, bool) and is_random   : return np.random.RandomState(np.random.randint(2**31) if by_numpy else random.getrandbits(31))
+  return is_random
+
+
+def arch2str(arch):
+  # the Structure is sent as its string, so that the server does not need to import the models
+  return arch if isinstance(arch, (str, int)) or not hasattr(arch, 'tostr') else arch.tostr()
+
+
+class NASBench201Server(object):
+
+  def __init__(self, api, address: Union[Text, Tuple], authkey: bytes=None, verbose: bool=True):
+    self.api      = api
+    self.address  = parse_address(address)
+    # every request is unpickled, which can run arbitrary code, so only the loopback TCP address can be served without an authkey
+    if isinstance(self.address, tuple) and authkey is None and not is_loopback(self.address[0]):
+      raise ValueError('{:} is reachable by other hosts, please give an authkey (see load_authkey)'.format(address))
+    self.authkey  = authkey
+    self.verbose  = verbose
+    self.listener = None
+
+  def __repr__(self):
+    return ('{name}(address={address}, api={api})'.format(name=self.__class__.__name__, address=self.address, api=self.api))
+
+  def call(self, name: Text, args, kwargs):
+    if name not in SERVED_FUNCTIONS: raise ValueError('invalid function : {:}'.format(name))
+    return getattr(self.api, name)(*args, **kwargs)
+
+  def handle(self, conn) -> None:
+    # each request is (name, args, kwargs) or a list of them, and each response is ('ok', result) or ('error', message)
+    with conn:
+      while True:
+        try:
+          request = conn.recv()
+        except (EOFError, OSError):
+          return
+        try:
+          if isinstance(request, list): response = ('ok', [self.call(*x) for x in request])
+          else                        : response = ('ok', self.call(*request))
+        except Exception as e:
+          response = ('error', '{:}: {:}'.format(type(e).__name__, e))
+        conn.send(response)
+
+  def serve_forever(self) -> None:
+    if isinstance(self.address, str):
+      if os.path.exists(self.address): os.remove(self.address)
+      umask = os.umask(0o177) # only the owner can connect to the Unix domain socket
+      try:
+        self.listener = Listener(self.address, authkey=self.authkey)
+      finally:
+        os.umask(umask)
+      os.chmod(self.address, 0o600)
+    else:
+      self.listener = Listener(self.address, authkey=self.authkey)
+    if self.verbose: print('{:} is listening.'.format(self))
+    try:
+      while True:
+        conn = self.listener.accept()
+        threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+    finally:
+      self.close()
+
+  def close(self) -> None:
+    if self.listener is not None:
+      self.listener.close()
+      self.listener = None
+
+
+class NASBench201Client(object):
+  """A drop-in replacement of NASBench201API for the query functions, which are answered by a NASBench201Server."""
+
+  def __init__(self, address: Union[Text, Tuple], authkey: bytes=None):
+    self.address = parse_address(address)
+    self.authkey = authkey
+    self.connect()
+
+  def connect(self) -> None:
+    # the forked processes (e.g., procedures.run_trials) can not share one connection, so each process connects by itself
+    self.conn = Client(self.address, authkey=self.authkey)
+    self.lock = threading.Lock()
+    self.pid  = os.getpid()
+
+  def __repr__(self):
+    return ('{name}(address={address})'.format(name=self.__class__.__name__, address=self.address))
+
+  def _request(self, request):
+    if self.pid != os.getpid(): self.connect()
+    with self.lock:
+      self.conn.send(request)
+      status, result = self.conn.recv()
+    if status != 'ok': raise RuntimeError('the NAS-Bench-201 server fails : {:}'.format(result))
+    return result
+
+  def call(self, name: Text, *args, **kwargs):
+    return self._request( (name, args, kwargs) )
+
+  def batch(self, calls: List[Tuple]) -> List:
+    """Send many calls of (name, args, kwargs) in one round trip, e.g., [('get_more_info', (index, 'cifar10-valid', None, True), {}), ...].
+       The arguments are sent as they are, so is_random=True is drawn by the RNG of the server (see `client_rng`)."""
+    return self._request( [(name, tuple(args), dict(kwargs)) for name, args, kwargs in calls] )
+
+  def close(self) -> None:
+    self.conn.close()
+
+  def __len__(self):
+    return self.call('__len__')
+
+  def query_index_by_arch(self, arch):
+    return self.call('query_index_by_arch', arch2str(arch))
+
+  def query_index_by_code(self, code):
+    return self.call('query_index_by_code', code)
+
+  def index2code(self):
+    # the arrays are fixed by meta_archs, and are fetched once
+    if getattr(self, '_index2code', None) is None: self._index2code = self.call('index2code')
+    return self._index2code
+
+  def code2index(self):
+    if getattr(self, '_code2index', None) is None: self._code2index = self.call('code2index')
+    return self._code2index
+
+  def query_by_arch(self, arch, use_12epochs_result=False):
+    return self.call('query_by_arch', arch2str(arch), use_12epochs_result)
+
+  def arch(self, index: int):
+    return self.call('arch', index)
+
+  def get_more_info(self, index, dataset, iepoch=None, use_12epochs_result=False, is_random=True):
+    return self.call('get_more_info', index, dataset, iepoch, use_12epochs_result, client_rng(is_random, False))
+
+  def get_cost_info(self, index, dataset, use_12epochs_result=False):
+    return self.call('get_cost_info', index, dataset, use_12epochs_result)
+
+  def find_best(self, dataset, metric_on_set, FLOP_max=None, Param_max=None, use_12epochs_result=False):
+    return self.call('find_best', dataset, metric_on_set, FLOP_max, Param_max, use_12epochs_result)
+
+  def get_more_info_batch(self, indexes, dataset, iepoch=None, use_12epochs_result=False, is_random=True):
+    return self.call('get_more_info_batch', indexes, dataset, iepoch, use_12epochs_result, client_rng(is_random))
+
+  def get_times_batch(self, indexes, dataset, setname, iepoch=None, is_random=False, use_12epochs_result=False):
+    return self.call('get_times_batch', indexes, dataset, setname, iepoch, client_rng(is_random), use_12epochs_result)
+
+  def get_learning_curves(self, dataset, setname, use_12epochs_result=False):
+    return self.call('get_learning_curves', dataset, setname, use_12epochs_result)
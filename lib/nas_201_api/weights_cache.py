@@ -0,0 +1,78 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+############################################################################################
+# A bounded LRU cache of the trained weights of NAS-Bench-201, which loads the weights of  #
+# each architecture from `{archive_root}/{index:06d}-FULL.pth` at its first use and drops #
+# the least recently used architectures once the cached weights exceed `max_bytes`.       #
+############################################################################################
+import os, torch
+from pathlib import Path
+from typing import Text, Union, Dict
+from collections import OrderedDict
+
+from .api import ArchResults
+
+
+def state_dict_bytes(state_dict) -> int:
+  if state_dict is None: return 0
+  return sum(value.numel() * value.element_size() for value in state_dict.values() if torch.is_tensor(value))
+
+
+def archresult_bytes(archresult: ArchResults) -> int:
+  return sum(state_dict_bytes(result.net_state_dict) for result in archresult.all_results.values())
+
+
+class WeightsLRUCache(object):
+
+  def __init__(self, archive_root: Union[Text, Path], max_bytes: int):
+    assert os.path.isdir(archive_root), 'invalid directory : {:}'.format(archive_root)
+    assert max_bytes > 0, 'invalid max_bytes : {:}'.format(max_bytes)
+    self.archive_root = Path(archive_root)
+    self.max_bytes = int(max_bytes)
+    self.nbytes = 0
+    self.hits, self.misses = 0, 0
+    self._cache = OrderedDict() # index -> (the dict of ArchResults, the number of bytes)
+
+  def __len__(self):
+    return len(self._cache)
+
+  def __contains__(self, index: int):
+    return index in self._cache
+
+  def __repr__(self):
+    return ('{name}({num} architectures, {nbytes:.1f}/{max_bytes:.1f} MB, hits={hits}, misses={misses}, root={root})'.format(name=self.__class__.__name__, num=len(self), nbytes=self.nbytes/1e6, max_bytes=self.max_bytes/1e6, hits=self.hits, misses=self.misses, root=self.archive_root))
+
+  def get(self, index: int) -> Dict[Text, ArchResults]:
+    """Return {'less': ArchResults, 'full': ArchResults} with the weights of the `index`-th architecture."""
+    if index in self._cache:
+      self.hits += 1
+      self._cache.move_to_end(index)
+      return self._cache[index][0]
+    self.misses += 1
+    xfile_path = self.archive_root / '{:06d}-FULL.pth'.format(index)
+    assert xfile_path.is_file(), 'invalid data path : {:}'.format(xfile_path)
+    xdata = torch.load(str(xfile_path), map_location='cpu')
+    assert isinstance(xdata, dict) and 'full' in xdata and 'less' in xdata, 'invalid format of data in {:}'.format(xfile_path)
+    archresults = {'less': ArchResults.create_from_state_dict( xdata['less'] ),
+                   'full': ArchResults.create_from_state_dict( xdata['full'] )}
+    nbytes = sum(archresult_bytes(x) for x in archresults.values())
+    self._cache[index] = (archresults, nbytes)
+    self.nbytes += nbytes
+    # always keep the latest one, even if it alone exceeds the capacity
+    while self.nbytes > self.max_bytes and len(self._cache) > 1:
+      _, (_, xbytes) = self._cache.popitem(last=False)
+      self.nbytes -= xbytes
+    return archresults
+
+  def get_net_param(self, index: int, dataset: Text, seed, use_12epochs_result: bool=False):
+    archresult = self.get(index)['less' if use_12epochs_result else 'full']
+    return archresult.get_net_param(dataset, seed)
+
+  def discard(self, index: int) -> None:
+    if index in self._cache:
+      _, xbytes = self._cache.pop(index)
+      self.nbytes -= xbytes
+
+  def clear(self) -> None:
+    self._cache.clear()
+    self.nbytes = 0
@@ -6,6 +6,8 @@ from .optimizers import get_optim_scheduler
 from .funcs_nasbench import evaluate_for_seed as bench_evaluate_for_seed
 from .funcs_nasbench import pure_evaluate as bench_pure_evaluate
 from .funcs_nasbench import get_nas_bench_loaders
+from .arch_evaluation import cache_batches, SupernetEvaluator
+from .trial_farm import run_trials
 
 def get_procedures(procedure):
   from .basic_main     import basic_train, basic_valid
@@ -0,0 +1,127 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+############################################################################################
+# Evaluate many candidate architectures of a NAS-Bench-201 supernet on the same batches,  #
+# where each batch is loaded and moved to GPU once, the stem is computed once per batch,  #
+# and the duplicated candidates (e.g., sampled by a controller) are evaluated only once.  #
+# The candidates are organized as a trie over the edge decisions of the first search cell,#
+# so that every node (and edge output) shared by a prefix of codes is computed only once. #
+# The trie is walked in the depth-first order, and only the path of the current code is   #
+# kept in memory, as well as the logits of the evaluated candidates.                      #
+############################################################################################
+import torch
+import numpy as np
+from utils import obtain_accuracy
+from models.cell_operations import zero_outputs
+
+
+__all__ = ['cache_batches', 'SupernetEvaluator']
+
+
+def cache_batches(xloader, num_batches, device=None):
+  """Load the first `num_batches` batches of `xloader` into `device` once, which can be reused for all candidates."""
+  batches = []
+  for inputs, targets in xloader:
+    if len(batches) >= num_batches: break
+    if device is None: batches.append( (inputs.cuda(non_blocking=True), targets.cuda(non_blocking=True)) )
+    else             : batches.append( (inputs.to(device), targets.to(device)) )
+  return batches
+
+
+class SupernetEvaluator(object):
+  """The supernet should have the macro structure of stem -> cells -> lastact -> global_pooling -> classifier (e.g., SETN, ENAS, MetaENAS),
+     and its `codec` (ArchCodec) to encode the candidate architectures. The search cells are called by `forward_encoded`.
+  """
+  def __init__(self, network, archs):
+    self.network = network
+    self.archs   = list(archs)
+    codes        = [arch if isinstance(arch, tuple) else network.codec.encode(arch) for arch in self.archs]
+    self.codes   = []  # the unique codes
+    code2unique  = dict()
+    self.arch2unique = []
+    for code in codes:
+      if code not in code2unique:
+        code2unique[code] = len(self.codes)
+        self.codes.append( code )
+      self.arch2unique.append( code2unique[code] )
+    self.order = sorted(range(len(self.codes)), key=lambda i: self.codes[i]) # the depth-first order of the trie
+
+  def __repr__(self):
+    return ('{name}({num} candidates, {unique} unique)'.format(name=self.__class__.__name__, num=len(self.archs), unique=len(self.codes)))
+
+  def forward_cells(self, feature, code, start=0):
+    for cell in self.network.cells[start:]:
+      if hasattr(cell, 'forward_encoded'): feature = cell.forward_encoded(feature, code)
+      else                               : feature = cell(feature)
+    return feature
+
+  def forward_trie(self, cell, inputs):
+    """Yield (i, the outputs of `cell` for the i-th unique code) in the depth-first order of the trie. The i-th node only depends on the code prefix
+       of its input edges, so the nodes and edge outputs are cached by the code prefix (the trie path), and those shared by candidates are computed once.
+       The codes sharing a prefix are adjacent in this order, so the cache of a prefix is freed once the next code does not share it."""
+    num_nodes = cell.max_nodes
+    ends      = [i * (i-1) // 2 for i in range(num_nodes+1)] # the i-th node is decided by code[:ends[i+1]]
+    nodes, edges = {(): inputs}, dict()
+    for x, index in enumerate(self.order):
+      code = self.codes[index]
+      for i in range(1, num_nodes):
+        node_key = code[:ends[i+1]]
+        if node_key in nodes: continue
+        inter_nodes = []
+        for k in range(ends[i], ends[i+1]):
+          _, j, node_str = cell.code_edges[k]
+          edge_key = (code[:ends[j+1]], node_str, code[k])
+          operation = cell.edges[node_str][ code[k] ]
+          if getattr(operation, 'is_zero', False) or nodes[edge_key[0]] is None: continue # a zero edge or a zero input node
+          if edge_key not in edges: edges[edge_key] = operation( nodes[edge_key[0]] )
+          inter_nodes.append( edges[edge_key] )
+        nodes[node_key] = sum(inter_nodes) if len(inter_nodes) > 0 else None # None for the zero node
+      output = nodes[code[:ends[-1]]]
+      yield index, (zero_outputs(inputs, cell.out_dim, cell.stride) if output is None else output)
+      if x + 1 < len(self.order): # keep the prefixes of the next code, and the edge outputs of the kept nodes
+        xnext = self.codes[self.order[x+1]]
+        nodes = {key: value for key, value in nodes.items() if xnext[:len(key)] == key}
+        edges = {key: value for key, value in edges.items() if key[0] in nodes}
+      output = None
+
+  def forward_head(self, feature):
+    out = self.network.lastact(feature)
+    out = self.network.global_pooling( out )
+    out = out.view(out.size(0), -1)
+    return self.network.classifier(out)
+
+  def forward_batch(self, inputs):
+    """Return the logits of each unique candidate on `inputs`."""
+    feature = self.network.stem(inputs)
+    # the cells before the first search cell are shared by all candidates
+    for icell, cell in enumerate(self.network.cells):
+      if hasattr(cell, 'forward_encoded'): break
+      feature = cell(feature)
+    else:
+      return [self.forward_head( feature )] * len(self.codes)
+    # each output of the first search cell is consumed before the next one is computed
+    logits = [None] * len(self.codes)
+    for index, xfeature in self.forward_trie(cell, feature):
+      logits[index] = self.forward_head( self.forward_cells(xfeature, self.codes[index], icell+1) )
+    return logits
+
+  def evaluate(self, batches):
+    """Return the top-1 accuracy of each candidate averaged over `batches` (an iterable of (inputs, targets), e.g., a loader or `cache_batches`)."""
+    self.network.eval()
+    sums, num, device = None, 0, next(self.network.parameters()).device
+    with torch.no_grad():
+      for inputs, targets in batches:
+        inputs  = inputs.to(device, non_blocking=True)
+        targets = targets.to(device, non_blocking=True)
+        top1s   = torch.cat([obtain_accuracy(logits, targets, topk=(1,))[0] for logits in self.forward_batch(inputs)])
+        sums    = top1s if sums is None else sums + top1s
+        num    += 1
+    assert num > 0, 'there is no batch to evaluate the candidates'
+    accuracies = (sums / num).cpu().numpy()
+    return accuracies[ self.arch2unique ]
+
+  def get_best(self, batches):
+    """Return the best candidate, its accuracy, and the accuracies of all candidates."""
+    accuracies = self.evaluate(batches)
+    best_idx   = int(np.argmax(accuracies))
+    return self.archs[best_idx], float(accuracies[best_idx]), accuracies
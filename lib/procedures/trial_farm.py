@@ -0,0 +1,65 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+############################################################################################
+# Run many independent trials of a benchmark-simulated search algorithm (e.g., 500 seeds  #
+# of R_EA.py) over a pool of forked processes. All workers share the benchmark API loaded #
+# by the parent, and each finished trial is appended to one JSON-lines file at once.      #
+############################################################################################
+import os, sys, json, random, multiprocessing
+from pathlib import Path
+from log_utils import time_string
+
+
+__all__ = ['run_trials']
+
+
+# (main_func, xargs, nas_bench) of the parent, which is inherited by the forked workers instead of being pickled
+_TRIAL_CONTEXT = None
+
+
+def _run_trial(trial):
+  main_func, xargs, nas_bench = _TRIAL_CONTEXT
+  itrial, seed = trial
+  # xargs is the global `args` of the script (used by prepare_logger), and each process runs its trials one by one
+  xargs.rand_seed = seed
+  return itrial, seed, main_func(xargs, nas_bench)
+
+
+def _to_json(value):
+  if isinstance(value, Path): return str(value)
+  if isinstance(value, (list, tuple)): return [_to_json(x) for x in value]
+  return value
+
+
+def run_trials(main_func, xargs, nas_bench, num_trials, num_workers=1, seeds=None, log_path=None):
+  """Run `main_func(xargs, nas_bench)` with `num_trials` random seeds, and return the results in the order of the seeds.
+     If num_workers > 1, the trials run in a pool of forked processes; otherwise, they run one by one in this process.
+     Each finished trial is written to `log_path` (default: {save_dir}/trials.jsonl) as {trial, seed, result}.
+  """
+  global _TRIAL_CONTEXT
+  if seeds is None: seeds = [random.randint(1, 100000) for _ in range(num_trials)]
+  assert len(seeds) == num_trials, 'invalid seeds : {:} vs. {:}'.format(len(seeds), num_trials)
+  if log_path is None: log_path = Path(xargs.save_dir) / 'trials.jsonl'
+  log_path = Path(log_path)
+  log_path.parent.mkdir(parents=True, exist_ok=True)
+  _TRIAL_CONTEXT = (main_func, xargs, nas_bench)
+  results, pool = [None] * num_trials, None
+  try:
+    if num_workers > 1:
+      pool = multiprocessing.get_context('fork').Pool(min(num_workers, num_trials))
+      finished = pool.imap_unordered(_run_trial, enumerate(seeds))
+    else:
+      finished = map(_run_trial, enumerate(seeds))
+    with open(str(log_path), 'w') as cfile:
+      for num, (itrial, seed, result) in enumerate(finished):
+        results[itrial] = result
+        cfile.write(json.dumps({'trial': itrial, 'seed': seed, 'result': _to_json(result)}) + '\n')
+        cfile.flush()
+        print ('{:} : {:03d}/{:03d} trials finished, the {:03d}-th trial with seed={:}'.format(time_string(), num+1, num_trials, itrial, seed))
+        sys.stdout.flush()
+  finally:
+    if pool is not None:
+      pool.close()
+      pool.join()
+    _TRIAL_CONTEXT = None
+  return results
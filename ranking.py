@@ -12,6 +12,7 @@ if str(lib_dir) not in sys.path: sys.path.insert(0, str(lib_dir))
 from config_utils import load_config, dict2config
 from datasets     import get_datasets
 from procedures   import prepare_seed, prepare_logger, save_checkpoint, copy_checkpoint, get_optim_scheduler, get_procedures
+from procedures   import cache_batches, SupernetEvaluator
 from utils        import get_model_infos, obtain_accuracy
 from log_utils    import AverageMeter, time_string, convert_secs2time, write_results
 from models       import get_cell_based_tiny_net, get_search_spaces, load_net_from_checkpoint, FeatureMatching, CellStructure as Structure
@@ -34,45 +35,19 @@ def get_n_archs(data, n, pick_top=True, order=True):
         return dict(subset)
 
 def list_arch(api, dataset, metric_on_set, FLOP_max=None, Param_max=None, use_12epochs_result=False):
-    """Find the architecture with the highest accuracy based on some constraints."""
-    if use_12epochs_result: basestr, arch2infos = '12epochs' , api.arch2infos_less
-    else                  : basestr, arch2infos = '200epochs', api.arch2infos_full
-    result = OrderedDict()
-    for i, arch_id in enumerate(api.evaluated_indexes):
-      info = arch2infos[arch_id].get_compute_costs(dataset)
-      flop, param, latency = info['flops'], info['params'], info['latency']
-      if FLOP_max  is not None and flop  > FLOP_max : continue
-      if Param_max is not None and param > Param_max: continue
-      xinfo = arch2infos[arch_id].get_metrics(dataset, metric_on_set)
-      loss, accuracy = xinfo['loss'], xinfo['accuracy']
-      arch_str = api.query_by_index(arch_id).arch_str
-      result[arch_id] = { "arch_str": arch_str, "accuracy": accuracy, "flop": flop, "param": param }
-    return result
-
-def get_best_arch(xloader, network, n_samples):
-  # setn evaluation
-  with torch.no_grad():
-    network.eval()
-    archs, valid_accs = network.return_topK(n_samples), []
-    #print ('obtain the top-{:} architectures'.format(n_samples))
-    loader_iter = iter(xloader)
-    for i, sampled_arch in enumerate(archs):
-      network.set_cal_mode('dynamic', sampled_arch)
-      try:
-        inputs, targets = next(loader_iter)
-      except:
-        loader_iter = iter(xloader)
-        inputs, targets = next(loader_iter)
-
-      _, logits = network(inputs)
-      val_top1, val_top5 = obtain_accuracy(logits.cpu().data, targets.data, topk=(1, 5))
-
-      valid_accs.append( val_top1.item() )
-      #print ('--- {:}/{:} : {:} : {:}'.format(i, len(archs), sampled_arch, val_top1))
-
-    best_idx = np.argmax(valid_accs)
-    best_arch, best_valid_acc = archs[best_idx], valid_accs[best_idx]
-    return best_arch, best_valid_acc
+    """List all architectures satisfying some constraints, ordered by the architecture index."""
+    index = api.get_metric_index(dataset, metric_on_set, None, use_12epochs_result)
+    positions = index.select(None, FLOP_max, Param_max)
+    positions = positions[ np.argsort(index.indexes[positions]) ]
+    return OrderedDict( index.to_dict(positions, api.meta_archs) )
+
+def get_best_arch(xloader, network, n_samples, num_batches=1):
+  # setn evaluation, where all the top-K architectures are evaluated on the same cached batches
+  archs = network.return_topK(n_samples)
+  #print ('obtain the top-{:} architectures'.format(n_samples))
+  evaluator = SupernetEvaluator(network, archs)
+  best_arch, best_valid_acc, _ = evaluator.get_best( cache_batches(xloader, num_batches) )
+  return best_arch, best_valid_acc
 
 def valid_func(xloader, network, criterion, print_freq, logger):
   data_time, batch_time, losses, top1, top5 = AverageMeter(), AverageMeter(), AverageMeter(), AverageMeter(), AverageMeter()
@@ -162,13 +137,7 @@ def main(args):
       search_scope = checkpoint['search_scope']
       logger.log("***Search Scope found***")
   elif n_top:
-      # all_archs = list_arch(api, xargs.dataset, 'ori-test')
-      arch_path = os.environ['TORCH_HOME'] + "/all_archs-{}-test.pt".format(args.dataset)
-      if os.path.isfile(arch_path):
-          all_archs = torch.load(arch_path)["all_archs"]
-      else:
-          all_archs = list_arch(api, args.dataset, 'ori-test')
-          save_checkpoint({'all_archs': all_archs}, arch_path, logger)
+      all_archs = list_arch(api, args.dataset, 'ori-test') # the metric index is cached next to the benchmark file
       pick_top = True
       if n_top < 0: # random pick
         n_top = -n_top
@@ -0,0 +1,52 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+# python -m pytest -q tests
+import sys, random, pytest, numpy as np
+from pathlib import Path
+lib_dir = (Path(__file__).parent / '..' / 'lib').resolve()
+if str(lib_dir) not in sys.path: sys.path.insert(0, str(lib_dir))
+
+
+def make_arch_results(arch_index, arch_str, dataset_seeds, rng, epochs=3):
+  # the ArchResults of one architecture with random metrics, where dataset_seeds is {dataset: [seed, ...]}
+  from nas_201_api.api import ArchResults, ResultsCount
+  archres = ArchResults(arch_index, arch_str)
+  for dataset, seeds in dataset_seeds.items():
+    evalnames = ['x-valid', 'ori-test'] if dataset == 'cifar10-valid' else ['ori-test']
+    for seed in seeds:
+      train = {i: float(rng.uniform(10, 100)) for i in range(epochs)}
+      result = ResultsCount(dataset, None, train, train, float(rng.uniform(0.1, 1.5)), float(rng.uniform(10, 200)), {'arch_str': arch_str, 'channel': 16, 'num_cells': 5, 'class_num': 10}, seed, epochs, [float(rng.uniform(0.01, 0.03))])
+      result.update_train_info(train, train, train, {i: 10.0 for i in range(epochs)})
+      keys = ['{:}@{:}'.format(name, i) for name in evalnames for i in range(epochs)]
+      result.update_eval({key: float(rng.uniform(10, 100)) for key in keys}, {key: 1.0 for key in keys}, {key: 2.0 for key in keys})
+      archres.update(dataset, seed, result)
+  return archres
+
+
+@pytest.fixture
+def benchmark_dict():
+  """A small benchmark in the format of the benchmark file, where some architectures have one or two seeds on each dataset."""
+  from models import CellStructure, get_search_spaces
+  rng   = np.random.RandomState(0)
+  archs = [arch.tostr() for arch in CellStructure.gen_all(get_search_spaces('cell', 'nas-bench-201'), 4, False)[:40]]
+  arch2infos = dict()
+  for index in range(0, len(archs), 2):
+    dataset_seeds = {'cifar10-valid': [777, 888][:1 + index % 3 // 2], 'cifar100': [777]}
+    arch2infos[index] = {key: make_arch_results(index, archs[index], dataset_seeds, rng).state_dict() for key in ('full', 'less')}
+  return {'meta_archs': archs, 'arch2infos': arch2infos, 'evaluated_indexes': sorted(arch2infos.keys())}
+
+
+@pytest.fixture(scope='session')
+def search_space_dict():
+  """The benchmark of the whole search space in the shuffled order of exps/NAS-Bench-201/main.py, where each architecture has one trial on cifar10-valid,
+     whose time cost is 30 s of training plus 2 s of validation."""
+  from models import CellStructure, get_search_spaces
+  rng   = np.random.RandomState(0)
+  archs = [arch.tostr() for arch in CellStructure.gen_all(get_search_spaces('cell', 'nas-bench-201'), 4, False)]
+  random.Random(88).shuffle(archs)
+  arch2infos = dict()
+  for index, arch in enumerate(archs):
+    infos = make_arch_results(index, arch, {'cifar10-valid': [777]}, rng).state_dict()
+    arch2infos[index] = {'full': infos, 'less': infos}
+  return {'meta_archs': archs, 'arch2infos': arch2infos, 'evaluated_indexes': sorted(arch2infos.keys())}
@@ -0,0 +1,72 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import sys, json, random, subprocess, pytest
+import numpy as np
+torch = pytest.importorskip('torch')
+from models import CellStructure, CellArchCodec, get_search_spaces
+from nas_201_api import NASBench201API
+from conftest import lib_dir
+
+
+def shuffled_meta_archs():
+  # the same as exps/NAS-Bench-201/main.py
+  archs = CellStructure.gen_all(get_search_spaces('cell', 'nas-bench-201'), 4, False)
+  random.seed( 88 )
+  random.shuffle( archs )
+  return [arch.tostr() for arch in archs]
+
+
+@pytest.fixture(scope='module')
+def api():
+  return NASBench201API({'meta_archs': shuffled_meta_archs(), 'arch2infos': {}, 'evaluated_indexes': []}, verbose=False)
+
+
+def test_codec_round_trip():
+  codec = CellArchCodec(get_search_spaces('cell', 'nas-bench-201'), 4)
+  assert codec.num_archs == 15625
+  for code in random.Random(0).sample(range(codec.num_archs), 200) + [0, codec.num_archs-1]:
+    vector = codec.int2vector(code)
+    assert codec.vector2int(vector) == code
+    arch = codec.decode(code)
+    assert codec.encode(arch) == vector and codec.encode_int(arch.tostr()) == code
+    assert codec.structure(vector).tostr() == arch.tostr()
+
+
+def test_codec_rejects_incomplete_cells():
+  codec = CellArchCodec(get_search_spaces('cell', 'nas-bench-201'), 4)
+  arch  = CellStructure.str2structure('|nor_conv_3x3~0|+|nor_conv_3x3~1|+|skip_connect~0|skip_connect~2|')
+  assert codec.encode(arch, strict=False) is None
+  with pytest.raises(ValueError): codec.encode(arch)
+
+
+def test_code_is_not_the_benchmark_index(api):
+  codec = CellArchCodec(get_search_spaces('cell', 'nas-bench-201'), 4)
+  index2code = api.index2code()
+  assert np.sum(index2code == np.arange(len(api))) < 10
+  assert index2code[0] == codec.encode_int(api.meta_archs[0])
+
+
+def test_code_index_permutation(api):
+  codec = CellArchCodec(get_search_spaces('cell', 'nas-bench-201'), 4)
+  index2code, code2index = api.index2code(), api.code2index()
+  assert sorted(index2code.tolist()) == list(range(len(api)))
+  assert (code2index[index2code] == np.arange(len(api))).all()
+  for index in random.Random(1).sample(range(len(api)), 200):
+    arch = api.meta_archs[index]
+    code = codec.encode_int(arch)
+    assert api.query_index_by_code(code) == index
+    assert api.query_index_by_code(codec.int2vector(code)) == index
+    assert api.query_index_by_arch(codec.decode(code)) == index
+
+
+def test_codes_without_the_models(api, tmp_path):
+  # nas_201_api should be usable without lib/models
+  (tmp_path / 'archs.json').write_text(json.dumps(api.meta_archs))
+  script = ('import sys, json ; sys.modules["models"] = None ; from nas_201_api import NASBench201API as API ; '
+            'api = API({"meta_archs": json.load(open(sys.argv[1])), "arch2infos": {}, "evaluated_indexes": []}, verbose=False) ; '
+            'print(json.dumps(api.index2code().tolist()))')
+  output = subprocess.check_output([sys.executable, '-c', script, str(tmp_path / 'archs.json')], cwd=str(lib_dir))
+  codec  = CellArchCodec(get_search_spaces('cell', 'nas-bench-201'), 4)
+  assert json.loads(output) == api.index2code().tolist() == [codec.encode_int(arch) for arch in api.meta_archs]
+  with pytest.raises(AssertionError): NASBench201API.str2code('|nor_conv_3x3~0|+|nor_conv_3x3~1|+|skip_connect~0|skip_connect~2|')
@@ -0,0 +1,50 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import pytest
+import numpy as np
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision') # imported by procedures
+from models import get_search_spaces
+from models.cell_searchs.search_model_setn import TinyNetworkSETN
+from procedures.arch_evaluation import SupernetEvaluator
+
+
+@pytest.fixture
+def network():
+  torch.manual_seed(0)
+  network = TinyNetworkSETN(4, 1, 4, 10, get_search_spaces('cell', 'nas-bench-201'), False, False).eval()
+  return network
+
+
+def random_codes(network, num, seed):
+  rng = np.random.RandomState(seed)
+  return [network.codec.decode(int(code)) for code in rng.randint(network.codec.num_archs, size=num)]
+
+
+def test_shared_trie_matches_each_candidate(network):
+  archs   = random_codes(network, 30, 0)
+  archs   = archs + archs[:5] # duplicated candidates
+  inputs  = torch.rand(2, 3, 8, 8)
+  evaluator = SupernetEvaluator(network, archs)
+  with torch.no_grad():
+    logits = evaluator.forward_batch(inputs)
+    for code, xlogits in zip(evaluator.codes, logits):
+      expected = evaluator.forward_head( evaluator.forward_cells(network.stem(inputs), code) )
+      assert torch.allclose(xlogits, expected, atol=1e-5)
+  assert len(logits) == len(evaluator.codes) == 30
+
+
+def test_trie_keeps_one_path(network):
+  archs = random_codes(network, 200, 1)
+  evaluator = SupernetEvaluator(network, archs)
+  cell = [cell for cell in network.cells if hasattr(cell, 'forward_encoded')][0]
+  trie, indexes = evaluator.forward_trie(cell, network.stem(torch.rand(1, 3, 8, 8))), []
+  with torch.no_grad():
+    for index, output in trie:
+      indexes.append(index)
+      code, nodes, edges = evaluator.codes[index], trie.gi_frame.f_locals['nodes'], trie.gi_frame.f_locals['edges']
+      # only the nodes on the path of this code, and the edge outputs from them, are alive
+      assert all(code[:len(key)] == key for key in nodes) and len(nodes) <= cell.max_nodes
+      assert all(key[0] in nodes for key in edges) and len(edges) <= len(code) * len(network.op_names)
+  assert [evaluator.codes[i] for i in indexes] == sorted(evaluator.codes)
@@ -0,0 +1,61 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import sys, random, pytest
+import numpy as np
+from pathlib import Path
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision') # imported by the scripts in exps/algos
+algos_dir = (Path(__file__).parent / '..' / 'exps' / 'algos').resolve()
+if str(algos_dir) not in sys.path: sys.path.insert(0, str(algos_dir))
+from models import CellArchCodec, get_search_spaces
+from nas_201_api import NASBench201API
+import R_EA
+
+
+COST = 32 # the time cost of each architecture in search_space_dict
+
+
+class QueryRecorder(object):
+  # the benchmark api that records the indexes of each get_more_info_batch
+  def __init__(self, api):
+    self.api, self.queries = api, []
+
+  def code2index(self):
+    return self.api.code2index()
+
+  def get_more_info_batch(self, indexes, *args):
+    self.queries.append( np.asarray(indexes).copy() )
+    return self.api.get_more_info_batch(indexes, *args)
+
+
+@pytest.fixture(scope='module')
+def api(search_space_dict):
+  return NASBench201API(search_space_dict, verbose=False)
+
+
+def test_evolution_queries_the_indexes_of_the_codes(api):
+  codec, recorder = CellArchCodec(get_search_spaces('cell', 'nas-bench-201'), 4), QueryRecorder(api)
+  best_indexes, best_accuracies, num_archs, _ = R_EA.regularized_evolution_batch(4, 10, 3, COST * 40 + COST // 2, codec, recorder, 'cifar10-valid', np.random.RandomState(0))
+  index2code = api.index2code()
+  # each child is one mutation of an architecture queried before it, which fails if the codes are queried as the indexes
+  visited = [codec.int2vector(int(code)) for code in index2code[recorder.queries[0]]]
+  for indexes in recorder.queries[1:]:
+    for code in index2code[indexes]:
+      vector = codec.int2vector(int(code))
+      assert any(sum(x != y for x, y in zip(vector, parent)) == 1 for parent in visited)
+    visited += [codec.int2vector(int(code)) for code in index2code[indexes]]
+  assert num_archs.tolist() == [40] * 4
+  for index, accuracy in zip(best_indexes, best_accuracies):
+    assert api.get_more_info(int(index), 'cifar10-valid', None, True, False)['valid-accuracy'] == pytest.approx(accuracy)
+
+
+@pytest.mark.parametrize('budget', [COST * 3, COST * 10 + COST // 2, COST * 17 + COST // 2])
+def test_one_run_follows_the_serial_budget(api, budget):
+  search_space = get_search_spaces('cell', 'nas-bench-201')
+  codec = CellArchCodec(search_space, 4)
+  _, _, num_archs, total_costs = R_EA.regularized_evolution_batch(1, 10, 3, budget, codec, api, 'cifar10-valid', np.random.RandomState(0))
+  random.seed(0)
+  history, total_cost = R_EA.regularized_evolution(None, 10, 3, budget, R_EA.random_architecture_func(4, search_space), R_EA.mutate_arch_func(search_space), api, None, 'cifar10-valid')
+  assert num_archs[0] == len(history) == max(10, budget // COST)
+  assert total_costs[0] == pytest.approx(total_cost, abs=1) and total_costs[0] == pytest.approx(COST * len(history), abs=1)
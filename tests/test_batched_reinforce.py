@@ -0,0 +1,96 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import sys, time, pytest
+import numpy as np
+from pathlib import Path
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision') # imported by the scripts in exps/algos
+algos_dir = (Path(__file__).parent / '..' / 'exps' / 'algos').resolve()
+if str(algos_dir) not in sys.path: sys.path.insert(0, str(algos_dir))
+from models import CellArchCodec, get_search_spaces
+from nas_201_api import NASBench201API
+import reinforce
+from reinforce import Policy, ExponentialMovingAverage, reinforce_batch, select_action, train_and_eval
+
+
+COST = 32 # the time cost of each architecture in search_space_dict
+
+
+class Logger(object):
+  def log(self, *args): pass
+
+
+class QueryRecorder(object):
+  def __init__(self, api):
+    self.api, self.queries = api, []
+
+  def code2index(self):
+    return self.api.code2index()
+
+  def get_more_info_batch(self, indexes, *args):
+    self.queries.append( np.asarray(indexes).copy() )
+    return self.api.get_more_info_batch(indexes, *args)
+
+
+@pytest.fixture(scope='module')
+def api(search_space_dict):
+  return NASBench201API(search_space_dict, verbose=False)
+
+
+def create(seed):
+  torch.manual_seed(seed)
+  policy = Policy(4, get_search_spaces('cell', 'nas-bench-201'))
+  return policy, torch.optim.Adam(policy.parameters(), lr=0.01), ExponentialMovingAverage(0.9)
+
+
+def serial_reinforce(policy, optimizer, baseline, time_budget, nas_bench):
+  # the loop of `main` with RL_batch=1
+  total_steps, total_costs, trace = 0, 0, []
+  while total_costs < time_budget:
+    start_time = time.time()
+    log_prob, action = select_action( policy )
+    arch   = policy.generate_arch( action )
+    reward, cost_time = train_and_eval(arch, nas_bench, None, 'cifar10-valid')
+    trace.append( (reward, arch) )
+    if total_costs + cost_time < time_budget:
+      total_costs += cost_time
+    else: break
+    baseline.update(reward)
+    policy_loss = ( -log_prob * (reward - baseline.value()) ).sum()
+    optimizer.zero_grad()
+    policy_loss.backward()
+    optimizer.step()
+    total_costs += time.time() - start_time
+    total_steps += 1
+  return max(trace, key=lambda x: x[0])[1], total_steps, total_costs
+
+
+def test_batch_queries_the_indexes_of_the_codes(api, monkeypatch):
+  sampled, recorder, sample = [], QueryRecorder(api), reinforce.select_actions
+  def select_actions(policy, batch_size):
+    log_probs, actions = sample(policy, batch_size)
+    sampled.append( actions )
+    return log_probs, actions
+  monkeypatch.setattr(reinforce, 'select_actions', select_actions)
+  policy, optimizer, baseline = create(0)
+  best_arch, total_steps, _ = reinforce_batch(policy, optimizer, baseline, 8, COST * 40 + COST // 2, recorder, 'cifar10-valid', Logger())
+  codec = CellArchCodec(policy.search_space, policy.max_nodes)
+  assert len(sampled) == len(recorder.queries) == total_steps + 1 == 6
+  for actions, indexes in zip(sampled, recorder.queries):
+    codes = [codec.vector2int(tuple(action)) for action in actions.tolist()]
+    assert indexes.tolist() == api.code2index()[codes].tolist()
+    assert [api.meta_archs[index] for index in indexes] == [policy.generate_arch(action).tostr() for action in actions.tolist()]
+  assert api.query_index_by_arch(best_arch) in np.concatenate(recorder.queries).tolist()
+
+
+@pytest.mark.parametrize('budget', [COST // 2, COST * 7 + COST // 2])
+def test_one_sample_follows_the_serial_loop(api, budget):
+  policy, optimizer, baseline = create(1)
+  best_arch, total_steps, total_costs = reinforce_batch(policy, optimizer, baseline, 1, budget, api, 'cifar10-valid', Logger())
+  xpolicy, xoptimizer, xbaseline = create(1)
+  xbest_arch, xtotal_steps, xtotal_costs = serial_reinforce(xpolicy, xoptimizer, xbaseline, budget, api)
+  assert total_steps == xtotal_steps == budget // COST
+  assert total_costs == pytest.approx(xtotal_costs, abs=1)
+  assert best_arch.tostr() == xbest_arch.tostr()
+  assert torch.allclose(policy.arch_parameters, xpolicy.arch_parameters, atol=1e-5)
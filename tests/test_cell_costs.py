@@ -0,0 +1,20 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import random, pytest
+import numpy as np
+torch = pytest.importorskip('torch')
+from models import CellArchCodec, TinyNetworkCosts, get_search_spaces
+from nas_201_api import NASBench201API
+
+
+def test_all_costs_in_code_and_benchmark_orders():
+  codec = CellArchCodec(get_search_spaces('cell', 'nas-bench-201'), 4)
+  archs = [codec.decode(code).tostr() for code in range(codec.num_archs)]
+  random.Random(88).shuffle(archs)
+  api   = NASBench201API({'meta_archs': archs, 'arch2infos': {}, 'evaluated_indexes': []}, verbose=False)
+  costs = TinyNetworkCosts(16, 5, 10, get_search_spaces('cell', 'nas-bench-201'), 4, (1, 3, 32, 32))
+  all_costs, index2code = costs.all_costs(), api.index2code()
+  for index in random.Random(0).sample(range(len(api)), 50):
+    assert np.allclose(all_costs[index2code[index]], costs.costs(api[index]))
+    assert np.allclose(all_costs[index2code][index], costs.costs(api[index]))
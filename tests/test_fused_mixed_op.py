@@ -0,0 +1,57 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import copy, pytest
+torch = pytest.importorskip('torch')
+import torch.nn as nn
+from models.cell_operations import OPS, SearchSpaceNames
+from models.cell_searchs.search_cells import FusedMixedOp
+
+
+def candidate_ops(space, C, stride):
+  torch.manual_seed(0)
+  return nn.ModuleList([OPS[name](C, C, stride, True, True) for name in SearchSpaceNames[space]])
+
+
+@pytest.mark.parametrize('space', ['nas-bench-201', 'darts', 'connect-nas'])
+@pytest.mark.parametrize('stride', [1, 2])
+@pytest.mark.parametrize('training', [True, False])
+def test_fused_mixed_op_matches_the_weighted_sum(space, stride, training):
+  ops  = candidate_ops(space, 8, stride).train(training)
+  xops = copy.deepcopy(ops)
+  if not training:
+    for module in ops.modules():
+      if isinstance(module, nn.BatchNorm2d): module.running_mean.uniform_(-0.1, 0.1) ; module.running_var.uniform_(0.5, 1.5)
+    xops.load_state_dict(ops.state_dict())
+  inputs  = torch.randn(4, 8, 9, 9)
+  weights = torch.softmax(torch.randn(len(ops)), dim=0)
+  xinputs, xweights = inputs.clone().requires_grad_(), weights.clone().requires_grad_()
+  inputs.requires_grad_() ; weights.requires_grad_()
+
+  expected = sum( op(inputs) * w for op, w in zip(ops, weights) )
+  fused    = FusedMixedOp(xops)(xinputs, xweights)
+  assert torch.allclose(expected, fused, atol=1e-5)
+  if space == 'nas-bench-201': assert len(FusedMixedOp(xops).conv_ops) == 2 # nor_conv_1x1 and nor_conv_3x3 are fused
+  # the same gradients for the inputs, the architecture weights, and the parameters
+  grad = torch.randn_like(expected)
+  expected.backward(grad) ; fused.backward(grad)
+  assert torch.allclose(inputs.grad, xinputs.grad, atol=1e-5)
+  assert torch.allclose(weights.grad, xweights.grad, atol=1e-5)
+  for (name, param), xparam in zip(ops.named_parameters(), xops.parameters()):
+    if param.grad is None: assert xparam.grad is None or not xparam.grad.any(), name
+    else                 : assert torch.allclose(param.grad, xparam.grad, atol=1e-5), name
+  # the same running statistics of BatchNorm in training
+  for buffer, xbuffer in zip(ops.buffers(), xops.buffers()):
+    assert torch.allclose(buffer.float(), xbuffer.float(), atol=1e-6)
+
+
+def test_gdas_cells_take_the_host_index():
+  from models.cell_searchs.search_cells import NAS201SearchCell
+  from models.cell_searchs.search_model_gdas import get_gumbel_prob
+  torch.manual_seed(0)
+  cell = NAS201SearchCell(8, 8, 1, 4, SearchSpaceNames['nas-bench-201'])
+  arch = torch.randn(cell.num_edges, len(SearchSpaceNames['nas-bench-201']))
+  hardwts, index = get_gumbel_prob(arch, 10)
+  inputs = torch.randn(2, 8, 6, 6)
+  assert cell.forward_gdas(inputs, hardwts, index.view(-1).tolist()).shape == inputs.shape
+  with pytest.raises(AssertionError): cell.forward_gdas(inputs, hardwts, index)
@@ -0,0 +1,47 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import pytest
+torch = pytest.importorskip('torch')
+from models import CellStructure, TinyNetworkCosts, set_infer_pruning, get_search_spaces
+from models.cell_infers import TinyNetwork
+from utils.flop_benchmark import add_flops_counting_methods, compute_average_flops_cost, remove_hook_function
+
+
+ARCHS = ['|nor_conv_3x3~0|+|none~0|nor_conv_3x3~1|+|nor_conv_1x1~0|none~1|none~2|',
+         '|none~0|+|none~0|none~1|+|none~0|none~1|none~2|',
+         '|nor_conv_3x3~0|+|nor_conv_3x3~0|avg_pool_3x3~1|+|skip_connect~0|skip_connect~1|none~2|']
+
+
+def count_flops(network, shape):
+  # the FLOPs counting of utils.get_model_infos
+  network = add_flops_counting_methods(network)
+  network.eval()
+  with torch.no_grad(): network(torch.rand(*shape))
+  flops = compute_average_flops_cost(network) / 1e6
+  network.apply( remove_hook_function )
+  return flops
+
+
+@pytest.mark.parametrize('arch_str', ARCHS)
+def test_pruning_keeps_the_outputs(arch_str):
+  network = TinyNetwork(8, 1, CellStructure.str2structure(arch_str), 10).eval()
+  inputs  = torch.rand(2, 3, 16, 16)
+  with torch.no_grad():
+    full   = network(inputs)[1]
+    pruned = set_infer_pruning(network, True)(inputs)[1]
+  assert torch.allclose(pruned, full, atol=1e-6)
+
+
+@pytest.mark.parametrize('arch_str', ARCHS)
+def test_unpruned_flops_match_the_cost_model(arch_str):
+  arch    = CellStructure.str2structure(arch_str)
+  costs   = TinyNetworkCosts(8, 1, 10, get_search_spaces('cell', 'nas-bench-201'), 4, (1, 3, 16, 16))
+  network = TinyNetwork(8, 1, arch, 10) # not pruned by default, as the benchmark counts
+  assert count_flops(network, (1, 3, 16, 16)) == pytest.approx(costs.costs(arch)[0])
+
+
+def test_training_updates_all_layers_by_default():
+  network = TinyNetwork(8, 1, CellStructure.str2structure(ARCHS[0]), 10)
+  network(torch.rand(2, 3, 16, 16))[1].sum().backward()
+  assert all(param.grad is not None for param in network.parameters() if param.requires_grad)
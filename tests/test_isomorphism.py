@@ -0,0 +1,37 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import sys, json, random, subprocess, pytest
+torch = pytest.importorskip('torch')
+from models import CellStructure, get_search_spaces
+from nas_201_api.isomorphism import IsomorphismIndex, to_unique_str
+from conftest import lib_dir
+
+
+def test_classes_follow_the_unique_str(tmp_path):
+  archs = CellStructure.gen_all(get_search_spaces('cell', 'nas-bench-201'), 4, False)
+  index = IsomorphismIndex.build([arch.tostr() for arch in archs], True)
+  assert len(index) == 15625 and index.num_classes == 6466
+  for i in random.Random(0).sample(range(len(archs)), 100):
+    unique_str = archs[i].to_unique_str(True)
+    members    = index.equivalents(i)
+    assert i in members and all(archs[j].to_unique_str(True) == unique_str for j in members)
+    assert index.representative(i) == min(members)
+  index.save(tmp_path / 'isomorphism.npz')
+  assert (IsomorphismIndex.load(tmp_path / 'isomorphism.npz').class_ids == index.class_ids).all()
+
+
+@pytest.mark.parametrize('consider_zero', [None, False, True])
+def test_unique_str_matches_the_structure(consider_zero):
+  for arch in CellStructure.gen_all(get_search_spaces('cell', 'nas-bench-201'), 4, False):
+    assert to_unique_str(arch.tostr(), consider_zero) == arch.to_unique_str(consider_zero)
+
+
+def test_build_without_the_models():
+  # nas_201_api should be usable without lib/models
+  archs  = [arch.tostr() for arch in CellStructure.gen_all(get_search_spaces('cell', 'nas-bench-201'), 4, False)[:500]]
+  script = ('import sys, json ; sys.modules["models"] = None ; from nas_201_api.isomorphism import IsomorphismIndex ; '
+            'print(json.dumps(IsomorphismIndex.build(json.loads(sys.argv[1]), True).class_ids.tolist()))')
+  output = subprocess.check_output([sys.executable, '-c', script, json.dumps(archs)], cwd=str(lib_dir))
+  index  = IsomorphismIndex.build(archs, True)
+  assert json.loads(output) == index.class_ids.tolist() and index.num_classes < len(archs)
@@ -0,0 +1,87 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import os, time, pytest
+import numpy as np
+torch = pytest.importorskip('torch')
+from nas_201_api import NASBench201API
+
+
+def brute_force_find_best(api, dataset, metric_on_set, FLOP_max=None, Param_max=None):
+  # the loop of NASBench201API.find_best before the metric index
+  best_index, highest_accuracy = -1, None
+  for idx in api.evaluated_indexes:
+    archres = api.arch2infos_full[idx]
+    if dataset not in archres.get_dataset_names(): continue
+    info = archres.get_compute_costs(dataset)
+    if FLOP_max  is not None and info['flops']  > FLOP_max : continue
+    if Param_max is not None and info['params'] > Param_max: continue
+    accuracy = archres.get_metrics(dataset, metric_on_set)['accuracy']
+    if best_index == -1 or highest_accuracy < accuracy:
+      best_index, highest_accuracy = idx, accuracy
+  return best_index, highest_accuracy
+
+
+@pytest.mark.parametrize('dataset,metric_on_set', [('cifar10-valid', 'x-valid'), ('cifar10-valid', 'ori-test'), ('cifar100', 'ori-test')])
+def test_find_best_matches_brute_force(benchmark_dict, dataset, metric_on_set):
+  api = NASBench201API(benchmark_dict, verbose=False)
+  for FLOP_max in (None, 30, 80, 150, 1000):
+    for Param_max in (None, 0.3, 0.8, 2.0):
+      index, accuracy = api.find_best(dataset, metric_on_set, FLOP_max, Param_max)
+      xindex, xaccuracy = brute_force_find_best(api, dataset, metric_on_set, FLOP_max, Param_max)
+      assert index == xindex
+      if xaccuracy is not None: assert accuracy == pytest.approx(xaccuracy)
+
+
+def test_topk_is_sorted_and_constrained(benchmark_dict):
+  api   = NASBench201API(benchmark_dict, verbose=False)
+  index = api.get_metric_index('cifar10-valid', 'x-valid')
+  indexes, accuracies = index.topk(5, FLOP_max=100)
+  assert len(indexes) == 5 and (np.diff(accuracies) <= 0).all()
+  for idx, acc in zip(indexes, accuracies):
+    assert api.get_cost_info(int(idx), 'cifar10-valid')['flops'] <= 100
+    assert api.get_more_info(int(idx), 'cifar10-valid', None, False, False)['valid-accuracy'] == pytest.approx(acc)
+
+
+def test_saved_index_follows_the_file(benchmark_dict, tmp_path):
+  xpath = tmp_path / 'bench.pth'
+  torch.save(benchmark_dict, str(xpath))
+  api = NASBench201API(str(xpath), verbose=False)
+  best = api.find_best('cifar100', 'ori-test')
+  assert len(list((tmp_path / 'bench-index').glob('*.npz'))) == 1
+  # a rebuilt file with the same name and the same architectures, where the best one becomes the worst
+  result = api.arch2infos_full[best[0]].query('cifar100', 777)
+  result.eval_acc1es = {key: 0.0 for key in result.eval_acc1es}
+  benchmark_dict['arch2infos'][best[0]]['full'] = api.arch2infos_full[best[0]].state_dict()
+  torch.save(benchmark_dict, str(xpath))
+  os.utime(str(xpath), ns=(time.time_ns(), time.time_ns() + 10**9))
+  xapi = NASBench201API(str(xpath), verbose=False)
+  assert xapi.find_best('cifar100', 'ori-test') == brute_force_find_best(xapi, 'cifar100', 'ori-test')
+  assert xapi.find_best('cifar100', 'ori-test')[0] != best[0]
+
+
+def test_saved_index_follows_the_changes(benchmark_dict, tmp_path):
+  xpath = tmp_path / 'bench.pth'
+  torch.save(benchmark_dict, str(xpath))
+  api = NASBench201API(str(xpath), verbose=False)
+  index, accuracy = api.find_best('cifar100', 'ori-test')
+  # the changes without a store are not saved
+  result = api.arch2infos_full[index].query('cifar100', 777)
+  result.eval_acc1es = {key: 0.0 for key in result.eval_acc1es}
+  api.add_result(index, 'cifar100', 777, result)
+  assert api.fingerprint() is None
+  assert api.find_best('cifar100', 'ori-test') == brute_force_find_best(api, 'cifar100', 'ori-test')
+  assert NASBench201API(str(xpath), verbose=False).find_best('cifar100', 'ori-test') == (index, accuracy)
+  # the changes journaled into a store are followed by the other apis of this store
+  store_api = NASBench201API(str(xpath), verbose=False)
+  store_api.attach_store(str(tmp_path / 'store'))
+  xapi = NASBench201API(str(tmp_path / 'store'), verbose=False)
+  assert xapi.find_best('cifar100', 'ori-test') == (index, accuracy)
+  xapi.add_result(index, 'cifar100', 777, result)
+  assert xapi.fingerprint() == xapi._store.fingerprint()
+  expected = brute_force_find_best(xapi, 'cifar100', 'ori-test')
+  assert expected[0] != index and xapi.find_best('cifar100', 'ori-test') == expected
+  assert NASBench201API(str(tmp_path / 'store'), verbose=False).find_best('cifar100', 'ori-test') == expected
+  # a stale api of this store does not overwrite the saved index with its old results
+  store_api.reset_latency(0, 'cifar100', None, 0.5)
+  assert store_api.fingerprint() is None
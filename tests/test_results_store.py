@@ -0,0 +1,69 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import pytest
+import numpy as np
+torch = pytest.importorskip('torch')
+from nas_201_api.results_store import ResultsStore
+from conftest import make_arch_results
+
+
+def arch_infos(benchmark_dict, index, seed):
+  return {key: make_arch_results(index, benchmark_dict['meta_archs'][index], {'cifar100': [seed]}, np.random.RandomState(seed)).state_dict() for key in ('full', 'less')}
+
+
+def seeds_of(infos):
+  return infos['full']['dataset_seed']['cifar100']
+
+
+def test_later_results_overwrite_the_earlier_ones(benchmark_dict, tmp_path):
+  store = ResultsStore(tmp_path / 'store', benchmark_dict['meta_archs'])
+  store.append({0: arch_infos(benchmark_dict, 0, 1), 1: arch_infos(benchmark_dict, 1, 1)}, 'dir-a')
+  store.append({1: arch_infos(benchmark_dict, 1, 2), 2: arch_infos(benchmark_dict, 2, 2)}, 'dir-b')
+  assert [record['source'] for record in store.segments()] == ['dir-a', 'dir-b']
+  infos = store.to_dict()
+  assert infos['evaluated_indexes'] == [0, 1, 2]
+  assert [seeds_of(infos['arch2infos'][index]) for index in range(3)] == [[1], [2], [2]]
+  # compact keeps the same results in fewer segments
+  assert store.compact(segment_size=2)
+  assert len(store.segments()) == 2 and all('source' not in record for record in store.segments())
+  xinfos = store.to_dict()
+  assert xinfos['evaluated_indexes'] == [0, 1, 2]
+  assert [seeds_of(xinfos['arch2infos'][index]) for index in range(3)] == [[1], [2], [2]]
+  assert len(list((tmp_path / 'store' / 'segments').glob('*.pth'))) == 2
+
+
+def test_torn_journal_line_is_ignored(benchmark_dict, tmp_path):
+  store = ResultsStore(tmp_path / 'store', benchmark_dict['meta_archs'])
+  store.append({0: arch_infos(benchmark_dict, 0, 1)})
+  with open(str(store.journal_path), 'a') as cfile: cfile.write('{"segment": "segment-crashed')
+  store.append({1: arch_infos(benchmark_dict, 1, 1)})
+  assert [record['indexes'] for record in store.segments()] == [[0], [1]]
+  assert ResultsStore(tmp_path / 'store').to_dict()['evaluated_indexes'] == [0, 1]
+
+
+def test_updates_apply_to_the_results_committed_before_them(benchmark_dict, tmp_path):
+  store  = ResultsStore(tmp_path / 'store', benchmark_dict['meta_archs'])
+  result = make_arch_results(3, benchmark_dict['meta_archs'][3], {'cifar100': [9]}, np.random.RandomState(9)).query('cifar100', 9)
+  store.append({0: arch_infos(benchmark_dict, 0, 1)})
+  store.append_updates([(0, False, 'latency', ('cifar100', None, 0.5)), (0, False, 'result', ('cifar100', 9, result.state_dict())),
+                        (3, False, 'result', ('cifar100', 9, result.state_dict()))])
+  infos = store.to_dict()
+  assert infos['evaluated_indexes'] == [0, 3]
+  assert seeds_of(infos['arch2infos'][0]) == [1, 9] and seeds_of(infos['arch2infos'][3]) == [9]
+  assert seeds_of({'full': infos['arch2infos'][0]['less']}) == [1]
+  assert infos['arch2infos'][0]['full']['all_results'][('cifar100', 1)]['latency'] == [0.5]
+  # the results appended after an update replace it, and the later updates are applied again
+  store.append({0: arch_infos(benchmark_dict, 0, 2)})
+  store.append_updates([(0, False, 'latency', ('cifar100', 2, 0.25))])
+  expected = store.to_dict()
+  assert seeds_of(expected['arch2infos'][0]) == [2] and seeds_of(expected['arch2infos'][3]) == [9]
+  assert expected['arch2infos'][0]['full']['all_results'][('cifar100', 2)]['latency'] == [0.25]
+  # compact folds the updates into the results without changing them
+  assert store.compact()
+  assert all(record['kind'] == 'results' for record in store.segments())
+  compacted = store.to_dict()
+  assert compacted['evaluated_indexes'] == expected['evaluated_indexes']
+  for index in expected['evaluated_indexes']:
+    assert seeds_of(compacted['arch2infos'][index]) == seeds_of(expected['arch2infos'][index])
+  assert compacted['arch2infos'][0]['full']['all_results'][('cifar100', 2)]['latency'] == [0.25]
@@ -0,0 +1,28 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import copy, pytest
+torch = pytest.importorskip('torch')
+from nas_201_api import NASBench201API, ArchResultsView, ResultsCountView
+
+
+def test_clone_false_is_read_only(benchmark_dict):
+  api  = NASBench201API(benchmark_dict, verbose=False)
+  view = api.query_by_index(2, clone=False)
+  assert isinstance(view, ArchResultsView)
+  before = copy.deepcopy(api.arch2infos_full[2].state_dict())
+  for result in list(view.query('cifar10-valid').values()) + list(api.query_by_index(2, 'cifar100', clone=False).values()) + [view.all_results[('cifar100', 777)]]:
+    assert isinstance(result, ResultsCountView)
+    for name in ResultsCountView._inplace_funcs:
+      with pytest.raises(AttributeError): getattr(result, name)
+    with pytest.raises(AttributeError): result.latency = [1.0]
+    with pytest.raises(TypeError): result.eval_acc1es['ori-test@0'] = 0
+    with pytest.raises(AttributeError): result.get_eval_set().append('x-test')
+    assert result.get_eval('ori-test') == result.copy().get_eval('ori-test')
+  with pytest.raises(TypeError): view.dataset_seed['cifar10'] = [777]
+  with pytest.raises(AttributeError): view.dataset_seed['cifar100'].append(999)
+  with pytest.raises(TypeError): del view.all_results[('cifar100', 777)]
+  assert view.get_metrics('cifar100', 'ori-test') == api.query_by_index(2).get_metrics('cifar100', 'ori-test')
+  assert api.arch2infos_full[2].state_dict().keys() == before.keys()
+  assert api.arch2infos_full[2].dataset_seed == before['dataset_seed']
+  assert api.arch2infos_full[2].query('cifar100', 777).state_dict() == before['all_results'][('cifar100', 777)]
@@ -0,0 +1,104 @@
+#####################################################
+# Copyright (c) Xuanyi Dong [GitHub D-X-Y], 2019.08 #
+#####################################################
+import os, time, random, multiprocessing, pytest
+import numpy as np
+torch = pytest.importorskip('torch')
+import stat
+from nas_201_api import NASBench201API, NASBench201Client, is_server_address, load_authkey
+from nas_201_api.service import NASBench201Server
+
+
+def serve(benchmark_dict, address, authkey=None):
+  server = NASBench201Server(NASBench201API(benchmark_dict, verbose=False), address, authkey, verbose=False)
+  def call(name, args, kwargs):
+    # the global RNGs of the server are also used by the other clients
+    random.seed(os.urandom(8)) ; np.random.seed(int.from_bytes(os.urandom(4), 'little'))
+    return NASBench201Server.call(server, name, args, kwargs)
+  server.call = call
+  server.serve_forever()
+
+
+@pytest.fixture
+def client(benchmark_dict, tmp_path):
+  address = str(tmp_path / 'bench.sock')
+  process = multiprocessing.get_context('fork').Process(target=serve, args=(benchmark_dict, address), daemon=True)
+  process.start()
+  for _ in range(200):
+    if is_server_address(address): break
+    time.sleep(0.05)
+  client = NASBench201Client(address)
+  yield client
+  client.close()
+  process.terminate()
+  process.join()
+
+
+def test_server_address():
+  assert is_server_address('localhost:6006') and is_server_address(('localhost', 6006))
+  assert not is_server_address('localhost:port') and not is_server_address('/not/a/socket')
+
+
+def test_socket_is_private(client, tmp_path):
+  assert stat.S_IMODE(os.stat(str(tmp_path / 'bench.sock')).st_mode) == 0o600
+  assert len(client) == 40
+
+
+def test_authkey(benchmark_dict, tmp_path, monkeypatch):
+  with pytest.raises(ValueError):
+    NASBench201Server(None, '0.0.0.0:6006')
+  NASBench201Server(None, '127.0.0.1:6006') ; NASBench201Server(None, 'localhost:6006')
+  key_file = tmp_path / 'key'
+  key_file.write_bytes(b'secret\n')
+  monkeypatch.setenv('NAS_BENCH_201_AUTHKEY', 'other')
+  assert load_authkey(str(key_file)) == b'secret' and load_authkey() == b'other'
+  NASBench201Server(None, '0.0.0.0:6006', load_authkey(str(key_file)))
+  address = str(tmp_path / 'key.sock')
+  process = multiprocessing.get_context('fork').Process(target=serve, args=(benchmark_dict, address, b'secret'), daemon=True)
+  process.start()
+  try:
+    for _ in range(200):
+      if is_server_address(address): break
+      time.sleep(0.05)
+    client = NASBench201Client(address, b'secret')
+    assert len(client) == 40
+    client.close()
+    with pytest.raises(multiprocessing.AuthenticationError):
+      NASBench201Client(address, b'wrong')
+  finally:
+    process.terminate()
+    process.join()
+
+
+def test_random_trials_follow_the_client_seed(client, benchmark_dict):
+  indexes = [index for index in benchmark_dict['evaluated_indexes'] for _ in range(4)]
+  def query():
+    xinfo = client.get_more_info_batch(indexes, 'cifar10-valid', None, True, True)
+    infos = [client.get_more_info(index, 'cifar10-valid', None, True, True)['valid-accuracy'] for index in indexes]
+    return xinfo['valid-accuracy'], infos
+  results = []
+  for _ in range(2):
+    np.random.seed(1) ; random.seed(1)
+    results.append( query() )
+  assert np.array_equal(results[0][0], results[1][0]) and results[0][1] == results[1][1]
+  # the trials are not fixed either
+  assert len(set(results[0][1])) > len(benchmark_dict['evaluated_indexes'])
+
+
+def test_concurrent_first_queries_build_once(benchmark_dict, monkeypatch):
+  import threading
+  from nas_201_api import MetricIndex
+  api, builds, build = NASBench201API(benchmark_dict, verbose=False), [], MetricIndex.build
+  def slow_build(*args, **kwargs):
+    builds.append(args[1:3]) ; time.sleep(0.1)
+    return build(*args, **kwargs)
+  monkeypatch.setattr(MetricIndex, 'build', staticmethod(slow_build))
+  barrier, results = threading.Barrier(8), []
+  def query():
+    barrier.wait()
+    results.append( (api.columnar(), api.get_metric_index('cifar10-valid', 'x-valid'), api.code2index()) )
+  threads = [threading.Thread(target=query) for _ in range(8)]
+  for thread in threads: thread.start()
+  for thread in threads: thread.join()
+  assert len(results) == 8 and len(builds) == 1
+  assert all(all(x is y for x, y in zip(result, results[0])) for result in results)